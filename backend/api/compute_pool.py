@@ -0,0 +1,160 @@
+## Process pool for recommendation computes
+## recommend_* is CPU-bound; running it inside an async route would freeze
+## every WebSocket and request on the worker. Computes are sent to a pool of
+## processes that load the assets once at start, with a bounded number of
+## queued tasks and a per-task timeout (threads get the same bounds when
+## COMPUTE_WORKERS=0).
+
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from src import shared
+from src.recommendor import recommend_from_aggregates
+from src.result_cache import result_cache, group_fingerprint
+from src.metrics import traced, observe_trace
+
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", "2"))  # 0 = thread pool, no processes
+COMPUTE_MAX_PENDING = int(os.getenv("COMPUTE_MAX_PENDING", "32"))
+COMPUTE_TIMEOUT = float(os.getenv("COMPUTE_TIMEOUT", "10"))  # seconds
+COMPUTE_RETRY_AFTER = 1  # seconds, sent with 503 when the queue is full
+# Workers start after the server's threads do: forking those would risk
+# deadlocks on locks held mid-fork, so workers start clean (forkserver/spawn)
+COMPUTE_START_METHOD = os.getenv("COMPUTE_START_METHOD", "forkserver")
+
+
+def _init_worker():
+    # Workers start without the parent's memory and load the assets from
+    # the bundle or the shared asset store
+    if shared.scoring_engine is None:
+        from lifecycle import load_assets
+        load_assets()
+
+
+def _worker_ready():
+    # Only returns once the worker's initializer has loaded the assets
+    return os.getpid()
+
+
+def _recommend_in_worker(aggregates, top_k, radius_km):
+    # The stage trace travels back with the result (see src/metrics.py)
+    return traced(recommend_from_aggregates, aggregates, top_k, radius_km)
+
+
+class ComputePool:
+    def __init__(self, workers=COMPUTE_WORKERS, max_pending=COMPUTE_MAX_PENDING, timeout=COMPUTE_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.executor = None
+        # Workers are up with their assets loaded (reported by /readyz)
+        self.ready = False
+        # Tasks submitted and not yet finished in a worker (timed out ones included)
+        self.pending = set()
+
+    def start(self):
+        if self.workers > 0 and self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(COMPUTE_START_METHOD),
+                initializer=_init_worker,
+            )
+            print(f"Compute pool started with {self.workers} workers")
+
+    async def warm_up(self):
+        """
+        Starts the workers and waits until they have loaded the assets, so
+        the first computes do not queue behind worker startup.
+        """
+        self.start()
+        if self.executor is not None:
+            loop = asyncio.get_running_loop()
+            try:
+                await asyncio.gather(*[
+                    loop.run_in_executor(self.executor, _worker_ready) for _ in range(self.workers)
+                ])
+            except BrokenProcessPool:
+                print("Compute pool failed to start")
+                self._restart()
+                return
+        self.ready = True
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def _task_done(self, future):
+        self.pending.discard(future)
+
+    async def _cache_get(self, key):
+        # The Redis tier is a blocking client: keep its round trip off the loop
+        if result_cache.redis_client is None:
+            return result_cache.get(key)
+        return await run_in_threadpool(result_cache.get, key)
+
+    async def _cache_set(self, key, value):
+        if result_cache.redis_client is None:
+            result_cache.set(key, value)
+        else:
+            await run_in_threadpool(result_cache.set, key, value)
+
+    async def recommend(self, aggregates, top_k, radius_km, members=None):
+        """
+        Cached recommendation for finalized group aggregates, computed off
+        the event loop. Raises 503 when the queue is full (or the pool
+        broke) and 504 when the task exceeds the timeout.
+        Computes (not cache hits) are recorded in the stage metrics, with
+        members as the group size.
+        """
+        key = group_fingerprint(*aggregates, top_k, radius_km)
+        cached = await self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        if len(self.pending) >= self.max_pending:
+            raise HTTPException(
+                status_code=503,
+                detail="Compute queue is full, retry shortly",
+                headers={"Retry-After": str(COMPUTE_RETRY_AFTER)},
+            )
+
+        loop = asyncio.get_running_loop()
+        try:
+            # Without processes (executor None) the loop's default thread pool runs it
+            future = loop.run_in_executor(
+                self.executor, _recommend_in_worker, aggregates, top_k, radius_km
+            )
+        except BrokenProcessPool:
+            self._restart()
+            raise HTTPException(status_code=503, detail="Compute pool restarting")
+
+        self.pending.add(future)
+        future.add_done_callback(self._task_done)
+
+        try:
+            # shield: a timed-out task still finishes (and frees its slot) in the worker
+            result_df, trace = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Recommendation compute timed out")
+        except BrokenProcessPool:
+            self._restart()
+            raise HTTPException(status_code=503, detail="Compute pool restarting")
+
+        observe_trace(trace, members)
+        await self._cache_set(key, result_df)
+        return result_df
+
+    def _restart(self):
+        print("Compute pool broken, restarting")
+        self.shutdown()
+        self.pending.clear()
+        self.start()
+
+
+compute_pool = ComputePool()
@@ -0,0 +1,102 @@
+## Request metrics and slow-request log
+## ASGI middleware around every HTTP request. It opens the request's metrics
+## trace (src/metrics.py) and records the route's latency, status and Redis
+## round trips once the response is sent. Requests slower than
+## SLOW_REQUEST_SECONDS are logged as one JSON record with their breakdown:
+## timed stages (compute, rendering, broadcasts), Redis commands and
+## candidate counts.
+
+import os
+import json
+import time
+import logging
+
+from src.metrics import new_trace, tracing, http_seconds, http_requests, redis_round_trips
+
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1"))
+
+logger = logging.getLogger("mnm.requests")
+
+
+def configure_logger():
+    # uvicorn only sets up its own loggers: without any configuration,
+    # slow requests still reach stderr as bare JSON lines
+    if not logger.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+
+
+def route_name(scope):
+    # The matched route's path template, so path parameters do not split series
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def slow_request_record(method, route, scope, status, seconds, background, trace):
+    redis_commands = {
+        command: {"count": count, "ms": round(elapsed * 1000, 3)}
+        for command, (count, elapsed) in trace["redis"].items()
+    }
+    return {
+        "event": "slow_request",
+        "method": method,
+        "route": route,
+        "path": scope.get("path"),
+        "status": status,
+        "duration_ms": round(seconds * 1000, 3),
+        # Background tasks (e.g. auto compute) after the response; their
+        # stages are part of the breakdown
+        "background_ms": round(background * 1000, 3),
+        "stages_ms": {name: round(elapsed * 1000, 3) for name, elapsed in trace["stages"].items()},
+        "redis": {
+            "round_trips": sum(entry["count"] for entry in redis_commands.values()),
+            "ms": round(sum(elapsed for _, elapsed in trace["redis"].values()) * 1000, 3),
+            "commands": redis_commands,
+        },
+        "counts": trace["counts"],
+    }
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app, slow_seconds=SLOW_REQUEST_SECONDS):
+        self.app = app
+        self.slow_seconds = slow_seconds
+        configure_logger()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = new_trace()
+        response = {"status": 500, "end": None}
+        start = time.perf_counter()
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                # Background tasks run after this: they are not request latency
+                response["end"] = time.perf_counter()
+            await send(message)
+
+        try:
+            with tracing(trace):
+                await self.app(scope, receive, send_timed)
+        finally:
+            done = time.perf_counter()
+            end = response["end"] or done
+            self.observe(scope, response["status"], end - start, done - end, trace)
+
+    def observe(self, scope, status, seconds, background, trace):
+        method, route = scope["method"], route_name(scope)
+        http_seconds.observe(seconds, method, route)
+        http_requests.inc(method, route, status)
+        redis_round_trips.observe(sum(count for count, _ in trace["redis"].values()), method, route)
+
+        if seconds >= self.slow_seconds:
+            record = slow_request_record(method, route, scope, status, seconds, background, trace)
+            logger.warning(json.dumps(record))
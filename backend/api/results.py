@@ -0,0 +1,90 @@
+## Result rendering
+## A group's recommendations are rendered once, at compute time, into the
+## exact JSON body GET /group/result serves, plus an ETag for it. The
+## session stores keep only that body, so the read path is a lookup and a
+## byte copy: no DataFrame, no pandas, no response validation per request.
+
+import json
+import hashlib
+
+from .schemas import RestaurantResponse
+
+
+def serialize_restaurants(df):
+    """
+    Turns a result DataFrame into RestaurantResponse-shaped dicts.
+    """
+    # Select columns safely
+    desired_cols = [
+        "name",
+        "rate",
+        "cuisines",
+        "rest_type",
+        "approx_cost(for two people)",
+        "location",
+        "distance_km",
+        "distance_score",
+        "final_score_adjusted",
+    ]
+
+    existing_cols = [c for c in desired_cols if c in df.columns]
+    filtered_df = df[existing_cols].copy()
+
+    # Handle NaN values which crash JSON serialization
+    filtered_df = filtered_df.fillna("")
+
+    filtered_df = filtered_df.rename(
+        columns={
+            "approx_cost(for two people)": "cost"
+        }
+    )
+
+    filtered_df = filtered_df.fillna(0)
+
+    # Convert list fields to string for schema safety
+    def list_to_str(val):
+        if isinstance(val, list):
+            return ", ".join(map(str, val))
+        return str(val)
+
+    filtered_df["cuisines"] = filtered_df["cuisines"].apply(list_to_str)
+    filtered_df["rest_type"] = filtered_df["rest_type"].apply(list_to_str)
+
+    return filtered_df.to_dict(orient="records")
+
+
+def render_result(result_df):
+    """
+    Validates the result rows once and renders the response body.
+    Returns (restaurants, body, etag): the validated rows (for the
+    RESULT_COMPUTED push), the RecommendationResponse JSON as a str and
+    its strong ETag.
+    """
+    restaurants = [
+        RestaurantResponse(**row).dict()
+        for row in serialize_restaurants(result_df)
+    ]
+    # Same encoding as FastAPI's JSONResponse
+    body = json.dumps(
+        {"restaurants": restaurants},
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    )
+    return restaurants, body, result_etag(body)
+
+
+def result_etag(body):
+    return '"' + hashlib.blake2b(body.encode("utf-8"), digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    If-None-Match check (weak comparison, as RFC 9110 specifies for it).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in tags)
@@ -1,5 +1,9 @@
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+import asyncio
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query, BackgroundTasks, Depends, Header
+from fastapi.responses import JSONResponse, Response
 from .websockets import manager
+from .compute_pool import compute_pool
+from .results import render_result, etag_matches
 
 from .schemas import (
     CreateGroupResponse,
@@ -13,8 +17,13 @@ from .schemas import (
 #     add_user,
 #     submit_preferences,
 #     group_status,
-#     compute_group_choice,
-#     getComputedResult
+#     prepare_group_compute,
+#     release_group_compute,
+#     store_group_result,
+#     getComputedResult,
+#     close_group,
+#     update_preferences,
+#     store_reachable
 # )
 
 from .session_redis import (
@@ -22,14 +31,36 @@ from .session_redis import (
     add_user,
     submit_preferences,
     group_status,
-    compute_group_choice,
+    prepare_group_compute,
+    release_group_compute,
+    store_group_result,
     getComputedResult,
-    close_group
+    close_group,
+    update_preferences,
+    store_reachable
 )
+from lifecycle import expiry_listener_stats
 from src import shared
+from src.metrics import render_metrics, stage, METRICS_CONTENT_TYPE
+from src.recommendor import DEFAULT_TOP_K, MAX_TOP_K, DEFAULT_RADIUS_KM, MAX_RADIUS_KM
 
 router = APIRouter()
 
+ASSETS_RETRY_AFTER = 2  # seconds, sent with 503 while assets are loading
+READY_CHECK_TIMEOUT = 2  # seconds allowed for the session store check
+
+def require_assets():
+    """
+    Dependency for routes that need the loaded assets: 503 + Retry-After
+    while the worker is still starting up.
+    """
+    if not shared.assets_ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Recommendation assets are still loading",
+            headers={"Retry-After": str(ASSETS_RETRY_AFTER)},
+        )
+
 def normalize_cuisine(c: str) -> str:
     """
     Converts 'Middle Eastern' -> 'middle_eastern'
@@ -39,15 +70,77 @@ def normalize_cuisine(c: str) -> str:
         return ""
     return c.lower().replace(" ", "_")
 
+def normalize_preferences(prefs: UserPreference):
+    # Normalize cuisines (e.g. "Middle Eastern" -> "middle_eastern")
+    if prefs.cuisines:
+        prefs.cuisines = [normalize_cuisine(c) for c in prefs.cuisines]
+
+    if prefs.rest_type:
+        prefs.rest_type = [normalize_cuisine(c) for c in prefs.rest_type]
+
+    if prefs.dish_pref:
+        prefs.dish_pref = [normalize_cuisine(d) for d in prefs.dish_pref]
+
+    return prefs
+
+# ─────────────────────────────────────────────
+# 🩺 Liveness / Readiness
+# ─────────────────────────────────────────────
+@router.get("/healthz")
+def liveness_api():
+    """
+    Liveness: the process is up and serving, even while assets load.
+    """
+    return {"status": "ok"}
+
+
+@router.get("/metrics")
+def metrics_api():
+    """
+    Prometheus scrape endpoint: this worker's route latencies, Redis and
+    WebSocket metrics, and recommendation stage timings.
+    """
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
+@router.get("/readyz")
+async def readiness_api():
+    """
+    Readiness: assets are loaded, the compute workers are up and the
+    session store is reachable.
+    """
+    try:
+        store_ok = await asyncio.wait_for(store_reachable(), READY_CHECK_TIMEOUT)
+    except asyncio.TimeoutError:
+        store_ok = False
+
+    body = {
+        "status": "ready" if shared.assets_ready and compute_pool.ready and store_ok else "not_ready",
+        "assets": shared.assets_ready,
+        "compute_pool": compute_pool.ready,
+        "session_store": store_ok,
+    }
+    if shared.asset_load_error:
+        body["asset_error"] = shared.asset_load_error
+    body["expiry_listener"] = expiry_listener_stats
+
+    if body["status"] != "ready":
+        return JSONResponse(
+            status_code=503, content=body, headers={"Retry-After": str(ASSETS_RETRY_AFTER)}
+        )
+    return body
+
 # ─────────────────────────────────────────────
 # ➕ Create Group
 # ─────────────────────────────────────────────
 @router.post("/group/create", response_model=CreateGroupResponse)
-def create_group_api():
+async def create_group_api(auto_compute: bool = Query(False)):
     """
     Creates a new group session and returns a group_id.
+    With auto_compute, the last member's submit computes the result in the
+    background and pushes it over the WebSocket (no compute / result calls).
     """
-    group_id = create_group()
+    group_id = await create_group(auto_compute=auto_compute)
     return {"group_id": group_id}
 
 
@@ -59,10 +152,8 @@ async def join_group_api(group_id: str):
     """
     Adds a user to an existing group and returns a user_id.
     """
-    user_id = add_user(group_id)
-    
-    # Get updated status
-    status = group_status(group_id)
+    # The join returns the updated counts
+    user_id, status = await add_user(group_id)
     
     # Broadcast update via WebSocket
     await manager.broadcast(group_id, {
@@ -77,30 +168,21 @@ async def join_group_api(group_id: str):
 # ─────────────────────────────────────────────
 # 📝 Submit User Preferences
 # ─────────────────────────────────────────────
-@router.post("/group/submit/{group_id}/{user_id}")
+@router.post("/group/submit/{group_id}/{user_id}", dependencies=[Depends(require_assets)])
 async def submit_preferences_api(
     group_id: str,
     user_id: str,
     prefs: UserPreference,
+    background_tasks: BackgroundTasks,
 ):
     """
     Stores preferences for a user and marks them as ready.
     """
     
-    # Normalize cuisines (e.g. "Middle Eastern" -> "middle_eastern")
-    if prefs.cuisines:
-        prefs.cuisines = [normalize_cuisine(c) for c in prefs.cuisines]
-
-    if prefs.rest_type:
-        prefs.rest_type = [normalize_cuisine(c) for c in prefs.rest_type]
-
-    if prefs.dish_pref:
-        prefs.dish_pref = [normalize_cuisine(d) for d in prefs.dish_pref]
-
-    result = submit_preferences(group_id, user_id, prefs)
+    normalize_preferences(prefs)
 
-    # Get updated status to send correct counts
-    status = group_status(group_id)
+    # The submit returns the updated counts
+    result, status = await submit_preferences(group_id, user_id, prefs)
     
     # Broadcast update via WebSocket
     await manager.broadcast(group_id, {
@@ -110,35 +192,72 @@ async def submit_preferences_api(
         "joined_count": status["total"],
         "ready_count": status["ready"]
     })
+
+    # Last member in an auto-compute group: compute after the response is sent
+    if status.get("auto_compute") and status["ready"] == status["total"]:
+        background_tasks.add_task(auto_compute_group, group_id)
     
     return result
 
+# ─────────────────────────────────────────────
+# ✏️ Edit Submitted Preferences
+# ─────────────────────────────────────────────
+@router.put("/group/submit/{group_id}/{user_id}", dependencies=[Depends(require_assets)])
+async def update_preferences_api(
+    group_id: str,
+    user_id: str,
+    prefs: UserPreference,
+):
+    """
+    Replaces a ready user's preferences before the group is computed.
+    """
+
+    normalize_preferences(prefs)
+
+    result = await update_preferences(group_id, user_id, prefs)
+
+    await manager.broadcast(group_id, {
+        "type": "PREFERENCES_UPDATED",
+        "user_id": user_id
+    })
+
+    return result
+
 # ─────────────────────────────────────────────
 # 📊 Group Status
 # ─────────────────────────────────────────────
 @router.get("/group/status/{group_id}")
-def group_status_api(group_id: str):
+async def group_status_api(group_id: str):
     """
     Returns total users and how many are ready.
     """
     
-    return group_status(group_id)
+    return await group_status(group_id)
 
 # ─────────────────────────────────────────────
 # ⚙️ Compute Group Recommendation
 # ─────────────────────────────────────────────
-@router.post("/group/compute/{group_id}")
-async def compute_group_api(group_id: str):
+@router.post("/group/compute/{group_id}", dependencies=[Depends(require_assets)])
+async def compute_group_api(
+    group_id: str,
+    top_k: int = Query(DEFAULT_TOP_K, ge=1, le=MAX_TOP_K),
+    radius_km: float = Query(DEFAULT_RADIUS_KM, gt=0, le=MAX_RADIUS_KM),
+):
     """
     Runs group recommendation once all users are ready.
+    Only restaurants with a branch within radius_km of the group are ranked.
+    A group computes once: later calls keep its result (409 while the
+    compute is still running).
     """
 
-    result = compute_group_choice(group_id)
+    restaurants = await run_group_compute(group_id, top_k=top_k, radius_km=radius_km)
+    result = {"status": "computed"}
 
-    # Broadcast update via WebSocket
-    await manager.broadcast(group_id, {
-        "event": "RESULT_COMPUTED"
-    })
+    # Broadcast update via WebSocket (members already got an existing result)
+    if restaurants is not None:
+        await manager.broadcast(group_id, {
+            "event": "RESULT_COMPUTED"
+        })
     
     return result
 
@@ -147,52 +266,78 @@ async def compute_group_api(group_id: str):
 # 📦 Fetch Recommendation Result
 # ─────────────────────────────────────────────
 @router.get("/group/result/{group_id}", response_model=RecommendationResponse)
-def fetch_result_api(group_id: str):
+async def fetch_result_api(group_id: str, if_none_match: str | None = Header(None)):
     """
     Returns top-k restaurant recommendations for the group.
+    The body was rendered at compute time; clients revalidate with
+    If-None-Match and get 304 while the result is unchanged.
     """
 
-    df = getComputedResult(group_id)
-
-    # Select columns safely
-    desired_cols = [
-        "name",
-        "rate",
-        "cuisines",
-        "rest_type",
-        "approx_cost(for two people)",
-        "location",
-        "distance_km",
-        "distance_score",
-        "final_score_adjusted",
-    ]
-    
-    existing_cols = [c for c in desired_cols if c in df.columns]
-    filtered_df = df[existing_cols].copy()
+    body, etag = await getComputedResult(group_id)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
 
-    # Handle NaN values which crash JSON serialization
-    filtered_df = filtered_df.fillna("")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
-    filtered_df = filtered_df.rename(
-        columns={
-            "approx_cost(for two people)": "cost"
-        }
-    )
 
-    filtered_df = filtered_df.fillna(0)
+async def run_group_compute(group_id: str, top_k=DEFAULT_TOP_K, radius_km=DEFAULT_RADIUS_KM):
+    """
+    Validates and claims the group, runs the recommendation in the compute
+    pool (off the event loop) and stores the rendered result. Returns the
+    validated restaurant rows, or None when the group already had a result.
+    """
+    require_assets()
+    claim = await prepare_group_compute(group_id)
+    if claim is None:
+        return None
+    aggregates, members = claim
 
-    # Convert list fields to string for schema safety
-    def list_to_str(val):
-        if isinstance(val, list):
-            return ", ".join(map(str, val))
-        return str(val)
+    try:
+        with stage("compute"):
+            result_df = await compute_pool.recommend(aggregates, top_k, radius_km, members)
+        # Rendered once here; GET /group/result serves these bytes
+        with stage("render"):
+            restaurants, body, etag = render_result(result_df)
+    except HTTPException:
+        # Let a later request compute the group again
+        await release_group_compute(group_id)
+        raise
+    except Exception as e:
+        print(f"Error computing group choice: {e}") # Log to console
+        await release_group_compute(group_id)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Failed to compute group choice: {str(e)}"
+        )
 
-    filtered_df["cuisines"] = filtered_df["cuisines"].apply(list_to_str)
-    filtered_df["rest_type"] = filtered_df["rest_type"].apply(list_to_str)
+    await store_group_result(group_id, body, etag)
+    return restaurants
 
-    restaurants = filtered_df.to_dict(orient="records")
 
-    return {"restaurants": restaurants}
+async def auto_compute_group(group_id: str):
+    """
+    Background compute for auto_compute groups. The serialized result goes
+    out in the RESULT_COMPUTED broadcast itself.
+    """
+    try:
+        restaurants = await run_group_compute(group_id)
+    except HTTPException as e:
+        # 409: a client's compute claimed the group first and broadcasts itself
+        if e.status_code != 409:
+            await manager.broadcast(group_id, {
+                "type": "COMPUTE_FAILED",
+                "detail": e.detail
+            })
+        return
+    if restaurants is None:
+        return
+
+    await manager.broadcast(group_id, {
+        "type": "RESULT_COMPUTED",
+        "event": "RESULT_COMPUTED",
+        "restaurants": restaurants
+    })
 
 # ─────────────────────────────────────────────
 # 🏁 Close Group Session (Expire in 1 min)
@@ -202,7 +347,7 @@ async def close_group_api(group_id: str):
     """
     Triggers 60s expiration for the group and notifies users.
     """
-    close_group(group_id)
+    await close_group(group_id)
     
     await manager.broadcast(group_id, {
         "type": "SESSION_CLOSING",
@@ -1,12 +1,20 @@
 import uuid
 import json
+import time
 import redis
-import pandas as pd
+import redis.asyncio as aioredis
+from redis.asyncio.client import Pipeline
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialWithJitterBackoff
 from datetime import datetime, timedelta
 from fastapi import HTTPException
 
-from src.recommendor import recommend_group
-from src import shared
+from src.group_aggregation import (
+    user_aggregate_deltas,
+    aggregate_from_counters,
+    finalize_group_aggregate,
+)
+from src.metrics import record_redis
 from .schemas import UserPreference
 
 import os
@@ -17,187 +25,473 @@ import os
 
 # For Deployment
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
-redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+# Connections shared by every request on this worker
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))  # seconds
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "2"))  # seconds
+# How long a request waits for a free pooled connection
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))  # seconds
+# Retries on connection errors / timeouts, with jittered exponential backoff
+REDIS_RETRIES = int(os.getenv("REDIS_RETRIES", "3"))
+REDIS_BACKOFF_BASE = float(os.getenv("REDIS_BACKOFF_BASE", "0.05"))  # seconds
+REDIS_BACKOFF_CAP = float(os.getenv("REDIS_BACKOFF_CAP", "1"))  # seconds
+
+class TimedRedis(aioredis.Redis):
+    """
+    Redis client that times every round trip (see src/metrics.py): per
+    command, and per request in the active trace.
+    """
+    async def execute_command(self, *args, **options):
+        command = str(args[0]).upper()
+        if command == "EVALSHA":
+            command = f"EVALSHA {SCRIPT_NAMES.get(args[1], 'unknown')}"
+        start = time.perf_counter()
+        try:
+            result = await super().execute_command(*args, **options)
+        except Exception:
+            record_redis(command, time.perf_counter() - start, failed=True)
+            raise
+        record_redis(command, time.perf_counter() - start)
+        return result
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class TimedPipeline(Pipeline):
+    """
+    A pipeline is one round trip, recorded as MULTI (or PIPELINE).
+    """
+    async def execute(self, raise_on_error=True):
+        command = "MULTI" if self.is_transaction else "PIPELINE"
+        start = time.perf_counter()
+        try:
+            result = await super().execute(raise_on_error)
+        except Exception:
+            record_redis(command, time.perf_counter() - start, failed=True)
+            raise
+        record_redis(command, time.perf_counter() - start)
+        return result
+
+
+def make_redis_client(url=REDIS_URL, retries=REDIS_RETRIES):
+    """
+    asyncio Redis client over a bounded connection pool. Requests await
+    their round trips instead of blocking the event loop, and wait for a
+    free connection when the pool is exhausted.
+    Commands run on the pool's connections, so the retry policy is set on
+    the pool: a client-level one would be ignored.
+    """
+    pool = aioredis.BlockingConnectionPool.from_url(
+        url,
+        decode_responses=True,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        retry=Retry(
+            ExponentialWithJitterBackoff(cap=REDIS_BACKOFF_CAP, base=REDIS_BACKOFF_BASE),
+            retries,
+        ),
+        retry_on_error=[redis.exceptions.ConnectionError, redis.exceptions.TimeoutError],
+    )
+    return TimedRedis(connection_pool=pool)
+
+redis_client = make_redis_client()
+# Submit and edit apply deltas: if the reply to one that ran is lost, a
+# retry would be refused (already_ready / changed) and the user would get an
+# error for a change that was saved. Their scripts run on a client that
+# never retries; a lost connection surfaces as 503 instead.
+no_retry_client = make_redis_client(retries=0)
 EXPIRATION_SECONDS = 600  # 10 minutes
+# A compute claim outlives any compute (COMPUTE_TIMEOUT); if the worker
+# holding it dies, the group can be computed again after this
+COMPUTE_CLAIM_SECONDS = 60
 
-def get_group_from_redis(group_id: str):
+async def store_reachable():
+    """
+    Readiness check: True when Redis answers a PING.
+    """
     try:
-        data = redis_client.get(group_id)
-    except redis.exceptions.ConnectionError:
-        raise HTTPException(status_code=503, detail="Redis connection failed")
-        
-    if not data:
-        raise HTTPException(
-            status_code=404,
-            detail="Group not found"
-        )
-    return json.loads(data)
+        return bool(await redis_client.ping())
+    except redis.exceptions.RedisError:
+        return False
 
-def save_group_to_redis(group_id: str, data: dict):
-    # Using setex to ensure the group expires if abandoned
-    redis_client.setex(group_id, EXPIRATION_SECONDS, json.dumps(data))
+## Group layout: one hash per group, at mnm:group:<group_id>
+##   total, ready       server-maintained participant counters
+##   auto_compute       "1" / "0"
+##   result             rendered result response JSON, once computed
+##   result_etag        its ETag
+##   computing          deadline (server time) of the compute in flight
+##   user:<user_id>     JSON preferences ("" until submitted)
+##   agg:<field>:<item> running aggregate counters (cuisines, rest_type,
+##   agg:<field>        dish_pref, budgets) and lat_sum / lng_sum / located
+## Writes run as Lua scripts: each applies its change atomically on the
+## server and returns the new counts in the same round trip.
 
-def create_group():
-    group_id = str(uuid.uuid4())[:8]
-    
+# Keys are namespaced so the expiry listener can tell groups apart from
+# the other keys in the database (e.g. the result cache's mnm:reco:*)
+GROUP_KEY_PREFIX = "mnm:group:"
+USER_PREFIX = "user:"
+AGG_PREFIX = "agg:"
 
-    group_data = {
-        "participants": {},
-        "result": None,
-    }
-    
-    save_group_to_redis(group_id, group_data)
-    return group_id
+# Shared by the scripts: applies ARGV[first..] as (field, delta) pairs to
+# the aggregate counters, dropping counts that reach zero
+_APPLY_DELTAS = """
+local function apply_deltas(key, first)
+    for i = first, #ARGV, 2 do
+        local value = tonumber(redis.call('HINCRBYFLOAT', key, ARGV[i], ARGV[i + 1]))
+        if value <= 0 and string.find(ARGV[i], ':', 5, true) then
+            redis.call('HDEL', key, ARGV[i])
+        end
+    end
+end
+"""
 
+_COUNTS = """
+local function counts(key)
+    local c = redis.call('HMGET', key, 'total', 'ready', 'auto_compute')
+    return {'ok', tonumber(c[1]), tonumber(c[2]), c[3]}
+end
+"""
 
-def add_user(group_id):
-    group = get_group_from_redis(group_id)
+# KEYS[1] group, ARGV: user field, ttl
+# HSETNX keeps a retried join from being counted twice
+JOIN_SCRIPT = _COUNTS + """
+if redis.call('EXISTS', KEYS[1]) == 0 then return {'missing'} end
+if redis.call('HEXISTS', KEYS[1], 'result') == 1 then return {'computed'} end
+if redis.call('HSETNX', KEYS[1], ARGV[1], '') == 1 then
+    redis.call('HINCRBY', KEYS[1], 'total', 1)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return counts(KEYS[1])
+"""
 
-    ##check if group_id already computed results
-    if group["result"] is not None:
-        raise HTTPException(
-            status_code=400,
-            detail="Group already computed results"
-        )
+# KEYS[1] group, ARGV: user field, preferences JSON, ttl, (field, delta)...
+SUBMIT_SCRIPT = _APPLY_DELTAS + _COUNTS + """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if not current then
+    if redis.call('EXISTS', KEYS[1]) == 0 then return {'missing'} end
+    return {'unknown_user'}
+end
+if current ~= '' then return {'already_ready'} end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HINCRBY', KEYS[1], 'ready', 1)
+apply_deltas(KEYS[1], 4)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return counts(KEYS[1])
+"""
 
-    user_id = str(uuid.uuid4())[:6]
-    group["participants"][user_id] = {
-        "preferences": None,
-        "ready": False
+# KEYS[1] group, ARGV: user field, expected preferences JSON, new JSON, ttl,
+# (field, delta)... The deltas were computed from the expected preferences:
+# 'changed' means they were replaced in between and the caller retries
+UPDATE_SCRIPT = _APPLY_DELTAS + _COUNTS + """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if not current then
+    if redis.call('EXISTS', KEYS[1]) == 0 then return {'missing'} end
+    return {'unknown_user'}
+end
+if redis.call('HEXISTS', KEYS[1], 'result') == 1 then return {'computed'} end
+if current == '' then return {'not_ready'} end
+if current ~= ARGV[2] then return {'changed'} end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+apply_deltas(KEYS[1], 5)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return counts(KEYS[1])
+"""
+
+# KEYS[1] group, ARGV: claim seconds. Validates the group and claims its
+# compute, so the auto compute and a client's compute never both run.
+# Returns the counters and aggregate fields only (no preferences or
+# result), so the payload does not grow with the group's documents
+CLAIM_COMPUTE_SCRIPT = """
+local c = redis.call('HMGET', KEYS[1], 'total', 'ready', 'result', 'computing')
+if not c[1] then return {'missing'} end
+if c[3] then return {'computed'} end
+local now = tonumber(redis.call('TIME')[1])
+if c[4] and tonumber(c[4]) > now then return {'computing'} end
+if tonumber(c[1]) == 0 then return {'empty'} end
+if tonumber(c[2]) < tonumber(c[1]) then return {'waiting'} end
+redis.call('HSET', KEYS[1], 'computing', now + tonumber(ARGV[1]))
+local fields = redis.call('HGETALL', KEYS[1])
+local out = {'ok'}
+for i = 1, #fields, 2 do
+    local name = fields[i]
+    if name == 'total' or name == 'ready' or string.sub(name, 1, 4) == 'agg:' then
+        out[#out + 1] = name
+        out[#out + 1] = fields[i + 1]
+    end
+end
+return out
+"""
+
+# KEYS[1] group, ARGV: result body, ETag, ttl
+STORE_RESULT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+redis.call('HSET', KEYS[1], 'result', ARGV[1], 'result_etag', ARGV[2])
+redis.call('HDEL', KEYS[1], 'computing')
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+join_script = redis_client.register_script(JOIN_SCRIPT)
+submit_script = no_retry_client.register_script(SUBMIT_SCRIPT)
+update_script = no_retry_client.register_script(UPDATE_SCRIPT)
+# A retried claim would find its own claim and refuse the compute
+claim_compute_script = no_retry_client.register_script(CLAIM_COMPUTE_SCRIPT)
+store_result_script = redis_client.register_script(STORE_RESULT_SCRIPT)
+# Script SHA -> name, for the per-command Redis metrics
+SCRIPT_NAMES = {
+    join_script.sha: "join",
+    submit_script.sha: "submit",
+    update_script.sha: "update",
+    claim_compute_script.sha: "claim_compute",
+    store_result_script.sha: "store_result",
+}
+
+def group_key(group_id: str):
+    return GROUP_KEY_PREFIX + group_id
+
+SCRIPT_ERRORS = {
+    "missing": (404, "Group not found"),
+    "unknown_user": (404, "User not found"),
+    "computed": (400, "Group already computed results"),
+    "already_ready": (400, "User already submitted preferences"),
+    "not_ready": (400, "User has not submitted preferences yet"),
+    "empty": (400, "Group is empty"),
+    "waiting": (400, "Not all users are ready"),
+    "computing": (409, "Group compute already in progress"),
+}
+
+async def run_script(script, group_id: str, args):
+    """
+    Runs a group script and returns its counts as a group_status dict.
+    Script refusals become the matching HTTPException.
+    """
+    try:
+        reply = await script(keys=[group_key(group_id)], args=args)
+    except redis.exceptions.RedisError:
+        raise HTTPException(status_code=503, detail="Redis connection failed")
+
+    if reply[0] != "ok":
+        if reply[0] in SCRIPT_ERRORS:
+            status_code, detail = SCRIPT_ERRORS[reply[0]]
+            raise HTTPException(status_code=status_code, detail=detail)
+        return reply[0]
+    return status_from_counts(*reply[1:])
+
+def status_from_counts(total, ready, auto_compute):
+    return {
+        "total": int(total or 0),
+        "ready": int(ready or 0),
+        "auto_compute": auto_compute == "1",
     }
-    
-    save_group_to_redis(group_id, group)
-    return user_id
 
-def submit_preferences(group_id, user_id, prefs: UserPreference):
-    
-    group = get_group_from_redis(group_id)
+def encode_deltas(deltas):
+    """
+    Flat aggregate deltas -> alternating (hash field, delta) script args.
+    """
+    args = []
+    for (field, item), value in deltas.items():
+        args.append(f"{AGG_PREFIX}{field}" if item is None else f"{AGG_PREFIX}{field}:{item}")
+        args.append(repr(float(value)))
+    return args
 
-    if user_id not in group["participants"]:
-        raise HTTPException(
-            status_code=404,
-            detail="User not found"
-        )
-    
-    ## Checking if a user has already submitted preferences
-    if group["participants"][user_id]["ready"]:
-        raise HTTPException(
-            status_code=400,
-            detail="User already submitted preferences"
-        )
+def decode_aggregate(fields):
+    counters = {}
+    for name, value in fields.items():
+        if not name.startswith(AGG_PREFIX):
+            continue
+        # agg:<field> (no separator) is a field-level counter; an item may be
+        # empty, e.g. the "" cuisine normalize_cuisine makes of 'None'
+        field, separator, item = name[len(AGG_PREFIX):].partition(":")
+        if not separator:
+            item = None
+        elif field == "budgets":
+            item = int(item)
+        counters[(field, item)] = float(value)
+    return aggregate_from_counters(counters)
+
+async def create_group(auto_compute=False):
+    group_id = str(uuid.uuid4())[:8]
 
     try:
-        # prefs is a Pydantic model, convert to dict for storage
-        group["participants"][user_id]["preferences"] = prefs.dict()
-        group["participants"][user_id]["ready"] = True
-        
-        save_group_to_redis(group_id, group)
-        return {"status": "submitted"}
+        # One round trip; the hash expires if the group is abandoned
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(group_key(group_id), mapping={
+                "total": 0,
+                "ready": 0,
+                # Compute in the background once everyone is ready (opt-in)
+                "auto_compute": int(auto_compute),
+            })
+            pipe.expire(group_key(group_id), EXPIRATION_SECONDS)
+            await pipe.execute()
+    except redis.exceptions.RedisError:
+        raise HTTPException(status_code=503, detail="Redis connection failed")
+    return group_id
+
+
+async def add_user(group_id):
+    """
+    Returns (user_id, group status after the join).
+    """
+    user_id = str(uuid.uuid4())[:6]
+    status = await run_script(
+        join_script, group_id, [USER_PREFIX + user_id, EXPIRATION_SECONDS]
+    )
+    return user_id, status
 
+async def submit_preferences(group_id, user_id, prefs: UserPreference):
+    """
+    Returns (response, group status after the submit).
+    """
+    # prefs is a Pydantic model, convert to dict for storage
+    preferences = prefs.dict()
+
+    try:
+        deltas = encode_deltas(user_aggregate_deltas(preferences))
     except Exception as e:
         raise HTTPException(
             status_code=400,
             detail="Failed to submit preferences"
         )
 
-##For getting group status
-def group_status(group_id):
-    group = get_group_from_redis(group_id)
+    status = await run_script(
+        submit_script,
+        group_id,
+        [USER_PREFIX + user_id, json.dumps(preferences), EXPIRATION_SECONDS, *deltas],
+    )
+    return {"status": "submitted"}, status
 
-    try: 
-        participants = group["participants"]
-        ready_count = sum(p["ready"] for p in participants.values())
+## For editing already submitted preferences (applied as a delta)
+async def update_preferences(group_id, user_id, prefs: UserPreference):
+    preferences = prefs.dict()
+    new_data = json.dumps(preferences)
 
-        return {
-            "total": len(participants),
-            "ready": ready_count,
-        }
-    except Exception as e:
-        raise HTTPException(
-            status_code=400,
-            detail="Failed to get group status"
+    while True:
+        try:
+            old_data = await redis_client.hget(group_key(group_id), USER_PREFIX + user_id)
+        except redis.exceptions.RedisError:
+            raise HTTPException(status_code=503, detail="Redis connection failed")
+
+        try:
+            deltas = {}
+            if old_data:
+                user_aggregate_deltas(json.loads(old_data), sign=-1, deltas=deltas)
+            deltas = encode_deltas(user_aggregate_deltas(preferences, deltas=deltas))
+        except Exception as e:
+            raise HTTPException(
+                status_code=400,
+                detail="Failed to update preferences"
+            )
+
+        # The script reports missing groups / users and unsubmitted users
+        reply = await run_script(
+            update_script,
+            group_id,
+            [USER_PREFIX + user_id, old_data or "", new_data, EXPIRATION_SECONDS, *deltas],
         )
+        if reply != "changed":
+            return {"status": "updated"}
 
-##For computing group choice
-def compute_group_choice(group_id):
-    group = get_group_from_redis(group_id)
-    
-    if not group["participants"]:
-        raise HTTPException(
-            status_code=400,
-            detail="Group is empty"
+##For getting group status
+async def group_status(group_id):
+    try:
+        total, ready, auto_compute = await redis_client.hmget(
+            group_key(group_id), ["total", "ready", "auto_compute"]
         )
-        
-    participants = group["participants"]
-    ## all() returns true if and only if all values are true, even if one false returns false
-    if not all(p["ready"] for p in participants.values()):
+    except redis.exceptions.RedisError:
+        raise HTTPException(status_code=503, detail="Redis connection failed")
+
+    if total is None:
         raise HTTPException(
-            status_code=400,
-            detail="Not all users are ready"
+            status_code=404,
+            detail="Group not found"
         )
+    return status_from_counts(total, ready, auto_compute)
 
+##For validating a group and finalizing its preferences before compute
+async def prepare_group_compute(group_id):
+    """
+    Checks the group can be computed and claims its compute (409 while
+    another one is in flight). Returns (aggregated preferences, member
+    count), or None when the group already has its result.
+    """
     try:
-        users = [
-            p["preferences"]
-            for p in group["participants"].values()
-            if p["ready"] and p["preferences"]
-        ]
-
-        if not users:
-            raise HTTPException(
-                status_code=400,
-                detail="No ready users with preferences",
-            )
-
-        # Recommend
-        # returns a pandas DataFrame
-        result_df = recommend_group(
-            df_full=shared.zomato_unique,
-            coord_dict=shared.coord_dict,
-            users_list=users,
-            top_k=10,
+        reply = await claim_compute_script(
+            keys=[group_key(group_id)], args=[COMPUTE_CLAIM_SECONDS]
         )
+    except redis.exceptions.RedisError:
+        raise HTTPException(status_code=503, detail="Redis connection failed")
 
-        # store result as list of dicts (JSON serializable)
-        group["result"] = result_df.to_dict(orient="records")
-        
-        save_group_to_redis(group_id, group)
+    if reply[0] == "computed":
+        return None
+    if reply[0] != "ok":
+        status_code, detail = SCRIPT_ERRORS[reply[0]]
+        raise HTTPException(status_code=status_code, detail=detail)
 
-        return {"status": "computed"}
+    # The group was aggregated on the server on every submit
+    fields = dict(zip(reply[1::2], reply[2::2]))
+    return finalize_group_aggregate(decode_aggregate(fields)), int(fields["total"])
 
-    except Exception as e:
-        print(f"Error computing group choice: {e}") # Log to console
+async def release_group_compute(group_id):
+    """
+    Drops the claim of a compute that failed, so the group can be computed again.
+    """
+    try:
+        await redis_client.hdel(group_key(group_id), "computing")
+    except redis.exceptions.RedisError:
+        # The claim expires by itself (COMPUTE_CLAIM_SECONDS)
+        pass
+
+##For storing a computed result
+async def store_group_result(group_id, body, etag):
+    """
+    Stores the rendered result response (see api/results.py) and its ETag,
+    ending the compute claim.
+    """
+    try:
+        stored = await store_result_script(
+            keys=[group_key(group_id)], args=[body, etag, EXPIRATION_SECONDS]
+        )
+    except redis.exceptions.RedisError:
+        raise HTTPException(status_code=503, detail="Redis connection failed")
+    if not stored:
         raise HTTPException(
-            status_code=400,
-            detail=f"Failed to compute group choice: {str(e)}"
+            status_code=404,
+            detail="Group not found"
         )
 
 ## For getting computed result
-def getComputedResult(group_id):
-    group = get_group_from_redis(group_id)
-
+async def getComputedResult(group_id):
+    """
+    Returns (body, etag) of the rendered result response.
+    """
     try:
-        if group["result"] is None:
-            raise HTTPException(status_code=404, detail="Result not computed yet")
-        else:
-            # Reconstruct DataFrame from JSON data
-            return pd.DataFrame(group["result"])
-
-    except HTTPException:
-        raise
-    except Exception as e:
+        body, etag, total = await redis_client.hmget(
+            group_key(group_id), ["result", "result_etag", "total"]
+        )
+    except redis.exceptions.RedisError:
+        raise HTTPException(status_code=503, detail="Redis connection failed")
+
+    if total is None:
         raise HTTPException(
-            status_code=400,
-            detail="Failed to get computed result"
+            status_code=404,
+            detail="Group not found"
         )
+    if body is None:
+        raise HTTPException(status_code=404, detail="Result not computed yet")
+    return body, etag
         
 
-def close_group(group_id: str):
+async def close_group(group_id: str):
     """
     Sets the group to expire in 60 seconds.
     """
-    if redis_client.exists(group_id):
-        # Set expiry to 30 seconds
-        redis_client.expire(group_id, 30)
-    else:
+    try:
+        # Set expiry to 30 seconds (EXPIRE answers 0 when the key is missing)
+        found = await redis_client.expire(group_key(group_id), 30)
+    except redis.exceptions.RedisError:
+        raise HTTPException(status_code=503, detail="Redis connection failed")
+    if not found:
         raise HTTPException(status_code=404, detail="Group not found")
\ No newline at end of file
@@ -1,90 +1,228 @@
 ## Without Using Redis 
+## Same async interface as session_redis, so routes can swap the import
+## Expiry: every group has a monotonic deadline, kept in a min-heap, so
+## expiring a group costs O(log n) and happens on time (wait_for_expired_groups)
+## instead of on a periodic scan of every group. Rescheduling (close_group)
+## pushes a new entry; the superseded one is skipped when popped.
 
+import time
 import uuid
-from datetime import datetime, timedelta
+import heapq
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
 from fastapi import HTTPException
 
-from src.recommendor import recommend_group
-from src import shared
+from src.group_aggregation import (
+    empty_group_aggregate,
+    apply_user_to_aggregate,
+    finalize_group_aggregate,
+)
 
 GROUPS = {}
 
-def create_group():
+GROUP_TTL_SECONDS = 15 * 60
+CLOSE_TTL_SECONDS = 30
+
+# (deadline, group_id); a group's live entry is the one matching its expires_at
+_expiry_heap = []
+# Set when a deadline earlier than the ones being waited for is scheduled
+_expiry_changed = asyncio.Event()
+
+# group_id -> [asyncio.Lock, holders]; serializes the handlers writing a group
+_group_locks = {}
+
+@asynccontextmanager
+async def group_lock(group_id: str):
+    entry = _group_locks.setdefault(group_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _group_locks[group_id]
+
+def schedule_expiry(group_id, ttl):
+    """
+    (Re)sets the group to expire ttl seconds from now.
+    """
+    deadline = time.monotonic() + ttl
+    GROUPS[group_id]["expires_at"] = deadline
+    heapq.heappush(_expiry_heap, (deadline, group_id))
+    if _expiry_heap[0][1] == group_id:
+        _expiry_changed.set()
+
+async def create_group(auto_compute=False):
     group_id = str(uuid.uuid4())[:8]
     GROUPS[group_id] = {
         "participants": {},
         "result": None,
+        # A compute is in flight (claimed by prepare_group_compute)
+        "computing": False,
+        # Compute in the background once everyone is ready (opt-in)
+        "auto_compute": auto_compute,
+        # Running group preferences, updated on every submit
+        "aggregate": empty_group_aggregate(),
         "created_at": datetime.utcnow(),
-        "expires_at": datetime.utcnow() + timedelta(minutes=15)
     }
+    schedule_expiry(group_id, GROUP_TTL_SECONDS)
     return group_id
 
+async def store_reachable():
+    # Readiness check: the in-memory store has nothing to connect to
+    return True
+
+def pop_expired_groups(now=None):
+    """
+    Removes every group past its deadline; returns their ids.
+    """
+    now = time.monotonic() if now is None else now
+    expired_ids = []
+    while _expiry_heap and _expiry_heap[0][0] <= now:
+        deadline, gid = heapq.heappop(_expiry_heap)
+        group = GROUPS.get(gid)
+        # Deleted already, or rescheduled (a newer entry is in the heap)
+        if group is None or group["expires_at"] != deadline:
+            continue
+        del GROUPS[gid]
+        expired_ids.append(gid)
+    return expired_ids
+
 def cleanup_expired_groups():
     """
     Removes groups that have passed their expiration time.
     Returns the number of groups deleted.
     """
-    now = datetime.utcnow()
-    expired_ids = [gid for gid, data in GROUPS.items() if data["expires_at"] < now]
-    
-    for gid in expired_ids:
-        del GROUPS[gid]       
-    return len(expired_ids)
+    return len(pop_expired_groups())
 
+async def wait_for_expired_groups():
+    """
+    Sleeps until the earliest deadline, then removes and returns the
+    expired group ids (never an empty list).
+    """
+    while True:
+        expired_ids = pop_expired_groups()
+        if expired_ids:
+            return expired_ids
 
-def add_user(group_id):
+        _expiry_changed.clear()
+        timeout = _expiry_heap[0][0] - time.monotonic() if _expiry_heap else None
+        try:
+            await asyncio.wait_for(_expiry_changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
 
-    if group_id not in GROUPS:
-        raise HTTPException(
-            status_code=404,
-            detail="Group not found"
-        )
-    ##check if group_id already computed results
-    if GROUPS[group_id]["result"] is not None:
-        raise HTTPException(
-            status_code=400,
-            detail="Group already computed results"
-        )
 
-    user_id = str(uuid.uuid4())[:6]
-    GROUPS[group_id]["participants"][user_id] = {
-        "preferences": None,
-        "ready": False
-    }
-    return user_id
+async def add_user(group_id):
+    """
+    Returns (user_id, group status after the join).
+    """
+    async with group_lock(group_id):
+        if group_id not in GROUPS:
+            raise HTTPException(
+                status_code=404,
+                detail="Group not found"
+            )
+        ##check if group_id already computed results
+        if GROUPS[group_id]["result"] is not None:
+            raise HTTPException(
+                status_code=400,
+                detail="Group already computed results"
+            )
 
-def submit_preferences(group_id, user_id, prefs):
+        user_id = str(uuid.uuid4())[:6]
+        GROUPS[group_id]["participants"][user_id] = {
+            "preferences": None,
+            "ready": False
+        }
+        return user_id, counts(GROUPS[group_id])
 
-    if group_id not in GROUPS:
-        raise HTTPException(
-            status_code=404,
-            detail="Group not found"
-        )
-    if user_id not in GROUPS[group_id]["participants"]:
-        raise HTTPException(
-            status_code=404,
-            detail="User not found"
-        )
-    ## Checking if a user has already submitted preferences
-    if GROUPS[group_id]["participants"][user_id]["ready"]:
-        raise HTTPException(
-            status_code=400,
-            detail="User already submitted preferences"
-        )
+async def submit_preferences(group_id, user_id, prefs):
+    """
+    Returns (response, group status after the submit).
+    """
+    async with group_lock(group_id):
+        if group_id not in GROUPS:
+            raise HTTPException(
+                status_code=404,
+                detail="Group not found"
+            )
+        if user_id not in GROUPS[group_id]["participants"]:
+            raise HTTPException(
+                status_code=404,
+                detail="User not found"
+            )
+        ## Checking if a user has already submitted preferences
+        if GROUPS[group_id]["participants"][user_id]["ready"]:
+            raise HTTPException(
+                status_code=400,
+                detail="User already submitted preferences"
+            )
 
-    try:
-        GROUPS[group_id]["participants"][user_id]["preferences"] = prefs.dict()
-        GROUPS[group_id]["participants"][user_id]["ready"] = True
-        return {"status": "submitted"}
+        try:
+            preferences = prefs.dict()
+            apply_user_to_aggregate(GROUPS[group_id]["aggregate"], preferences)
+            GROUPS[group_id]["participants"][user_id]["preferences"] = preferences
+            GROUPS[group_id]["participants"][user_id]["ready"] = True
+            return {"status": "submitted"}, counts(GROUPS[group_id])
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=400,
-            detail="Failed to submit preferences"
-        )
+        except Exception as e:
+            raise HTTPException(
+                status_code=400,
+                detail="Failed to submit preferences"
+            )
+
+## For editing already submitted preferences (applied as a delta)
+async def update_preferences(group_id, user_id, prefs):
+    async with group_lock(group_id):
+        if group_id not in GROUPS:
+            raise HTTPException(
+                status_code=404,
+                detail="Group not found"
+            )
+        if user_id not in GROUPS[group_id]["participants"]:
+            raise HTTPException(
+                status_code=404,
+                detail="User not found"
+            )
+        if GROUPS[group_id]["result"] is not None:
+            raise HTTPException(
+                status_code=400,
+                detail="Group already computed results"
+            )
+        participant = GROUPS[group_id]["participants"][user_id]
+        if not participant["ready"]:
+            raise HTTPException(
+                status_code=400,
+                detail="User has not submitted preferences yet"
+            )
+
+        try:
+            aggregate = GROUPS[group_id]["aggregate"]
+            preferences = prefs.dict()
+            apply_user_to_aggregate(aggregate, participant["preferences"], sign=-1)
+            apply_user_to_aggregate(aggregate, preferences)
+            participant["preferences"] = preferences
+            return {"status": "updated"}
+
+        except Exception as e:
+            raise HTTPException(
+                status_code=400,
+                detail="Failed to update preferences"
+            )
+
+def counts(group):
+    participants = group["participants"]
+    return {
+        "total": len(participants),
+        "ready": sum(p["ready"] for p in participants.values()),
+        "auto_compute": group.get("auto_compute", False),
+    }
 
 ##For getting group status
-def group_status(group_id):
+async def group_status(group_id):
     if group_id not in GROUPS:
         raise HTTPException(
             status_code=404,
@@ -92,27 +230,34 @@ def group_status(group_id):
         ) 
 
     try: 
-        participants = GROUPS[group_id]["participants"]
-        ready_count = sum(p["ready"] for p in participants.values())
-
-        return {
-            "total": len(participants),
-            "ready": ready_count,
-        }
+        return counts(GROUPS[group_id])
     except Exception as e:
         raise HTTPException(
             status_code=400,
             detail="Failed to get group status"
         )
 
-##For computing group choice
-def compute_group_choice(group_id):
+##For validating a group and finalizing its preferences before compute
+async def prepare_group_compute(group_id):
+    """
+    Checks the group can be computed and claims its compute (409 while
+    another one is in flight). Returns (aggregated preferences, member
+    count), or None when the group already has its result.
+    """
     if group_id not in GROUPS:
         raise HTTPException(
             status_code=404,
             detail="Group not found"
         )
-    
+
+    if GROUPS[group_id]["result"] is not None:
+        return None
+
+    if GROUPS[group_id]["computing"]:
+        raise HTTPException(
+            status_code=409,
+            detail="Group compute already in progress"
+        )
     
     if not GROUPS[group_id]["participants"]:
         raise HTTPException(
@@ -128,53 +273,70 @@ def compute_group_choice(group_id):
             detail="Not all users are ready"
         )
 
-    try:
-        users = [
-            p["preferences"]
-            for p in GROUPS[group_id]["participants"].values()
-            if p["ready"] and p["preferences"]
-        ]
-
-        if not users:
-            raise HTTPException(
-                status_code=400,
-                detail="No ready users with preferences",
-            )
+    users = [
+        p["preferences"]
+        for p in GROUPS[group_id]["participants"].values()
+        if p["ready"] and p["preferences"]
+    ]
 
-        # Recommend
-        result = recommend_group(
-            df_full=shared.zomato_unique,
-            coord_dict=shared.coord_dict,
-            users_list=users,
-            top_k=10,
+    if not users:
+        raise HTTPException(
+            status_code=400,
+            detail="No ready users with preferences",
         )
 
-        GROUPS[group_id]["result"] = result
+    # No await since the checks: nothing else can claim the group in between
+    GROUPS[group_id]["computing"] = True
+    # The group was aggregated incrementally on submit
+    return finalize_group_aggregate(GROUPS[group_id]["aggregate"]), len(participants)
 
-        return {"status": "computed"}
+async def release_group_compute(group_id):
+    """
+    Drops the claim of a compute that failed, so the group can be computed again.
+    """
+    if group_id in GROUPS:
+        GROUPS[group_id]["computing"] = False
 
-    except Exception as e:
-        print(f"Error computing group choice: {e}") # Log to console
-        raise HTTPException(
-            status_code=400,
-            detail=f"Failed to compute group choice: {str(e)}"
-        )
+##For storing a computed result
+async def store_group_result(group_id, body, etag):
+    """
+    Stores the rendered result response (see api/results.py) and its ETag,
+    ending the compute claim.
+    """
+    async with group_lock(group_id):
+        if group_id not in GROUPS:
+            raise HTTPException(
+                status_code=404,
+                detail="Group not found"
+            )
+        GROUPS[group_id]["result"] = (body, etag)
+        GROUPS[group_id]["computing"] = False
 
 ## For getting computed result
-def getComputedResult(group_id):
+async def getComputedResult(group_id):
+    """
+    Returns (body, etag) of the rendered result response.
+    """
     if group_id not in GROUPS:
         raise HTTPException(
             status_code=404,
             detail="Group not found"
         )
-    try:
-        if GROUPS[group_id]["result"] is None:
-            raise HTTPException(status_code=404, detail="Result not computed yet")
-        else:
-            return GROUPS[group_id]["result"]
+    if GROUPS[group_id]["result"] is None:
+        raise HTTPException(status_code=404, detail="Result not computed yet")
+    return GROUPS[group_id]["result"]
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=400,
-            detail="Failed to get computed result"
-        )
\ No newline at end of file
+
+async def close_group(group_id: str):
+    """
+    Shortens the group's remaining lifetime to CLOSE_TTL_SECONDS.
+    """
+    async with group_lock(group_id):
+        if group_id not in GROUPS:
+            raise HTTPException(
+                status_code=404,
+                detail="Group not found"
+            )
+        remaining = GROUPS[group_id]["expires_at"] - time.monotonic()
+        if remaining > CLOSE_TTL_SECONDS:
+            schedule_expiry(group_id, CLOSE_TTL_SECONDS)
@@ -1,51 +1,157 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import List, Dict
+from typing import Dict, Set
+import os
 import json
+import time
+import asyncio
+
+from src.metrics import (
+    Gauge,
+    register,
+    stage,
+    ws_fanout_seconds,
+    ws_fanout_recipients,
+    ws_send_failures,
+)
+
+# A client that cannot take a message within this long is dropped, so one
+# slow socket never holds up the rest of its group
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "2"))  # seconds
+# "local": broadcasts reach this process's sockets only (single worker).
+# "redis": also relayed to the other workers / pods (see api/ws_pubsub.py)
+WS_BROADCAST = os.getenv("WS_BROADCAST", "local")
 
 class ConnectionManager:
-    def __init__(self):
-        # group_id -> List[WebSocket]
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+    def __init__(self, send_timeout=WS_SEND_TIMEOUT):
+        # group_id -> Set[WebSocket]
+        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        self.send_timeout = send_timeout
+        # RedisFanout when broadcasts are relayed between workers
+        self.fanout = None
+
+    async def start(self, backend=WS_BROADCAST, client=None):
+        if backend == "redis" and self.fanout is None:
+            from .ws_pubsub import RedisFanout
+            self.fanout = RedisFanout(self, client=client)
+            # Sockets accepted before the start
+            for group_id in list(self.active_connections):
+                await self.fanout.sync(group_id)
+            print(f"WebSocket broadcasts relayed over Redis pub/sub (worker {self.fanout.origin})")
+
+    async def stop(self):
+        if self.fanout is not None:
+            await self.fanout.close()
+            self.fanout = None
 
     async def connect(self, websocket: WebSocket, group_id: str):
         await websocket.accept()
-        if group_id not in self.active_connections:
-            self.active_connections[group_id] = []
-        self.active_connections[group_id].append(websocket)
+        self.active_connections.setdefault(group_id, set()).add(websocket)
         print(f"WebSocket Connected: Group {group_id}, Total connections: {len(self.active_connections[group_id])}")
+        if self.fanout is not None:
+            await self.fanout.sync(group_id)
 
     def disconnect(self, websocket: WebSocket, group_id: str):
-        if group_id in self.active_connections:
-            if websocket in self.active_connections[group_id]:
-                self.active_connections[group_id].remove(websocket)
-                print(f"WebSocket Disconnected: Group {group_id}, Remaining: {len(self.active_connections[group_id])}")
-            if not self.active_connections[group_id]:
-                del self.active_connections[group_id]
+        connections = self.active_connections.get(group_id)
+        if connections is None or websocket not in connections:
+            return
+        connections.discard(websocket)
+        print(f"WebSocket Disconnected: Group {group_id}, Remaining: {len(connections)}")
+        if not connections:
+            del self.active_connections[group_id]
+            if self.fanout is not None:
+                self.fanout.sync_later(group_id)
 
     async def broadcast(self, group_id: str, message: dict):
-        if group_id in self.active_connections:
-            # Iterate over a copy in case connections drop during broadcast
-            for connection in self.active_connections[group_id][:]:
-                try:
-                    await connection.send_text(json.dumps(message))
-                except Exception as e:
-                    print(f"Error broadcasting to client in group {group_id}: {e}")
-                    # Optionally disconnect broken connections here
-                    # self.disconnect(connection, group_id)
+        """
+        Sends message to every socket of the group, on every worker when
+        relayed over Redis. Returns the number of local sockets reached.
+        """
+        with stage("ws.broadcast"):
+            text = json.dumps(message)
+            if self.fanout is None:
+                return await self.send_local(group_id, text)
+
+            sent, _ = await asyncio.gather(
+                self.send_local(group_id, text),
+                self.fanout.publish(group_id, text),
+            )
+            return sent
+
+    async def broadcast_local(self, group_id: str, message: dict):
+        """
+        Sends message to this worker's sockets of the group only (for
+        events every worker sees anyway, like Redis key expiry).
+        """
+        return await self.send_local(group_id, json.dumps(message))
 
+    async def send_local(self, group_id: str, text: str):
+        """
+        Sends serialized text to this worker's sockets of the group
+        concurrently; sockets that fail or time out are evicted.
+        Returns the number of sockets that received it.
+        """
+        connections = self.active_connections.get(group_id)
+        if not connections:
+            return 0
+
+        # Snapshot: sockets may connect / drop while the sends are in flight
+        targets = list(connections)
+        start = time.perf_counter()
+        sent = await asyncio.gather(*[self._send(ws, group_id, text) for ws in targets])
+        ws_fanout_seconds.observe(time.perf_counter() - start)
+        ws_fanout_recipients.observe(len(targets))
+        return sum(sent)
+
+    async def _send(self, websocket: WebSocket, group_id: str, text: str):
+        try:
+            await asyncio.wait_for(websocket.send_text(text), self.send_timeout)
+            return True
+        except Exception as e:
+            ws_send_failures.inc("timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+            print(f"Error broadcasting to client in group {group_id}: {e!r}, dropping it")
+            self.disconnect(websocket, group_id)
+            await self._close(websocket, group_id, code=1011, reason="Send failed")
+            return False
+
+    async def _close(self, websocket: WebSocket, group_id: str, code: int, reason: str):
+        try:
+            await asyncio.wait_for(websocket.close(code=code, reason=reason), self.send_timeout)
+        except Exception as e:
+            print(f"Error closing connection in group {group_id}: {e!r}")
 
     async def close_group(self, group_id: str):
-        if group_id in self.active_connections:
-            # Create a copy of the list to iterate safely while modifying
-            for connection in self.active_connections[group_id][:]:
-                try:
-                    await connection.close(code=1000, reason="Session Expired")
-                except Exception as e:
-                    print(f"Error closing connection in group {group_id}: {e}")
-            
-            # Ensure the group is removed from active connections
-            if group_id in self.active_connections:
-                del self.active_connections[group_id]
+        # Removed first, so broadcasts during the close no longer reach it
+        connections = self.active_connections.pop(group_id, None)
+        if connections is not None:
+            if self.fanout is not None:
+                self.fanout.sync_later(group_id)
+            await asyncio.gather(*[
+                self._close(ws, group_id, code=1000, reason="Session Expired")
+                for ws in connections
+            ])
             print(f"Closed all connections for group {group_id}")
 
+    def connection_count(self):
+        return sum(len(connections) for connections in self.active_connections.values())
+
+    def largest_group(self):
+        return max((len(connections) for connections in self.active_connections.values()), default=0)
+
 manager = ConnectionManager()
+
+# Read from the manager at scrape time
+register(Gauge(
+    "mnm_ws_connections",
+    "Open WebSocket connections on this worker.",
+    manager.connection_count,
+))
+register(Gauge(
+    "mnm_ws_groups",
+    "Groups with at least one open WebSocket on this worker.",
+    lambda: len(manager.active_connections),
+))
+register(Gauge(
+    "mnm_ws_largest_group_connections",
+    "Open WebSocket connections of the largest group on this worker.",
+    manager.largest_group,
+))
@@ -0,0 +1,105 @@
+## Cross-worker WebSocket fan-out over Redis pub/sub
+## ConnectionManager only knows the sockets of its own process. With several
+## uvicorn workers (or pods), a group's members can sit on different ones,
+## so every broadcast is also published to the group's channel. Each worker
+## subscribes only to the channels of groups it holds sockets for and
+## relays what it receives to them.
+## Messages carry the publishing worker's id: the publisher has already
+## delivered to its own sockets and skips its echo.
+
+import os
+import uuid
+import asyncio
+
+import redis
+import redis.asyncio as aioredis
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+WS_CHANNEL_PREFIX = "mnm:ws:"
+WS_PUBSUB_RETRY = 1  # seconds before the listener reconnects
+
+
+def group_channel(group_id: str):
+    return WS_CHANNEL_PREFIX + group_id
+
+
+class RedisFanout:
+    def __init__(self, manager, client=None, url=REDIS_URL):
+        self.manager = manager
+        # Publishes on the shared client; the subscriptions hold their own connection
+        self.client = client if client is not None else aioredis.from_url(url, decode_responses=True)
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self.origin = uuid.uuid4().hex[:12]
+        # Subscribed channel changes are serialized and re-checked against
+        # the manager's sockets, so a quick leave / rejoin always converges
+        self._lock = asyncio.Lock()
+        self._listener = None
+        self._pending = set()
+
+    async def publish(self, group_id: str, text: str):
+        """
+        Publishes a serialized message for the other workers.
+        Failures are logged: local delivery does not depend on Redis.
+        """
+        try:
+            await self.client.publish(group_channel(group_id), f"{self.origin} {text}")
+        except redis.exceptions.RedisError as e:
+            print(f"Could not publish to group {group_id}: {e!r}")
+
+    async def sync(self, group_id: str):
+        """
+        Subscribes to the group's channel while this worker has sockets for
+        it, unsubscribes once it has none.
+        """
+        channel = group_channel(group_id)
+        async with self._lock:
+            wanted = group_id in self.manager.active_connections
+            subscribed = channel in self.pubsub.channels
+            try:
+                if wanted and not subscribed:
+                    await self.pubsub.subscribe(channel)
+                    if self._listener is None:
+                        self._listener = asyncio.create_task(self._listen())
+                elif subscribed and not wanted:
+                    await self.pubsub.unsubscribe(channel)
+            except redis.exceptions.RedisError as e:
+                print(f"Could not update subscription for group {group_id}: {e!r}")
+
+    def sync_later(self, group_id: str):
+        # For synchronous callers (ConnectionManager.disconnect)
+        task = asyncio.get_running_loop().create_task(self.sync(group_id))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _listen(self):
+        while True:
+            try:
+                message = await self.pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if message is None or message["type"] != "message":
+                    continue
+                origin, _, text = message["data"].partition(" ")
+                if origin == self.origin:
+                    continue
+                group_id = message["channel"][len(WS_CHANNEL_PREFIX):]
+                await self.manager.send_local(group_id, text)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The connection re-subscribes to every channel on reconnect
+                print(f"WebSocket pub/sub listener error: {e!r}, retrying in {WS_PUBSUB_RETRY}s")
+                await asyncio.sleep(WS_PUBSUB_RETRY)
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        try:
+            await self.pubsub.aclose()
+        except redis.exceptions.RedisError:
+            pass
@@ -2,7 +2,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 from api.routes import router
-from lifecycle import load_assets, redis_expiration_listener
+from api import routes
+from lifecycle import load_assets_in_background, redis_expiration_listener, session_store_expiry_loop
+from api.compute_pool import compute_pool
+from api.websockets import manager
+from api.request_metrics import RequestMetricsMiddleware
 
 app = FastAPI(title="MeetNMeal API")
 
@@ -15,6 +19,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Route latency histograms, Redis round trips and the slow-request log
+app.add_middleware(RequestMetricsMiddleware)
 
 app.include_router(router)
 
@@ -22,10 +28,26 @@ app.include_router(router)
 def health_check():
     return {"status": "ok", "app": "MeetNMeal Backend"}
 
+async def warm_up():
+    if await load_assets_in_background():
+        # Workers start once the assets are loaded (or stored), so they reuse them
+        await compute_pool.warm_up()
+
 ## When running the app:
-# all assets will be loaded, and redis expiration listener will be started
+# assets load in the background (the server answers /healthz and /readyz
+# meanwhile), and the expiry task of the session store in use is started
 @app.on_event("startup")
 async def startup_event():
-    load_assets()
-    # Start background cleanup task (Redis listener)
-    asyncio.create_task(redis_expiration_listener())
+    app.state.warm_up = asyncio.create_task(warm_up())
+    # Cross-worker WebSocket fan-out (WS_BROADCAST=redis)
+    await manager.start()
+    # Start background expiry task for the session store routes use
+    if routes.create_group.__module__ == "api.session_store":
+        app.state.expiry = asyncio.create_task(session_store_expiry_loop())
+    else:
+        app.state.expiry = asyncio.create_task(redis_expiration_listener())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    compute_pool.shutdown()
+    await manager.stop()
@@ -0,0 +1,292 @@
+## Recommendation pipeline microbenchmarks
+## Times every stage of recommend_group on its own, and the whole pipeline,
+## over the real assets for group sizes from 2 to 500. Reports p50 / p99
+## latency and peak traced memory per (stage, group size) as JSON, so two
+## commits can be compared:
+##   python -m benchmarks.bench_recommend [--out bench.json] [--compare old.json]
+## (run from backend/)
+
+import os
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from lifecycle import load_assets
+from src.asset_bundle import DATA_DIR
+from src import shared
+from src.group_aggregation import (
+    aggregate_group_cuisines,
+    aggregate_group_rest_types,
+    aggregate_group_dishes,
+    aggregate_group_budget,
+    aggregate_group_location,
+    empty_group_aggregate,
+    apply_user_to_aggregate,
+    finalize_group_aggregate,
+)
+from src.scoring import (
+    apply_weighted_cuisine_scoring,
+    apply_weighted_rest_type_scoring,
+    apply_weighted_dish_score,
+    apply_rating_score,
+    apply_cost_score,
+    apply_final_score,
+)
+from src.distanceCal import find_closest_branch
+from src.recommendor import (
+    CANDIDATE_POOL_SIZE,
+    DEFAULT_TOP_K,
+    DEFAULT_RADIUS_KM,
+    aggregate_group,
+    recommend_group,
+    recommend_from_aggregates,
+    get_final_recommendations_with_distance,
+)
+
+DEFAULT_SIZES = [2, 5, 10, 25, 50, 100, 250, 500]
+DEFAULT_ITERATIONS = 30
+WARMUP_ITERATIONS = 3
+RESULT_FORMAT = 1
+
+
+def make_users(count, rng):
+    """
+    Synthetic members drawn from the real data: each one likes the
+    cuisines / types / dishes of a random restaurant, a budget from the
+    real cost distribution and a known locality.
+    """
+    df = shared.zomato_unique
+    costs = df["approx_cost(for two people)"].dropna().to_numpy()
+    locations = sorted(shared.coord_dict)
+
+    def pick(values, most):
+        values = [v for v in values if v]
+        return rng.sample(values, min(len(values), rng.randint(1, most))) if values else []
+
+    users = []
+    for _ in range(count):
+        row = df.iloc[rng.randrange(len(df))]
+        users.append({
+            "cuisines": pick(row["cuisines"], 3),
+            "rest_type": pick(row["rest_type"], 2),
+            "dish_pref": pick(row["dish_liked"], 3),
+            "budget": int(costs[rng.randrange(len(costs))]),
+            "location": rng.choice(locations),
+        })
+    return users
+
+
+def build_stages(users):
+    """
+    (name, setup, fn) per stage. setup() runs untimed before each call and
+    returns fn's arguments, so stages that mutate their input get a fresh
+    one every time.
+    """
+    aggregates = aggregate_group(users)
+    cuisine_counter, rest_counter, dish_counter, group_budget, (group_lat, group_lng) = aggregates
+    engine = shared.scoring_engine
+    vocab = shared.feature_vocab
+
+    def scored_frame():
+        df = shared.zomato_unique.copy()
+        apply_weighted_cuisine_scoring(df, cuisine_counter, shared.cuisine_matrix, vocab)
+        apply_weighted_rest_type_scoring(df, rest_counter, shared.rest_type_matrix, vocab)
+        apply_weighted_dish_score(df, dish_counter, shared.dish_encoder, shared.tfidf_matrix)
+        apply_rating_score(df)
+        apply_cost_score(df, group_budget)
+        apply_final_score(df)
+        return df
+
+    scored = scored_frame()
+    in_radius = shared.branch_index.brands_within(group_lat, group_lng, DEFAULT_RADIUS_KM)
+    buffers = engine.score(cuisine_counter, rest_counter, dish_counter, group_budget, shared.dish_encoder)
+    positions = engine.top_candidates(buffers, CANDIDATE_POOL_SIZE, mask=in_radius)
+    candidates = engine.candidates_frame(buffers, positions)
+
+    def incremental_aggregate(users):
+        aggregate = empty_group_aggregate()
+        for user in users:
+            apply_user_to_aggregate(aggregate, user)
+        return finalize_group_aggregate(aggregate)
+
+    def closest_branch_loop(names):
+        return [find_closest_branch(name, group_lat, group_lng) for name in names]
+
+    def fresh_frame():
+        return (shared.zomato_unique.copy(),)
+
+    def fixed(*args):
+        return lambda: args
+
+    return [
+        # 1. Aggregation
+        ("aggregate.cuisines", fixed(users), aggregate_group_cuisines),
+        ("aggregate.rest_types", fixed(users), aggregate_group_rest_types),
+        ("aggregate.dishes", fixed(users), aggregate_group_dishes),
+        ("aggregate.budget", fixed(users), aggregate_group_budget),
+        ("aggregate.location", fixed(users), aggregate_group_location),
+        ("aggregate.group", fixed(users), aggregate_group),
+        ("aggregate.incremental", fixed(users), incremental_aggregate),
+        # 2. Scorers (DataFrame apply_* path, on a fresh copy each call)
+        ("score.apply_cuisine", fresh_frame,
+            lambda df: apply_weighted_cuisine_scoring(df, cuisine_counter, shared.cuisine_matrix, vocab)),
+        ("score.apply_rest_type", fresh_frame,
+            lambda df: apply_weighted_rest_type_scoring(df, rest_counter, shared.rest_type_matrix, vocab)),
+        ("score.apply_dish", fresh_frame,
+            lambda df: apply_weighted_dish_score(df, dish_counter, shared.dish_encoder, shared.tfidf_matrix)),
+        ("score.apply_rating", fresh_frame, apply_rating_score),
+        ("score.apply_cost", fresh_frame, lambda df: apply_cost_score(df, group_budget)),
+        ("score.apply_final", lambda: (scored.copy(),), apply_final_score),
+        # ...and the columnar engine the service uses
+        ("score.engine", fixed(cuisine_counter, rest_counter, dish_counter, group_budget, shared.dish_encoder),
+            engine.score),
+        # 3. Top-30 candidates
+        ("top30.sort_values", fixed(scored),
+            lambda df: df.sort_values("final_score", ascending=False).head(CANDIDATE_POOL_SIZE)),
+        ("top30.brands_within", fixed(group_lat, group_lng, DEFAULT_RADIUS_KM),
+            shared.branch_index.brands_within),
+        ("top30.engine", fixed(buffers, CANDIDATE_POOL_SIZE, in_radius),
+            lambda b, n, mask: engine.candidates_frame(b, engine.top_candidates(b, n, mask=mask))),
+        # 4. Branch search and distance re-rank
+        ("branch.find_closest_branch_x30", fixed(list(candidates["name"])), closest_branch_loop),
+        ("branch.closest_branches", fixed(candidates["name"].to_numpy(), group_lat, group_lng),
+            shared.branch_index.closest_branches),
+        ("rerank.get_final_recommendations_with_distance",
+            fixed(candidates, group_lat, group_lng, DEFAULT_TOP_K, DEFAULT_RADIUS_KM),
+            get_final_recommendations_with_distance),
+        # 5. Whole pipeline (uncached)
+        ("pipeline.recommend_from_aggregates",
+            fixed(aggregates, DEFAULT_TOP_K, DEFAULT_RADIUS_KM), recommend_from_aggregates),
+        ("pipeline.recommend_group",
+            fixed(users, DEFAULT_TOP_K, DEFAULT_RADIUS_KM), recommend_group),
+    ]
+
+
+def measure(setup, fn, iterations):
+    for _ in range(WARMUP_ITERATIONS):
+        fn(*setup())
+
+    samples = []
+    for _ in range(iterations):
+        args = setup()
+        start = time.perf_counter_ns()
+        fn(*args)
+        samples.append(time.perf_counter_ns() - start)
+
+    # Peak memory from one separate traced call: tracing slows the timed ones
+    args = setup()
+    gc.collect()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ms = np.array(samples) / 1e6
+    return {
+        "iterations": iterations,
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+        "min_ms": round(float(ms.min()), 4),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, iterations, seed, stage_filter=None, data_dir=DATA_DIR):
+    load_assets(data_dir)
+    results = []
+    for size in sizes:
+        users = make_users(size, random.Random(seed + size))
+        for name, setup, fn in build_stages(users):
+            if stage_filter and not any(f in name for f in stage_filter):
+                continue
+            stats = measure(setup, fn, iterations)
+            results.append({"stage": name, "group_size": size, **stats})
+            print(f"{name:48s} n={size:<4d} p50 {stats['p50_ms']:9.3f}ms  p99 {stats['p99_ms']:9.3f}ms  peak {stats['peak_kib']:9.1f}KiB")
+
+    return {
+        "format": RESULT_FORMAT,
+        "meta": {
+            "commit": git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "asset_version": shared.asset_version,
+            "data_dir": os.path.abspath(data_dir),
+            "rows": {"zomato_unique": len(shared.zomato_unique), "zomato": len(shared.zomato)},
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "iterations": iterations,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline_path, report):
+    """
+    Prints p50 / p99 of the report next to a baseline report.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {(r["stage"], r["group_size"]): r for r in baseline["results"]}
+
+    print(f"\nvs {baseline_path} (commit {baseline['meta'].get('commit')})")
+    for r in report["results"]:
+        old = before.get((r["stage"], r["group_size"]))
+        if old is None:
+            continue
+        ratio = r["p50_ms"] / old["p50_ms"] if old["p50_ms"] else float("inf")
+        print(
+            f"{r['stage']:48s} n={r['group_size']:<4d} p50 {old['p50_ms']:9.3f} -> {r['p50_ms']:9.3f}ms "
+            f"(x{ratio:.2f})  p99 {old['p99_ms']:9.3f} -> {r['p99_ms']:9.3f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation pipeline stage by stage")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated group sizes")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stage", action="append",
+                        help="only stages whose name contains this (repeatable)")
+    parser.add_argument("--data", default=DATA_DIR,
+                        help="data folder, e.g. a dataset from benchmarks/synth_data.py")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    args = parser.parse_args()
+
+    report = run(
+        [int(s) for s in args.sizes.split(",")], args.iterations, args.seed, args.stage, args.data
+    )
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Wrote {len(report['results'])} results to {args.out}")
+
+    if args.compare:
+        compare(args.compare, report)
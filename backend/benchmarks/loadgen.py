@@ -0,0 +1,391 @@
+## End-to-end load generator for the group session flow
+## Drives the FastAPI app in-process, like one uvicorn worker: groups arrive
+## at a Poisson rate, and each runs a full lifecycle. The steps are create,
+## N joins (each member then opens its WebSocket), N concurrent submits,
+## compute, result fetch and close.
+## Reports per-endpoint latency histograms, WebSocket broadcast delivery lag
+## (request start -> message received on each member's socket) and error
+## rates, as a table and as JSON.
+##   python -m benchmarks.loadgen --store memory --rate 20 --groups 200
+##   python -m benchmarks.loadgen --store redis --redis fake --group-size 6
+##   python -m benchmarks.loadgen --store redis --redis redis://localhost:6379
+## (run from backend/; --redis fake needs the fakeredis package)
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+SESSION_STORE_FUNCTIONS = [
+    "create_group",
+    "add_user",
+    "submit_preferences",
+    "update_preferences",
+    "group_status",
+    "prepare_group_compute",
+    "release_group_compute",
+    "store_group_result",
+    "getComputedResult",
+    "close_group",
+    "store_reachable",
+]
+
+
+def start_fake_redis():
+    """
+    fakeredis over TCP on a free local port, so every Redis client of the
+    app (pooled client, pub/sub, expiry listener) connects to it by URL.
+    """
+    try:
+        from fakeredis import TcpFakeServer
+    except ImportError:
+        sys.exit("--redis fake needs the fakeredis package (pip install fakeredis)")
+
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return f"redis://{host}:{port}"
+
+
+def preload_scripts(redis_url):
+    # fakeredis' TCP server drops the connection after an error reply,
+    # including the NOSCRIPT that precedes a script's first load
+    import redis
+    from api import session_redis
+
+    client = redis.Redis.from_url(redis_url)
+    for name in dir(session_redis):
+        script = getattr(session_redis, name)
+        if name.endswith("_script") and hasattr(script, "script"):
+            client.script_load(script.script)
+
+
+class ASGIWebSocket:
+    """
+    Minimal in-process WebSocket client speaking ASGI to the app.
+    """
+    def __init__(self, app, path):
+        self._to_app = asyncio.Queue()
+        self._from_app = asyncio.Queue()
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "headers": [],
+            "client": ("loadgen", 0),
+            "server": ("loadgen", 80),
+            "subprotocols": [],
+        }
+        self._task = asyncio.create_task(app(scope, self._to_app.get, self._from_app.put))
+
+    async def connect(self):
+        await self._to_app.put({"type": "websocket.connect"})
+        message = await self._from_app.get()
+        if message["type"] != "websocket.accept":
+            raise ConnectionError(f"WebSocket rejected: {message}")
+
+    async def receive_text(self):
+        """
+        Next text frame, or None once the server closed the socket.
+        """
+        message = await self._from_app.get()
+        if message["type"] == "websocket.send":
+            return message.get("text")
+        return None
+
+    async def close(self):
+        await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        try:
+            await asyncio.wait_for(self._task, 5)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)  # endpoint -> ms
+        self.errors = defaultdict(int)
+        self.lags = defaultdict(list)  # WebSocket event -> ms
+        self.ws_missing = defaultdict(int)
+        self.groups_started = 0
+        self.groups_completed = 0
+
+    async def call(self, endpoint, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+        except Exception:
+            self.errors[endpoint] += 1
+            self.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+            return None
+        self.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+            return None
+        return response
+
+    @staticmethod
+    def summarize(samples):
+        if not samples:
+            return {"count": 0}
+        ms = np.asarray(samples)
+        counts = np.histogram(ms, bins=[0] + HISTOGRAM_BUCKETS_MS + [np.inf])[0]
+        return {
+            "count": len(ms),
+            "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p90_ms": round(float(np.percentile(ms, 90)), 3),
+            "p99_ms": round(float(np.percentile(ms, 99)), 3),
+            "max_ms": round(float(ms.max()), 3),
+            "histogram": {
+                (f"le_{bound}" if bound != np.inf else "inf"): int(n)
+                for bound, n in zip(HISTOGRAM_BUCKETS_MS + [np.inf], counts)
+            },
+        }
+
+    def report(self):
+        endpoints = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            summary = self.summarize(samples)
+            summary["errors"] = self.errors.get(endpoint, 0)
+            summary["error_rate"] = round(summary["errors"] / max(len(samples), 1), 4)
+            endpoints[endpoint] = summary
+        broadcasts = {}
+        for event, samples in sorted(self.lags.items()):
+            summary = self.summarize(samples)
+            summary["missing"] = self.ws_missing.get(event, 0)
+            broadcasts[event] = summary
+        return {"endpoints": endpoints, "broadcast_lag": broadcasts}
+
+
+async def group_lifecycle(app, client, recorder, users, auto_compute, think, ws_timeout):
+    recorder.groups_started += 1
+    response = await recorder.call(
+        "POST /group/create", client.post("/group/create", params={"auto_compute": auto_compute})
+    )
+    if response is None:
+        return
+    group_id = response.json()["group_id"]
+
+    submit_started = {}
+    compute_started = []
+    events = []  # (recv time, message) across the group's sockets
+    expected = {"USER_READY": len(users) * len(users), "RESULT_COMPUTED": len(users)}
+    received = defaultdict(int)
+    all_received = asyncio.Event()
+
+    async def read(socket):
+        while True:
+            text = await socket.receive_text()
+            if text is None:
+                return
+            now = time.perf_counter()
+            message = json.loads(text)
+            event = message.get("type") or message.get("event")
+            if event == "USER_READY" and message.get("user_id") in submit_started:
+                recorder.lags["USER_READY"].append((now - submit_started[message["user_id"]]) * 1000)
+            elif event == "RESULT_COMPUTED" and compute_started:
+                recorder.lags["RESULT_COMPUTED"].append((now - compute_started[0]) * 1000)
+            events.append((now, event))
+            received[event] += 1
+            if all(received[e] >= n for e, n in expected.items()):
+                all_received.set()
+
+    async def member():
+        joined = await recorder.call("POST /group/join", client.post(f"/group/join/{group_id}"))
+        if joined is None:
+            return None
+        user_id = joined.json()["user_id"]
+        socket = ASGIWebSocket(app, f"/ws/{group_id}/{user_id}")
+        try:
+            await socket.connect()
+        except Exception:
+            recorder.errors["WS connect"] += 1
+            return None
+        return user_id, socket, asyncio.create_task(read(socket))
+
+    members = [m for m in await asyncio.gather(*[member() for _ in users]) if m is not None]
+    if len(members) < len(users):
+        for _, socket, reader in members:
+            reader.cancel()
+            await socket.close()
+        return
+    await asyncio.sleep(think)
+
+    async def submit(user_id, prefs):
+        submit_started[user_id] = time.perf_counter()
+        if auto_compute:
+            # The last submit triggers the compute; lag is measured from it
+            compute_started[:] = [submit_started[user_id]]
+        await recorder.call(
+            "POST /group/submit", client.post(f"/group/submit/{group_id}/{user_id}", json=prefs)
+        )
+
+    await asyncio.gather(*[submit(user_id, prefs) for (user_id, _, _), prefs in zip(members, users)])
+    await asyncio.sleep(think)
+
+    if not auto_compute:
+        compute_started.append(time.perf_counter())
+        computed = await recorder.call("POST /group/compute", client.post(f"/group/compute/{group_id}"))
+        if computed is not None:
+            await recorder.call("GET /group/result", client.get(f"/group/result/{group_id}"))
+
+    try:
+        await asyncio.wait_for(all_received.wait(), ws_timeout)
+    except asyncio.TimeoutError:
+        for event, n in expected.items():
+            recorder.ws_missing[event] += max(n - received[event], 0)
+
+    await recorder.call("POST /group/close", client.post(f"/group/close/{group_id}"))
+    for _, socket, reader in members:
+        reader.cancel()
+        await socket.close()
+    recorder.groups_completed += 1
+
+
+async def lifespan(app):
+    """
+    Runs the app's startup through the ASGI lifespan protocol. Returns the
+    queue that later triggers shutdown, and the lifespan task.
+    """
+    to_app, from_app = asyncio.Queue(), asyncio.Queue()
+    task = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}}, to_app.get, from_app.put))
+    await to_app.put({"type": "lifespan.startup"})
+    message = await from_app.get()
+    if message["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"App startup failed: {message}")
+    return to_app, from_app, task
+
+
+async def run(args):
+    import httpx
+    from api import routes
+    from benchmarks.bench_recommend import make_users
+
+    if args.store == "memory":
+        # Same swap as editing the import block in api/routes.py
+        from api import session_store
+        for name in SESSION_STORE_FUNCTIONS:
+            setattr(routes, name, getattr(session_store, name))
+
+    from app import app
+
+    to_app, from_app, lifespan_task = await lifespan(app)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadgen", timeout=60) as client:
+        # Assets load in the background: wait for readiness
+        deadline = time.perf_counter() + 120
+        while (await client.get("/readyz")).status_code != 200:
+            if time.perf_counter() > deadline:
+                sys.exit("App did not become ready within 120s")
+            await asyncio.sleep(0.1)
+
+        rng = random.Random(args.seed)
+        recorder = Recorder()
+        tasks = []
+        start = time.perf_counter()
+        for _ in range(args.groups):
+            users = make_users(args.group_size, rng)
+            tasks.append(asyncio.create_task(group_lifecycle(
+                app, client, recorder, users, args.auto_compute, args.think / 1000, args.ws_timeout
+            )))
+            await asyncio.sleep(rng.expovariate(args.rate))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    await to_app.put({"type": "lifespan.shutdown"})
+    await from_app.get()
+    lifespan_task.cancel()
+
+    report = recorder.report()
+    report.update({
+        "config": vars(args),
+        "elapsed_s": round(elapsed, 3),
+        "groups_started": recorder.groups_started,
+        "groups_completed": recorder.groups_completed,
+        "requests": sum(len(v) for v in recorder.latencies.values()),
+        "other_errors": {k: v for k, v in recorder.errors.items() if k not in recorder.latencies},
+    })
+    return report
+
+
+def print_report(report):
+    config = report["config"]
+    print(
+        f"\n{report['groups_completed']}/{report['groups_started']} groups of {config['group_size']} "
+        f"({config['store']} store) at {config['rate']}/s in {report['elapsed_s']:.1f}s, "
+        f"{report['requests']} requests ({report['requests'] / report['elapsed_s']:.0f} req/s)"
+    )
+    rows = [(f"  {name}", s) for name, s in report["endpoints"].items()]
+    rows += [(f"  ws {name} lag", s) for name, s in report["broadcast_lag"].items()]
+    for name, s in rows:
+        if not s["count"]:
+            continue
+        extra = f"errors {s['error_rate']:.1%}" if "error_rate" in s else f"missing {s['missing']}"
+        print(
+            f"{name:28s} n={s['count']:<6d} p50 {s['p50_ms']:8.1f}ms  p90 {s['p90_ms']:8.1f}ms  "
+            f"p99 {s['p99_ms']:8.1f}ms  max {s['max_ms']:8.1f}ms  {extra}"
+        )
+    if report["other_errors"]:
+        print(f"  other errors: {report['other_errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate full group lifecycles against the app")
+    parser.add_argument("--store", choices=["memory", "redis"], default="redis")
+    parser.add_argument("--redis", default="fake",
+                        help="'fake' (fakeredis over TCP) or a Redis URL, for --store redis")
+    parser.add_argument("--rate", type=float, default=10, help="group arrivals per second (Poisson)")
+    parser.add_argument("--groups", type=int, default=100, help="groups to simulate")
+    parser.add_argument("--group-size", type=int, default=4)
+    parser.add_argument("--auto-compute", action="store_true",
+                        help="auto_compute groups: the result is pushed, no compute / result calls")
+    parser.add_argument("--think", type=float, default=0, help="pause between lifecycle steps (ms)")
+    parser.add_argument("--ws-timeout", type=float, default=15,
+                        help="seconds to wait for every expected broadcast")
+    parser.add_argument("--compute-workers", type=int,
+                        help="compute pool processes (COMPUTE_WORKERS; 0 = threads)")
+    parser.add_argument("--data", help="data folder (ASSET_DATA_DIR), e.g. from benchmarks/synth_data.py")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="loadgen_results.json")
+    args = parser.parse_args()
+
+    # The app reads its configuration at import time
+    if args.data:
+        os.environ["ASSET_DATA_DIR"] = os.path.abspath(args.data)
+    if args.compute_workers is not None:
+        os.environ["COMPUTE_WORKERS"] = str(args.compute_workers)
+    if args.store == "redis":
+        redis_url = start_fake_redis() if args.redis == "fake" else args.redis
+        os.environ["REDIS_URL"] = redis_url
+        if args.redis == "fake":
+            preload_scripts(redis_url)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Wrote {args.out}")
+    # Non-daemon helper threads (compute pool, TCP server) must not block exit
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+## Synthetic dataset scaler
+## Writes a data folder with the same schema as backend/data, but
+## with --scale times the restaurants and branches. load_assets,
+## build_assets.py and the benchmarks can then load it, to find where the
+## pipeline stops scaling before real data gets there.
+##   python -m benchmarks.synth_data --scale 10 [--cities 10] [--batch 10] [--out data/synthetic/x10]
+##   ASSET_DATA_DIR=data/synthetic/x10 uvicorn app:app    (or build_assets.py --data ...)
+##   python -m benchmarks.bench_recommend --data data/synthetic/x10
+## (run from backend/)
+##
+## The dataset is --scale replicas of the real one. Replica 0 is the real
+## data, unchanged. Every other replica copies each real brand with a suffixed
+## name: the same cuisines / rest_type / dishes and TF-IDF row (so the
+## vocabularies and their joint distribution are the real ones), and
+## jittered rating, votes and cost. Replicas are spread over --cities cities.
+## Each city is a copy of BLRCoordinates.csv, shifted away from the others and
+## slightly jittered, so a radius search still sees one city's density. Use
+## --cities 1 to pack every replica into Bangalore instead.
+##
+## The DataFrames are written --batch replicas at a time, as numbered parts
+## (zomato_uniqueBranches.parts/part-00000.pkl, ...) that read_source_assets
+## concatenates. Only one batch is ever in memory, so x1000 fits on a
+## machine that can hold the result once.
+
+import os
+import sys
+import json
+import pickle
+import shutil
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from lifecycle import compute_asset_version, read_source_assets, PARTS_SUFFIX
+from src.asset_bundle import DATA_DIR
+
+COST_COLUMN = "approx_cost(for two people)"
+CITY_SPACING_DEG = 0.5  # ~55 km between cities, far beyond any search radius
+LOCALITY_JITTER_DEG = 0.002  # ~200 m
+RATING_JITTER = 0.15
+VOTES_SIGMA = 0.3  # log-normal factor on votes
+COST_STEP = 50  # costs are rounded like the real ones
+DEFAULT_BATCH = 10  # replicas per written part
+
+
+def city_offsets(cities):
+    """
+    (lat, lng) shift of each city: a square grid, city 0 (Bangalore) at 0.
+    """
+    side = int(np.ceil(np.sqrt(cities)))
+    k = np.arange(cities)
+    return (k // side) * CITY_SPACING_DEG, (k % side) * CITY_SPACING_DEG
+
+
+def city_locations(locations, city):
+    if city == 0:
+        return locations
+    return locations + f" C{city}"
+
+
+def scale_coordinates(coordinates, cities, rng):
+    dlat, dlng = city_offsets(cities)
+    frames = [coordinates]
+    for city in range(1, cities):
+        frame = coordinates.copy()
+        frame["location"] = city_locations(frame["location"], city)
+        jitter = rng.normal(0, LOCALITY_JITTER_DEG, size=(len(frame), 2))
+        frame["latitude"] = (frame["latitude"] + dlat[city] + jitter[:, 0]).round(4)
+        frame["longitude"] = (frame["longitude"] + dlng[city] + jitter[:, 1]).round(4)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def jitter_brands(zomato_unique, rng):
+    """
+    New rating / votes / cost per brand, drawn around the real ones.
+    """
+    rating = zomato_unique["MeanRating"].to_numpy()
+    low, high = np.nanmin(rating), np.nanmax(rating)
+    new_rating = np.clip(rating + rng.normal(0, RATING_JITTER, len(rating)), low, high).round(1)
+
+    votes = zomato_unique["votes"].to_numpy()
+    new_votes = np.rint(votes * rng.lognormal(0, VOTES_SIGMA, len(votes))).astype(votes.dtype)
+
+    cost = zomato_unique[COST_COLUMN].to_numpy(dtype=float)
+    factor = rng.choice([0.8, 0.9, 1.0, 1.0, 1.1, 1.25], len(cost))
+    new_cost = np.maximum(np.round(cost * factor / COST_STEP) * COST_STEP, COST_STEP)
+    return new_rating, new_votes, new_cost
+
+
+def replicate(zomato_unique, zomato, replica, city, rng, brand_of_branch):
+    """
+    One replica of both DataFrames. Replica 0 is returned unchanged.
+    """
+    if replica == 0:
+        return zomato_unique, zomato
+
+    suffix = f" #{replica}"
+    rating, votes, cost = jitter_brands(zomato_unique, rng)
+
+    unique = zomato_unique.copy()
+    unique["name"] = unique["name"] + suffix
+    unique["MeanRating"] = rating
+    unique["votes"] = votes
+    unique[COST_COLUMN] = cost.astype(zomato_unique[COST_COLUMN].dtype)
+
+    # Branches move with their brand: same rating shift, cost and city
+    branches = zomato.copy()
+    branches["name"] = branches["name"] + suffix
+    branches["location"] = city_locations(branches["location"], city)
+    shift = (rating - zomato_unique["MeanRating"].to_numpy())[brand_of_branch]
+    branches["rate"] = (branches["rate"] + shift).round(1)
+    branches["MeanRating"] = rating[brand_of_branch]
+    branches["votes"] = np.rint(
+        branches["votes"].to_numpy() * (votes / np.maximum(zomato_unique["votes"].to_numpy(), 1))[brand_of_branch]
+    ).astype(branches["votes"].dtype)
+    branches[COST_COLUMN] = cost[brand_of_branch].astype(zomato[COST_COLUMN].dtype)
+    branches["restaurant_id"] = branches["restaurant_id"] + replica * (int(zomato["restaurant_id"].max()) + 1)
+    return unique, branches
+
+
+def tile_rows(matrix, times):
+    """
+    times copies of a CSR matrix stacked vertically, built from its arrays
+    directly (one allocation per array).
+    """
+    nnz, rows = matrix.nnz, matrix.shape[0]
+    index_dtype = np.int32 if nnz * times < np.iinfo(np.int32).max else np.int64
+    indptr = np.empty(rows * times + 1, dtype=index_dtype)
+    indptr[0] = 0
+    indptr[1:] = (
+        matrix.indptr[1:].astype(np.int64)[None, :] + (np.arange(times, dtype=np.int64) * nnz)[:, None]
+    ).ravel()
+    return csr_matrix(
+        (np.tile(matrix.data, times), np.tile(matrix.indices.astype(index_dtype), times), indptr),
+        shape=(rows * times, matrix.shape[1]),
+    )
+
+
+def part_path(out_dir, name, part):
+    folder = os.path.join(out_dir, name + PARTS_SUFFIX)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"part-{part:05d}.pkl")
+
+
+def generate(data_dir, out_dir, scale, cities, seed, batch=DEFAULT_BATCH):
+    if scale < 1 or not 1 <= cities <= scale:
+        sys.exit("--scale must be >= 1 and --cities between 1 and --scale")
+    if batch < 1:
+        sys.exit("--batch must be >= 1")
+
+    vectorizer, tfidf_matrix, zomato_unique, zomato, _ = read_source_assets(data_dir)
+    coordinates = pd.read_csv(os.path.join(data_dir, "BLRCoordinates.csv"))
+    # Every branch of a brand in zomato_unique (all brands have one)
+    brand_of_branch = pd.Index(zomato_unique["name"]).get_indexer(zomato["name"])
+    if (brand_of_branch < 0).any():
+        sys.exit("Every branch name must be a brand of zomato_uniqueBranches")
+
+    if os.path.realpath(out_dir) == os.path.realpath(data_dir):
+        sys.exit("--out must not be the source data folder")
+    os.makedirs(out_dir, exist_ok=True)
+    # A whole-frame pickle would shadow the parts (see read_source_assets)
+    for name in ("zomato_uniqueBranches", "zomato_allBranches"):
+        shutil.rmtree(os.path.join(out_dir, name + PARTS_SUFFIX), ignore_errors=True)
+        if os.path.exists(os.path.join(out_dir, name + ".pkl")):
+            os.remove(os.path.join(out_dir, name + ".pkl"))
+
+    rng = np.random.default_rng(seed)
+    rows = {"zomato_unique": 0, "zomato": 0}
+    for part, first in enumerate(range(0, scale, batch)):
+        uniques, branches = [], []
+        for replica in range(first, min(first + batch, scale)):
+            unique, branch = replicate(
+                zomato_unique, zomato, replica, replica % cities, rng, brand_of_branch
+            )
+            uniques.append(unique)
+            branches.append(branch)
+        unique_part = pd.concat(uniques, ignore_index=True)
+        branch_part = pd.concat(branches, ignore_index=True)
+        del uniques, branches
+        unique_part.to_pickle(part_path(out_dir, "zomato_uniqueBranches", part))
+        branch_part.to_pickle(part_path(out_dir, "zomato_allBranches", part))
+        rows["zomato_unique"] += len(unique_part)
+        rows["zomato"] += len(branch_part)
+        del unique_part, branch_part
+
+    # The TF-IDF rows follow zomato_unique's row order
+    tfidf_scaled = tile_rows(tfidf_matrix.tocsr(), scale)
+    with open(os.path.join(out_dir, "dish_tfidf_matrix.pkl"), "wb") as f:
+        pickle.dump(tfidf_scaled, f, protocol=pickle.HIGHEST_PROTOCOL)
+    # Fitted on the real dish strings: the query vocabulary stays the same
+    shutil.copyfile(os.path.join(data_dir, "dish_vectorizer.pkl"), os.path.join(out_dir, "dish_vectorizer.pkl"))
+    scale_coordinates(coordinates, cities, rng).to_csv(os.path.join(out_dir, "BLRCoordinates.csv"), index=False)
+
+    # Part of the asset version: each generated dataset gets its own
+    with open(os.path.join(out_dir, "synthetic.json"), "w") as f:
+        json.dump({
+            "source_asset_version": compute_asset_version(data_dir),
+            "scale": scale,
+            "cities": cities,
+            "seed": seed,
+            "rows": rows,
+        }, f, indent=1)
+
+    print(
+        f"Wrote x{scale} dataset ({cities} cities) to {out_dir}: "
+        f"{rows['zomato_unique']} brands, {rows['zomato']} branches, "
+        f"TF-IDF {tfidf_scaled.shape[0]}x{tfidf_scaled.shape[1]} ({tfidf_scaled.nnz} nnz)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a scaled synthetic copy of the restaurant data")
+    parser.add_argument("--scale", type=int, required=True, help="replicas of the real data, e.g. 10, 100, 1000")
+    parser.add_argument("--cities", type=int, help="cities to spread the replicas over (default: one per replica)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="replicas held in memory and written per part")
+    parser.add_argument("--data", default=DATA_DIR, help="real data folder to scale")
+    parser.add_argument("--out", help="output folder (default: data/synthetic/x<scale>)")
+    args = parser.parse_args()
+
+    generate(
+        args.data,
+        args.out or os.path.join(BACKEND_DIR, "data", "synthetic", f"x{args.scale}"),
+        args.scale,
+        args.cities or args.scale,
+        args.seed,
+        args.batch,
+    )
@@ -0,0 +1,67 @@
+## Offline asset build
+## Compiles backend/data into the columnar bundle that load_assets reads
+## (see src/asset_bundle.py). Rerun whenever a source data file changes;
+## a bundle built from other data is ignored at startup.
+##   python build_assets.py [--data data] [--out data/bundle]
+
+import os
+import sys
+import time
+import shutil
+import argparse
+
+from lifecycle import compute_asset_version, read_source_assets, numeric_asset_arrays
+from src.asset_bundle import DATA_DIR, BUNDLE_FORMAT, bundle_dir_for, encode_frame, write_bundle
+from src.distanceCal import coordinates_to_dict
+from src.scoring import DishQueryEncoder
+
+
+def build_bundle(data_dir, out_dir):
+    start = time.perf_counter()
+    version = compute_asset_version(data_dir)
+    vectorizer, tfidf_matrix, zomato_unique, zomato, coordinates = read_source_assets(data_dir)
+
+    encoder = DishQueryEncoder(vectorizer)
+    if not encoder.portable:
+        sys.exit("The dish vectorizer uses a custom preprocessor/tokenizer and cannot be bundled")
+    encoder_arrays, encoder_meta = encoder.to_arrays()
+
+    arrays, meta = numeric_asset_arrays(
+        tfidf_matrix, zomato_unique, zomato, coordinates_to_dict(coordinates)
+    )
+    arrays.update(encoder_arrays)
+
+    frames = {}
+    for prefix, df in [
+        ("zomato_unique", zomato_unique),
+        ("zomato", zomato),
+        ("coordinates", coordinates),
+    ]:
+        frame_arrays, frames[prefix] = encode_frame(prefix, df)
+        arrays.update(frame_arrays)
+
+    meta.update({
+        "asset_version": version,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "frames": frames,
+        "rows": {"zomato_unique": len(zomato_unique), "zomato": len(zomato)},
+        "dish_encoder": encoder_meta,
+    })
+
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    write_bundle(out_dir, arrays, meta)
+
+    size = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir))
+    print(
+        f"Built asset bundle v{BUNDLE_FORMAT} ({version}) at {out_dir}: "
+        f"{len(arrays)} arrays, {size / 1e6:.1f} MB in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile backend/data into a columnar asset bundle")
+    parser.add_argument("--data", default=DATA_DIR)
+    parser.add_argument("--out", help="bundle folder (default: where load_assets looks for --data)")
+    args = parser.parse_args()
+    build_bundle(args.data, args.out or bundle_dir_for(args.data))
@@ -1,88 +1,310 @@
 ## This file contains all the lifecycle events
 ## 1. load_assets(): Loads all the assets required for the application
-## 2. run_cleanup_loop(): Checks every 2 minutes whether any group is expired or not (When redis not used)
-## 3. redis_expiration_listener(): Listens to the redis expiration events and broadcasts the session expiry to that group
+##    (load_assets_in_background() runs it off the event loop at startup)
+## 2. session_store_expiry_loop(): Expires in-memory groups on time and notifies their sockets (When redis not used)
+## 3. redis_expiration_listener(): Listens to the redis expiration events and notifies the group's sockets on this worker
 
 import os
+import time
 import pickle
+import random
+import hashlib
+import traceback
+from contextlib import contextmanager
 import pandas as pd
 import asyncio
 import redis.asyncio as redis
 from api.websockets import manager
 from src import shared
-from src.distanceCal import load_location_coordinates
-from api.session_store import cleanup_expired_groups
+from src.distanceCal import read_location_coordinates, coordinates_to_dict, BranchIndex
+from src.scoring import build_feature_matrices, normalize_tfidf_matrix, DishQueryEncoder
+from src.scoring_engine import ScoringEngine
+from src.asset_store import open_store, dataset_key, csr_to_arrays, csr_from_arrays
+from src.asset_bundle import DATA_DIR, BUNDLE_FORMAT, bundle_dir_for, load_bundle, decode_frame
+from api.session_store import wait_for_expired_groups
+from api.session_redis import GROUP_KEY_PREFIX
 
 import zipfile
 
-def load_assets():
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    DATA_DIR = os.path.join(BASE_DIR, "data")
+ASSET_FILES = [
+    "dish_vectorizer.pkl",
+    "dish_tfidf_matrix.pkl",
+    "zomato_uniqueBranches.zip",
+    "zomato_allBranches.zip",
+    "BLRCoordinates.csv",
+    "synthetic.json",  # generation parameters of a synthetic dataset
+]
 
-    # Auto-extract zipped pickle files if missing in environment
-    unique_pkl = os.path.join(DATA_DIR, "zomato_uniqueBranches.pkl")
-    if not os.path.exists(unique_pkl):
-        print("Extracting zomato_uniqueBranches.zip...")
-        with zipfile.ZipFile(os.path.join(DATA_DIR, "zomato_uniqueBranches.zip"), 'r') as zip_ref:
-            zip_ref.extractall(DATA_DIR)
+def compute_asset_version(data_dir):
+    """
+    Content hash of the source data files. Identical data gives the same
+    version on every worker / pod, so the shared result cache stays valid.
+    """
+    digest = hashlib.sha256()
+    for name in ASSET_FILES:
+        path = os.path.join(data_dir, name)
+        if not os.path.exists(path):
+            continue
+        digest.update(name.encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
 
-    all_pkl = os.path.join(DATA_DIR, "zomato_allBranches.pkl")
-    if not os.path.exists(all_pkl):
-        print("Extracting zomato_allBranches.zip...")
-        with zipfile.ZipFile(os.path.join(DATA_DIR, "zomato_allBranches.zip"), 'r') as zip_ref:
-            zip_ref.extractall(DATA_DIR)
+@contextmanager
+def timed(timings, step):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[step] = time.perf_counter() - start
+
+
+# Folder of numbered pickles that make up one DataFrame (written in batches
+# by benchmarks/synth_data.py), next to where its single .pkl would be
+PARTS_SUFFIX = ".parts"
+
+
+def read_frame(data_dir, name):
+    """
+    <name>.pkl, extracted from <name>.zip first if missing or older than
+    the zip, or the concatenated parts in <name>.parts/ when there is no
+    single pickle.
+    """
+    pkl = os.path.join(data_dir, f"{name}.pkl")
+    archive = os.path.join(data_dir, f"{name}.zip")
+    parts = os.path.join(data_dir, name + PARTS_SUFFIX)
+    if not os.path.exists(pkl) and os.path.isdir(parts):
+        return pd.concat(
+            [pd.read_pickle(os.path.join(parts, part)) for part in sorted(os.listdir(parts))],
+            ignore_index=True,
+        )
 
-    shared.vectorizer = pickle.load(open(os.path.join(DATA_DIR, "dish_vectorizer.pkl"), "rb"))
-    shared.tfidf_matrix = pickle.load(open(os.path.join(DATA_DIR, "dish_tfidf_matrix.pkl"), "rb"))
+    # Auto-extract zipped pickle files if missing in environment. The asset
+    # version hashes the zip, so a stale extraction must not be read either
+    if not os.path.exists(pkl) or (
+        os.path.exists(archive) and os.path.getmtime(pkl) < os.path.getmtime(archive)
+    ):
+        print(f"Extracting {name}.zip...")
+        with zipfile.ZipFile(archive, 'r') as zip_ref:
+            zip_ref.extractall(data_dir)
+    return pd.read_pickle(pkl)
 
-    shared.zomato_unique = pd.read_pickle(unique_pkl)
-    shared.zomato = pd.read_pickle(all_pkl)
 
-    shared.coord_dict = load_location_coordinates(
-        os.path.join(DATA_DIR, "BLRCoordinates.csv")
+def read_source_assets(data_dir):
+    """
+    Loads the original data files: (vectorizer, tfidf_matrix, zomato_unique,
+    zomato, coordinates). The zipped DataFrame pickles are extracted first
+    if missing.
+    """
+    vectorizer = pickle.load(open(os.path.join(data_dir, "dish_vectorizer.pkl"), "rb"))
+    tfidf_matrix = pickle.load(open(os.path.join(data_dir, "dish_tfidf_matrix.pkl"), "rb"))
+    zomato_unique = read_frame(data_dir, "zomato_uniqueBranches")
+    zomato = read_frame(data_dir, "zomato_allBranches")
+    coordinates = read_location_coordinates(os.path.join(data_dir, "BLRCoordinates.csv"))
+    return vectorizer, tfidf_matrix, zomato_unique, zomato, coordinates
+
+
+def numeric_asset_arrays(tfidf_matrix, zomato_unique, zomato, coord_dict):
+    """
+    The precomputed numeric assets shared by every worker: (arrays, meta).
+    """
+    tfidf_matrix = normalize_tfidf_matrix(tfidf_matrix)
+    # Encode cuisines / rest_type once so scoring is a sparse mat-vec per compute
+    vocab, cuisine_matrix, rest_type_matrix = build_feature_matrices(zomato_unique)
+    branch_index = BranchIndex(
+        zomato, coord_dict, brand_names=zomato_unique["name"].to_numpy()
     )
+    arrays = {
+        **csr_to_arrays("tfidf", tfidf_matrix),
+        **csr_to_arrays("cuisine", cuisine_matrix),
+        **csr_to_arrays("rest_type", rest_type_matrix),
+        **ScoringEngine.numeric_columns(zomato_unique),
+        **branch_index.to_arrays(),
+    }
+    return arrays, {"feature_vocab": list(vocab)}
+
+
+def load_assets(data_dir=DATA_DIR):
+    timings = {}
+
+    # Any cached recommendation from other data is now stale
+    with timed(timings, "asset_version"):
+        shared.asset_version = compute_asset_version(data_dir)
 
+    with timed(timings, "open_bundle"):
+        bundle = load_bundle(bundle_dir_for(data_dir), shared.asset_version)
+
+    if bundle is not None:
+        # Precompiled by build_assets.py: memory-mapped columns, no pickles
+        arrays, meta = bundle
+        with timed(timings, "decode_frames"):
+            frames = meta["frames"]
+            shared.zomato_unique = decode_frame("zomato_unique", arrays, frames["zomato_unique"])
+            shared.zomato = decode_frame("zomato", arrays, frames["zomato"])
+            coordinates = decode_frame("coordinates", arrays, frames["coordinates"])
+        with timed(timings, "dish_encoder"):
+            shared.vectorizer = None  # only needed to build the encoder
+            shared.dish_encoder = DishQueryEncoder.from_arrays(arrays, meta["dish_encoder"])
+        shared.coord_dict = coordinates_to_dict(coordinates)
+    else:
+        print("No asset bundle found, loading source files (run build_assets.py to speed this up)")
+        with timed(timings, "source_files"):
+            shared.vectorizer, tfidf_matrix, shared.zomato_unique, shared.zomato, coordinates = (
+                read_source_assets(data_dir)
+            )
+        with timed(timings, "dish_encoder"):
+            shared.dish_encoder = DishQueryEncoder(shared.vectorizer)
+        shared.coord_dict = coordinates_to_dict(coordinates)
+
+        def build_numeric_assets():
+            # Only runs in the first worker for this asset version
+            return numeric_asset_arrays(
+                tfidf_matrix, shared.zomato_unique, shared.zomato, shared.coord_dict
+            )
+
+        # Numeric assets are shared zero-copy between workers through memory maps
+        with timed(timings, "asset_store"):
+            # Same array layout as the bundle, so the store is keyed by its format too
+            store = open_store(
+                f"{shared.asset_version}-{BUNDLE_FORMAT}", build_numeric_assets, dataset_key(data_dir)
+            )
+            arrays, meta = store if store is not None else build_numeric_assets()
+
+    with timed(timings, "indexes"):
+        shared.asset_arrays = arrays
+        shared.tfidf_matrix = csr_from_arrays(arrays, "tfidf")
+        shared.feature_vocab = {token: i for i, token in enumerate(meta["feature_vocab"])}
+        shared.cuisine_matrix = csr_from_arrays(arrays, "cuisine")
+        shared.rest_type_matrix = csr_from_arrays(arrays, "rest_type")
+        shared.scoring_engine = ScoringEngine(
+            shared.zomato_unique,
+            shared.feature_vocab,
+            shared.cuisine_matrix,
+            shared.rest_type_matrix,
+            shared.tfidf_matrix,
+            columns=arrays,
+        )
+        shared.branch_index = BranchIndex.from_arrays(arrays, shared.zomato)
+
+    shared.load_timings = timings
+    shared.assets_ready = True
+    print(
+        "Asset load timings: "
+        + ", ".join(f"{step} {seconds * 1000:.1f}ms" for step, seconds in timings.items())
+    )
     print("All Assests Loaded Sucessfully !")
 
-## Checks every 2 minutes whether any group is expired or not
-## NOT required as we are using Redis Expiration
-async def run_cleanup_loop():
+async def load_assets_in_background():
+    """
+    Runs load_assets in a thread so the server keeps answering (/healthz,
+    /readyz) while assets deserialize. Returns True once they are loaded.
+    """
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, load_assets)
+    except Exception as e:
+        shared.asset_load_error = f"{type(e).__name__}: {e}"
+        print(f"Asset loading failed: {shared.asset_load_error}")
+        traceback.print_exc()
+        return False
+    return True
+
+## In-memory store (no Redis): expires each group at its deadline and
+## notifies its sockets, like the Redis expiry listener does
+async def session_store_expiry_loop():
     while True:
-        await asyncio.sleep(120) # Run every 2 mins
-        count = cleanup_expired_groups()
-        if count > 0:
-            print(f"Cleaned up {count} expired groups.")
+        for group_id in await wait_for_expired_groups():
+            await notify_group_expired(group_id)
+
+
+EXPIRY_RETRY_BASE = 0.5  # seconds before the first reconnect
+EXPIRY_RETRY_CAP = 30  # seconds, longest wait between reconnects
+EXPIRY_HEALTH_CHECK = 30  # seconds between PINGs on an idle subscription
+
+# Expiry listener counters (reported by /readyz):
+# (the in-memory store's expiry loop counts handled / dropped too)
+#   handled    group expiries with sockets on this worker (notified + closed)
+#   dropped    group expiries without local sockets (another worker's, or nobody's)
+#   ignored    expired keys outside the group namespace (e.g. the result cache)
+#   reconnects times the subscription was re-established
+expiry_listener_stats = {
+    "connected": False,
+    "handled": 0,
+    "dropped": 0,
+    "ignored": 0,
+    "reconnects": 0,
+}
+
+
+async def handle_expired_key(key):
+    if not key.startswith(GROUP_KEY_PREFIX):
+        expiry_listener_stats["ignored"] += 1
+        return
+    await notify_group_expired(key[len(GROUP_KEY_PREFIX):])
+
+
+async def notify_group_expired(group_id):
+    # Every worker receives every expiry; only the ones holding sockets act
+    if group_id not in manager.active_connections:
+        expiry_listener_stats["dropped"] += 1
+        return
+
+    await manager.broadcast_local(group_id, {
+        "type": "SESSION_EXPIRED",
+        "message": "This session has expired."
+    })
+
+    # Clean up connections
+    await manager.close_group(group_id)
+    expiry_listener_stats["handled"] += 1
 
 
 async def redis_expiration_listener():
-    try:
-        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
-        r = redis.from_url(redis_url, decode_responses=True)
-        
-        # Enable keyspace notifications for 'Expired' events if not already enabled
+    """
+    Notifies this worker's sockets when their group expires in Redis.
+    Runs for the life of the app: a dropped connection is re-established
+    with jittered exponential backoff.
+    """
+    redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+    delay = EXPIRY_RETRY_BASE
+
+    while True:
+        r = redis.from_url(
+            redis_url, decode_responses=True, health_check_interval=EXPIRY_HEALTH_CHECK
+        )
         try:
-            await r.config_set("notify-keyspace-events", "Ex")
-        except Exception as config_err:
-            print("Skipped config_set (Cloud Redis handles configuration):", config_err)
-        
-        pubsub = r.pubsub()
-        # Subscribe to expiry events on DB 0
-        await pubsub.psubscribe("__keyevent@0__:expired")
-        
-        print("Listening for Redis expiry events...")
-        
-        async for message in pubsub.listen():
-            if message["type"] == "pmessage":
-                expired_key = message["data"]
-                
-                # Broadcast session expiry to that group
-                await manager.broadcast(expired_key, {
-                    "type": "SESSION_EXPIRED",
-                    "message": "This session has expired."
-                })
-                
-                # Clean up connections
-                await manager.close_group(expired_key)
-                
-    except Exception as e:
-        print(f"Error in Redis expiry listener: {e}")
+            # Enable keyspace notifications for 'Expired' events if not already enabled
+            try:
+                await r.config_set("notify-keyspace-events", "Ex")
+            except Exception as config_err:
+                print("Skipped config_set (Cloud Redis handles configuration):", config_err)
+
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            db = r.connection_pool.connection_kwargs.get("db", 0)
+            await pubsub.subscribe(f"__keyevent@{db}__:expired")
+
+            print("Listening for Redis expiry events...")
+            expiry_listener_stats["connected"] = True
+            delay = EXPIRY_RETRY_BASE
+
+            while True:
+                # Polling (rather than blocking) lets the health check PING
+                # an idle connection, so a dead one is noticed
+                message = await pubsub.get_message(timeout=1.0)
+                if message is not None and message["type"] == "message":
+                    await handle_expired_key(message["data"])
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error in Redis expiry listener: {e!r}, reconnecting in {delay:.1f}s")
+        finally:
+            expiry_listener_stats["connected"] = False
+            try:
+                await r.aclose()
+            except Exception:
+                pass
+
+        await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+        delay = min(delay * 2, EXPIRY_RETRY_CAP)
+        expiry_listener_stats["reconnects"] += 1
@@ -1,18 +1,12 @@
 import os
-import pandas as pd
+from lifecycle import load_assets
 from src.recommendor import recommend_group
-from src.distanceCal import load_location_coordinates
 
 # Define base directory (where run.py is located)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "data")
 
-zomato_unique = pd.read_pickle(
-    os.path.join(DATA_DIR, "zomato_uniqueBranches.pkl")
-)
-coord_dict = load_location_coordinates(
-    os.path.join(DATA_DIR, "BLRCoordinates.csv")
-)
+# Restaurant data, features and branch index, as the API loads them
+load_assets()
 
 users = [
     {
@@ -50,8 +44,6 @@ users = [
 ]
 
 final_results = recommend_group(
-    df_full=zomato_unique,
-    coord_dict=coord_dict,
     users_list=users,
     top_k=10
 )
@@ -0,0 +1,151 @@
+## Precompiled columnar asset bundle
+## build_assets.py compiles backend/data once (offline, e.g. at image build)
+## into data/bundle: every DataFrame column as a .npy array (strings and the
+## list-valued cuisines / rest_type / dish_liked integer-coded against a
+## vocabulary), the numeric scoring assets and a manifest. load_assets
+## memory-maps it directly: no zip extraction and no pickle loads at startup.
+
+import os
+import gc
+
+import numpy as np
+import pandas as pd
+
+from src.asset_store import export_arrays, attach_arrays, MANIFEST_FILE
+
+# Bump whenever the bundle layout changes; older bundles are then ignored
+BUNDLE_FORMAT = 1
+# Source data folder; point it at a generated dataset (benchmarks/synth_data.py)
+DATA_DIR = os.getenv(
+    "ASSET_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"),
+)
+BUNDLE_DIR = os.getenv("ASSET_BUNDLE_DIR", os.path.join(DATA_DIR, "bundle"))
+
+
+def bundle_dir_for(data_dir):
+    """
+    BUNDLE_DIR for the configured data folder, <data_dir>/bundle for others.
+    """
+    if os.path.abspath(data_dir) == os.path.abspath(DATA_DIR):
+        return BUNDLE_DIR
+    return os.path.join(data_dir, "bundle")
+
+
+def encode_strings(values):
+    """
+    Strings as one NUL-separated UTF-8 byte array: memory-mappable, and
+    far smaller than fixed-width unicode when lengths vary.
+    """
+    if any("\0" in value for value in values):
+        raise ValueError("Cannot bundle strings containing NUL characters")
+    return np.frombuffer("\0".join(values).encode("utf-8"), dtype=np.uint8)
+
+
+def decode_strings(array, count):
+    if count == 0:
+        return []
+    return array.tobytes().decode("utf-8").split("\0")
+
+
+def encode_frame(prefix, df):
+    """
+    Columnar encoding of a DataFrame.
+    Returns (arrays, layout): layout["columns"] lists [name, kind, dtype,
+    vocab size] in order; kind is "num", "str" (codes + vocab) or "list"
+    (offsets + codes + vocab).
+    """
+    arrays = {}
+    layout = {"columns": []}
+    columns = layout["columns"]
+    if isinstance(df.index, pd.RangeIndex):
+        layout["range_index"] = [df.index.start, df.index.stop, df.index.step]
+    else:
+        arrays[f"{prefix}.__index__"] = df.index.to_numpy()
+    for i, name in enumerate(df.columns):
+        key = f"{prefix}.{i}"
+        values = df[name]
+        if pd.api.types.is_numeric_dtype(values.dtype):
+            arrays[key] = values.to_numpy()
+            columns.append([name, "num", str(values.dtype), 0])
+        elif values.map(lambda v: isinstance(v, list)).all():
+            lengths = values.map(len).to_numpy()
+            flat = [token for tokens in values for token in tokens]
+            codes, vocab = pd.factorize(pd.Series(flat, dtype=object))
+            arrays[f"{key}.offsets"] = np.r_[0, np.cumsum(lengths)].astype(np.int64)
+            arrays[f"{key}.codes"] = codes.astype(np.int32)
+            arrays[f"{key}.vocab"] = encode_strings(list(vocab))
+            columns.append([name, "list", "object", len(vocab)])
+        else:
+            # Missing values become code -1
+            codes, vocab = pd.factorize(values)
+            arrays[f"{key}.codes"] = codes.astype(np.int32)
+            arrays[f"{key}.vocab"] = encode_strings(list(vocab))
+            columns.append([name, "str", str(values.dtype), len(vocab)])
+    return arrays, layout
+
+
+def decode_frame(prefix, arrays, layout):
+    """
+    Inverse of encode_frame: a DataFrame equal to the one encoded (same
+    dtypes and index, Python list cells for list columns).
+    """
+    if "range_index" in layout:
+        index = pd.RangeIndex(*layout["range_index"])
+    else:
+        index = pd.Index(np.asarray(arrays[f"{prefix}.__index__"]))
+
+    # Building many small lists triggers the cyclic GC over and over
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        data = {}
+        for i, column in enumerate(layout["columns"]):
+            data[column[0]] = _decode_column(f"{prefix}.{i}", column, arrays, index)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return pd.DataFrame(data, copy=False)
+
+
+def _decode_column(key, column, arrays, index):
+    name, kind, dtype, size = column
+    if kind == "num":
+        return pd.Series(np.asarray(arrays[key]), index=index, copy=False)
+
+    vocab = decode_strings(arrays[f"{key}.vocab"], size)
+    if kind == "str":
+        lookup = np.empty(size + 1, dtype=object)
+        lookup[:size] = vocab  # code -1 picks the trailing None
+        return pd.Series(lookup[np.asarray(arrays[f"{key}.codes"])], index=index, dtype=dtype)
+
+    flat = [vocab[c] for c in arrays[f"{key}.codes"].tolist()]
+    offsets = arrays[f"{key}.offsets"].tolist()
+    cells = np.empty(len(offsets) - 1, dtype=object)
+    cells[:] = [flat[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+    return pd.Series(cells, index=index, dtype=object)
+
+
+def write_bundle(path, arrays, meta):
+    meta = {**meta, "format": BUNDLE_FORMAT}
+    export_arrays(path, arrays, meta)
+
+
+def load_bundle(path, asset_version):
+    """
+    (arrays, meta) for a bundle built from the same source data
+    (asset_version) in the current format, else None.
+    Arrays are read-only memory maps, shared by every process through the
+    page cache.
+    """
+    if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        return None
+
+    arrays, meta = attach_arrays(path)
+    if meta.get("format") != BUNDLE_FORMAT:
+        print(f"Ignoring asset bundle in format {meta.get('format')} (expected {BUNDLE_FORMAT})")
+        return None
+    if meta.get("asset_version") != asset_version:
+        print("Ignoring asset bundle built from different data, rerun build_assets.py")
+        return None
+    return arrays, meta
@@ -0,0 +1,138 @@
+## Shared, memory-mapped asset store
+## The numeric assets (TF-IDF CSR arrays, cuisine / rest_type matrices,
+## costs, ratings and branch coordinates) are exported once per asset version
+## as plain .npy files. Every worker (uvicorn or compute pool) attaches them
+## read-only with np.load(mmap_mode="r"), so they all share the same
+## page-cache pages instead of each holding a private copy.
+## Layout: <ASSET_STORE_DIR>/<dataset>/<asset_version>/{manifest.json, *.npy}
+## <dataset> is a hash of the data folder's path, so services (or synthetic
+## datasets) sharing /dev/shm only ever replace their own stores.
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, the atomic rename still holds
+    fcntl = None
+
+
+def _default_store_dir():
+    # tmpfs keeps the mapped files in RAM; fall back to the data folder
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm/meetnmeal-assets"
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", ".asset_store")
+
+
+ASSET_STORE = os.getenv("ASSET_STORE", "1") == "1"
+ASSET_STORE_DIR = os.getenv("ASSET_STORE_DIR") or _default_store_dir()
+
+MANIFEST_FILE = "manifest.json"
+
+
+def dataset_key(data_dir):
+    """
+    Store namespace of a data folder: stable across restarts and workers.
+    """
+    return hashlib.sha256(os.path.realpath(data_dir).encode()).hexdigest()[:16]
+
+
+def store_path(version, dataset, store_dir=ASSET_STORE_DIR):
+    return os.path.join(store_dir, dataset, version)
+
+
+def csr_to_arrays(prefix, matrix):
+    return {
+        f"{prefix}.data": matrix.data,
+        f"{prefix}.indices": matrix.indices,
+        f"{prefix}.indptr": matrix.indptr,
+        f"{prefix}.shape": np.array(matrix.shape, dtype=np.int64),
+    }
+
+
+def csr_from_arrays(arrays, prefix):
+    """
+    CSR view over stored arrays (no copy when the dtypes already match).
+    """
+    shape = tuple(int(n) for n in arrays[f"{prefix}.shape"])
+    return csr_matrix(
+        (arrays[f"{prefix}.data"], arrays[f"{prefix}.indices"], arrays[f"{prefix}.indptr"]),
+        shape=shape,
+        copy=False,
+    )
+
+
+def export_arrays(path, arrays, meta=None):
+    """
+    Writes arrays (+ small JSON metadata) to path. Written to a temporary
+    directory and renamed into place, so readers never see a partial store.
+    """
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    try:
+        for name, values in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(values))
+        with open(os.path.join(tmp, MANIFEST_FILE), "w") as f:
+            json.dump({"arrays": sorted(arrays), "meta": meta or {}}, f)
+        os.rename(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        # Lost the race to another process: its store is just as good
+        if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            raise
+
+
+def attach_arrays(path):
+    """
+    Returns (arrays, meta); every array is a read-only memory map.
+    """
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in manifest["arrays"]
+    }
+    return arrays, manifest["meta"]
+
+
+def prune_versions(dataset_dir, keep_version):
+    # Stores from older versions of this dataset are never attached again
+    for name in os.listdir(dataset_dir):
+        if name != keep_version and not name.startswith("."):
+            shutil.rmtree(os.path.join(dataset_dir, name), ignore_errors=True)
+
+
+def open_store(version, build, dataset, store_dir=ASSET_STORE_DIR):
+    """
+    Attaches the store for `version` of `dataset` (see dataset_key),
+    building it first with build() -> (arrays, meta) if no process has yet.
+    Concurrent workers wait on a lock file so the export happens once.
+    Returns (arrays, meta), or None when the store cannot be used
+    (disabled or unwritable directory); callers then keep private copies.
+    """
+    if not ASSET_STORE:
+        return None
+
+    path = store_path(version, dataset, store_dir)
+    dataset_dir = os.path.dirname(path)
+    try:
+        os.makedirs(dataset_dir, exist_ok=True)
+        with open(os.path.join(dataset_dir, ".lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+                print(f"Exporting shared asset store to {path}")
+                arrays, meta = build()
+                export_arrays(path, arrays, meta)
+                prune_versions(dataset_dir, version)
+        return attach_arrays(path)
+    except OSError as e:
+        print(f"Shared asset store unavailable ({e}), using private copies")
+        return None
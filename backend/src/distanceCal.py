@@ -1,11 +1,14 @@
 import numpy as np
 import math
 import pandas as pd
+from sklearn.neighbors import BallTree
 
 from src import shared
 
+EARTH_RADIUS_KM = 6371
+
 def haversine(lat1, lon1, lat2, lon2):
-    R = 6371  # earth radius in KM
+    R = EARTH_RADIUS_KM
 
     lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
 
@@ -21,6 +24,27 @@ def haversine(lat1, lon1, lat2, lon2):
     return R * c  # distance in km
 
 
+def haversine_np(lat1, lon1, lat2, lon2):
+    """
+    Vectorised haversine: same formula as haversine(), any argument may be
+    a NumPy array. Returns distances in km.
+    """
+    R = EARTH_RADIUS_KM
+
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+
+    a = (
+        np.sin(dlat / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    )
+    c = 2 * np.arcsin(np.sqrt(a))
+
+    return R * c
+
+
 def load_location_coordinates(path):
     # ="/kaggle/input/blrcoordinates/location.csv"
     """
@@ -30,46 +54,189 @@ def load_location_coordinates(path):
     BTM, 12.90, 77.61
     ...
     """
+    return coordinates_to_dict(read_location_coordinates(path))
+
+
+def read_location_coordinates(path):
     coords = pd.read_csv(path)
     coords["location"] = coords["location"].str.lower().str.strip()
+    return coords
 
-    coord_dict = {}
-    for _, row in coords.iterrows():
-        coord_dict[row["location"]] = (row["latitude"], row["longitude"])
 
-    return coord_dict
+def coordinates_to_dict(coords):
+    """
+    location -> (latitude, longitude); later rows win on duplicate names.
+    """
+    return dict(zip(
+        coords["location"].tolist(),
+        zip(coords["latitude"].tolist(), coords["longitude"].tolist()),
+    ))
 
 
-def find_closest_branch(restaurant_name, user_lat, user_lng, coord_dict):
+class BranchIndex:
+    """
+    Brand name -> contiguous slice of branch lat / lng / row position arrays.
+    Built once at startup from zomato_allBranches and coord_dict; branches
+    whose location cannot be geocoded are left out. Within a brand, branches
+    keep their original row order.
+
+    A haversine BallTree over the distinct branch locations (branches only
+    sit at the geocoded localities) answers "which brands have a branch
+    within r km" before ranking. brand_names (zomato_unique's names) fixes
+    the row order of the brand mask it returns.
+    """
+
+    def __init__(self, zomato_all, coord_dict, brand_names=None):
+        locations = zomato_all["location"].astype(str).str.lower().str.strip()
+        geocoded = locations.isin(coord_dict.keys()).to_numpy()
+
+        positions = np.flatnonzero(geocoded)
+        names = zomato_all["name"].to_numpy()[positions]
+        # Stable sort so branches of a brand stay in row order
+        order = np.argsort(names, kind="stable")
+        positions = positions[order]
+        names = names[order]
+
+        coords = np.array(
+            [coord_dict[loc] for loc in locations.to_numpy()[positions]],
+            dtype=float,
+        ).reshape(-1, 2)
+        self.lat = np.ascontiguousarray(coords[:, 0])
+        self.lng = np.ascontiguousarray(coords[:, 1])
+        self.rows = positions
+
+        # Branch -> row of its brand in brand_names (-1 when it has none)
+        self.brand_count = 0
+        self.brand_rows = np.full(len(names), -1, dtype=np.intp)
+        if brand_names is not None:
+            brand_pos = {name: i for i, name in enumerate(brand_names)}
+            self.brand_count = len(brand_names)
+            self.brand_rows = np.array(
+                [brand_pos.get(name, -1) for name in names], dtype=np.intp
+            )
+
+        # Distinct locations, and every (location, brand) pair with a branch there
+        locations_xy, branch_location = np.unique(coords, axis=0, return_inverse=True)
+        self.location_lat = np.ascontiguousarray(locations_xy[:, 0])
+        self.location_lng = np.ascontiguousarray(locations_xy[:, 1])
+        branded = self.brand_rows >= 0
+        pairs = np.unique(
+            np.column_stack([branch_location.reshape(-1)[branded], self.brand_rows[branded]]),
+            axis=0,
+        ).reshape(-1, 2)
+        self.pair_locations = np.ascontiguousarray(pairs[:, 0])
+        self.pair_brands = np.ascontiguousarray(pairs[:, 1])
+
+        self._build_lookups(names)
+
+    def _build_lookups(self, names):
+        # names: brand name of every indexed branch, in index order
+        self.slices = {}
+        if len(names):
+            starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]])
+            stops = np.r_[starts[1:], len(names)]
+            for name, start, stop in zip(names[starts], starts, stops):
+                self.slices[name] = (start, stop)
+
+        coords = np.radians(np.column_stack([self.location_lat, self.location_lng]))
+        self.tree = BallTree(coords, metric="haversine") if len(coords) else None
+
+    def to_arrays(self):
+        """
+        The numeric index arrays, for the shared asset store.
+        """
+        return {
+            "branches.lat": self.lat,
+            "branches.lng": self.lng,
+            "branches.rows": self.rows,
+            "branches.brand_rows": self.brand_rows,
+            "branches.brand_count": np.array([self.brand_count], dtype=np.int64),
+            "branches.location_lat": self.location_lat,
+            "branches.location_lng": self.location_lng,
+            "branches.pair_locations": self.pair_locations,
+            "branches.pair_brands": self.pair_brands,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, zomato_all):
+        """
+        Rebuilds the index over arrays from to_arrays() (e.g. memory maps
+        from the shared asset store) without re-geocoding zomato_all.
+        """
+        index = cls.__new__(cls)
+        index.lat = arrays["branches.lat"]
+        index.lng = arrays["branches.lng"]
+        index.rows = arrays["branches.rows"]
+        index.brand_rows = arrays["branches.brand_rows"]
+        index.brand_count = int(arrays["branches.brand_count"][0])
+        index.location_lat = arrays["branches.location_lat"]
+        index.location_lng = arrays["branches.location_lng"]
+        index.pair_locations = arrays["branches.pair_locations"]
+        index.pair_brands = arrays["branches.pair_brands"]
+        index._build_lookups(zomato_all["name"].to_numpy()[index.rows])
+        return index
+
+    def brands_within(self, user_lat, user_lng, radius_km):
+        """
+        Boolean mask over brand_names: True where the brand has at least one
+        geocoded branch within radius_km of the point.
+        """
+        mask = np.zeros(self.brand_count, dtype=bool)
+        if self.tree is None:
+            return mask
+
+        hits = self.tree.query_radius(
+            np.radians([[user_lat, user_lng]]), r=radius_km / EARTH_RADIUS_KM
+        )[0]
+        near = np.zeros(len(self.location_lat), dtype=bool)
+        near[hits] = True
+        mask[self.pair_brands[near[self.pair_locations]]] = True
+        return mask
+
+    def closest_branches(self, restaurant_names, user_lat, user_lng):
+        """
+        Nearest geocoded branch for every brand in restaurant_names.
+        Returns (row positions into zomato_allBranches, distances in km);
+        brands without a geocoded branch get -1 and inf.
+        """
+        count = len(restaurant_names)
+        best_rows = np.full(count, -1, dtype=np.intp)
+        best_distances = np.full(count, np.inf)
+
+        spans = [self.slices.get(name) for name in restaurant_names]
+        found = [i for i, span in enumerate(spans) if span is not None]
+        if not found:
+            return best_rows, best_distances
+
+        # Concatenate the candidates' branches and measure them in one go
+        branch_idx = np.concatenate([np.arange(*spans[i]) for i in found])
+        lengths = np.array([spans[i][1] - spans[i][0] for i in found])
+        group = np.repeat(np.arange(len(found)), lengths)
+
+        dist = haversine_np(user_lat, user_lng, self.lat[branch_idx], self.lng[branch_idx])
+
+        # Grouped argmin: sort by (group, distance); the first entry of each
+        # group is its nearest branch, ties going to the earlier row as before
+        order = np.lexsort((dist, group))
+        firsts = order[np.r_[0, np.cumsum(lengths)[:-1]]]
+
+        best_rows[found] = self.rows[branch_idx[firsts]]
+        best_distances[found] = dist[firsts]
+        return best_rows, best_distances
+
+
+def find_closest_branch(restaurant_name, user_lat, user_lng):
     """
     zomato_allBranches : original dataframe with ALL branches (has location)
     restaurant_name    : restaurant brand name (string)
     user_lat, user_lng : user / group centroid coordinates
-    coord_dict         : mapping of location -> (lat, lng)
+    Branches are looked up in shared.branch_index, built at startup.
     """
-    # import os
-    # BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    # DATA_PATH = os.path.join(BASE_DIR, "data", "zomato_allBranches.pkl")
-    # zomato = pd.read_pickle(DATA_PATH)
-    
-    branches = shared.zomato[shared.zomato["name"] == restaurant_name]
-
-    best_branch = None
-    best_distance = float("inf")
-
-    for _, row in branches.iterrows():
-
-        loc = str(row["location"]).lower().strip()
-
-        # Skip branches whose location we cannot geocode
-        if loc not in coord_dict:
-            continue
-
-        rest_lat, rest_lng = coord_dict[loc]
-        dist = haversine(user_lat, user_lng, rest_lat, rest_lng)
+    rows, distances = shared.branch_index.closest_branches(
+        [restaurant_name], user_lat, user_lng
+    )
 
-        if dist < best_distance:
-            best_distance = dist
-            best_branch = row
+    if rows[0] < 0:
+        return None, float("inf")
 
-    return best_branch, best_distance
+    return shared.zomato.iloc[rows[0]], float(distances[0])
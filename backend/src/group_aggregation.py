@@ -70,3 +70,137 @@ def aggregate_group_location(users_list):
 
     return group_lat, group_lng
 
+
+## INCREMENTAL AGGREGATION
+## A running, JSON-serialisable group state updated on every submit, so
+## compute only has to finalize it. Editing a user's preferences is applied
+## as a delta: remove the old preferences, add the new ones.
+
+def empty_group_aggregate():
+    return {
+        "cuisines": {},
+        "rest_type": {},
+        "dish_pref": {},
+        "budgets": [],
+        "lat_sum": 0.0,
+        "lng_sum": 0.0,
+        "located": 0,
+    }
+
+
+def _user_location(user):
+    loc_name = user.get("location")
+    if loc_name:
+        key = loc_name.lower().strip()
+        if key in shared.coord_dict:
+            return shared.coord_dict[key]
+    return None
+
+
+def apply_user_to_aggregate(aggregate, user, sign=1):
+    """
+    Adds (sign=1) or removes (sign=-1) one user's preferences.
+    Mirrors exactly what the aggregate_group_* functions count.
+    """
+    for field in ["cuisines", "rest_type", "dish_pref"]:
+        counts = aggregate[field]
+        for item in user.get(field) or []:
+            counts[item] = counts.get(item, 0) + sign
+            if counts[item] <= 0:
+                del counts[item]
+
+    if user.get("budget"):
+        if sign > 0:
+            aggregate["budgets"].append(user["budget"])
+        else:
+            aggregate["budgets"].remove(user["budget"])
+
+    location = _user_location(user)
+    if location is not None:
+        lat, lng = location
+        aggregate["lat_sum"] += sign * lat
+        aggregate["lng_sum"] += sign * lng
+        aggregate["located"] += sign
+
+    return aggregate
+
+
+def finalize_group_aggregate(aggregate):
+    """
+    Same shape as recommendor.aggregate_group:
+    (cuisine_counter, rest_counter, dish_counter, group_budget, (group_lat, group_lng))
+    """
+    def counter(field):
+        return Counter(aggregate[field]) if aggregate[field] else None
+
+    budgets = aggregate["budgets"]
+    group_budget = int(np.median(budgets)) if budgets else None
+
+    if aggregate["located"] > 0:
+        location = (
+            aggregate["lat_sum"] / aggregate["located"],
+            aggregate["lng_sum"] / aggregate["located"],
+        )
+    else:
+        # Default to Bangalore center if no valid locations found
+        location = (12.9716, 77.5946)
+
+    return (
+        counter("cuisines"),
+        counter("rest_type"),
+        counter("dish_pref"),
+        group_budget,
+        location,
+    )
+
+
+## FLAT COUNTERS
+## The same aggregate as independent numeric counters, for stores that
+## update it server-side (session_redis keeps one hash field per counter).
+## Keys are (field, item) for the cuisines / rest_type / dish_pref / budgets
+## counts and (field, None) for lat_sum / lng_sum / located.
+
+def user_aggregate_deltas(user, sign=1, deltas=None):
+    """
+    Adds one user's contribution (sign=1) or removal (sign=-1) to deltas.
+    Mirrors apply_user_to_aggregate.
+    """
+    deltas = {} if deltas is None else deltas
+
+    def add(key, value):
+        deltas[key] = deltas.get(key, 0) + value
+
+    for field in ["cuisines", "rest_type", "dish_pref"]:
+        for item in user.get(field) or []:
+            add((field, item), sign)
+
+    if user.get("budget"):
+        add(("budgets", user["budget"]), sign)
+
+    location = _user_location(user)
+    if location is not None:
+        lat, lng = location
+        add(("lat_sum", None), sign * lat)
+        add(("lng_sum", None), sign * lng)
+        add(("located", None), sign)
+
+    return {key: value for key, value in deltas.items() if value != 0}
+
+
+def aggregate_from_counters(counters):
+    """
+    Rebuilds the aggregate dict from flat counters (zero counts dropped).
+    """
+    aggregate = empty_group_aggregate()
+    for (field, item), value in counters.items():
+        if field in ("lat_sum", "lng_sum"):
+            aggregate[field] = float(value)
+        elif field == "located":
+            aggregate[field] = int(round(value))
+        elif round(value) > 0:
+            count = int(round(value))
+            if field == "budgets":
+                aggregate["budgets"].extend([item] * count)
+            else:
+                aggregate[field][item] = count
+    return aggregate
@@ -0,0 +1,294 @@
+## Service metrics
+## Prometheus histograms, counters and gauges, served by GET /metrics:
+## recommendation stage timings with candidate counts and group size, HTTP
+## route latencies, Redis command timings and WebSocket fan-out.
+## Work is recorded into a small trace dict: stage("...") blocks add their
+## seconds to it, record() sets a count and Redis commands add their round
+## trips. A trace is active per HTTP request (api/request_metrics.py) and per
+## compute (traced()). Code running outside both (benchmarks, scripts) pays
+## a context variable lookup per stage. Traces are plain dicts: process-pool
+## workers return them with the result, and the web worker observes them
+## into its metrics. Observing is a bisect and two additions per value; the
+## text format is only rendered when /metrics is scraped.
+
+import os
+import time
+import bisect
+import contextvars
+from contextlib import contextmanager
+
+COMPUTE_METRICS = os.getenv("COMPUTE_METRICS", "1") == "1"
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+GROUP_SIZE_BUCKETS = [1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50, 100, 250, 500]
+CANDIDATE_BUCKETS = [0, 10, 30, 60, 120, 240, 480, 1000, 2500, 10000, 50000, 250000, 1000000]
+ROUND_TRIP_BUCKETS = [0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50]
+
+_trace = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """
+    Prometheus histogram. Not thread-safe: only the event loop observes.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = list(buckets)
+        self.labels = labels
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self.series = {}
+
+    def observe(self, value, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self):
+        for label_values, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ["+Inf"], counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, label_values)} {total}"
+            yield f"{self.name}_count{_labels(self.labels, label_values)} {cumulative}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, *label_values, amount=1):
+        self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def samples(self):
+        for label_values, value in sorted(self.series.items()):
+            yield f"{self.name}{_labels(self.labels, label_values)} {value}"
+
+
+class Gauge:
+    """
+    Gauge read at scrape time from fn(), so it costs nothing in between.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, fn):
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+
+    def samples(self):
+        yield f"{self.name} {self.fn()}"
+
+
+def render(metric):
+    return "\n".join([
+        f"# HELP {metric.name} {metric.documentation}",
+        f"# TYPE {metric.name} {metric.kind}",
+        *metric.samples(),
+    ])
+
+
+# Recommendation computes
+stage_seconds = Histogram(
+    "mnm_compute_stage_seconds",
+    "Time spent in each recommendation stage per compute (total: the whole compute).",
+    STAGE_BUCKETS,
+    labels=("stage",),
+)
+group_size = Histogram(
+    "mnm_compute_group_size",
+    "Members of the groups computed.",
+    GROUP_SIZE_BUCKETS,
+)
+candidates = Histogram(
+    "mnm_compute_candidates",
+    "Candidate counts per compute: brands in radius, content pool, pool kept after the distance filter, results.",
+    CANDIDATE_BUCKETS,
+    labels=("kind",),
+)
+
+# HTTP routes
+http_seconds = Histogram(
+    "mnm_http_request_seconds",
+    "Time from request start to the end of the response, per route.",
+    STAGE_BUCKETS,
+    labels=("method", "route"),
+)
+http_requests = Counter(
+    "mnm_http_requests_total",
+    "Requests per route and status code.",
+    labels=("method", "route", "status"),
+)
+
+# Redis (session store client)
+redis_seconds = Histogram(
+    "mnm_redis_command_seconds",
+    "Redis round trip time per command (scripts as EVALSHA <name>, transactions as MULTI).",
+    STAGE_BUCKETS,
+    labels=("command",),
+)
+redis_errors = Counter(
+    "mnm_redis_command_errors_total",
+    "Redis commands that raised, per command.",
+    labels=("command",),
+)
+redis_round_trips = Histogram(
+    "mnm_redis_round_trips",
+    "Redis round trips per HTTP request, per route.",
+    ROUND_TRIP_BUCKETS,
+    labels=("method", "route"),
+)
+
+# WebSockets
+ws_fanout_seconds = Histogram(
+    "mnm_ws_fanout_seconds",
+    "Time to send one broadcast to a group's sockets on this worker.",
+    STAGE_BUCKETS,
+)
+ws_fanout_recipients = Histogram(
+    "mnm_ws_fanout_recipients",
+    "Sockets of the group per broadcast on this worker (connections per active group).",
+    GROUP_SIZE_BUCKETS,
+)
+ws_send_failures = Counter(
+    "mnm_ws_send_failures_total",
+    "WebSocket sends that failed or timed out; the socket is dropped.",
+    labels=("reason",),
+)
+
+METRICS = [
+    stage_seconds, group_size, candidates,
+    http_seconds, http_requests,
+    redis_seconds, redis_errors, redis_round_trips,
+    ws_fanout_seconds, ws_fanout_recipients, ws_send_failures,
+]
+
+
+def register(metric):
+    METRICS.append(metric)
+    return metric
+
+
+def new_trace():
+    return {"stages": {}, "counts": {}, "redis": {}}
+
+
+@contextmanager
+def tracing(trace):
+    """
+    Makes trace the active one for the block (and tasks it starts).
+    """
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+class stage:
+    """
+    with stage("score.dish"): ... adds the block's duration to the active
+    trace (repeated stages add up).
+    """
+    __slots__ = ("name", "trace", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = _trace.get()
+        if self.trace is not None:
+            self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        if self.trace is not None:
+            stages = self.trace["stages"]
+            stages[self.name] = stages.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+def record(kind, count):
+    """
+    Sets a candidate count on the active trace (the last one set wins).
+    """
+    trace = _trace.get()
+    if trace is not None:
+        trace["counts"][kind] = count
+
+
+def record_redis(command, seconds, failed=False):
+    """
+    One Redis round trip: into the command histogram and the active trace.
+    """
+    redis_seconds.observe(seconds, command)
+    if failed:
+        redis_errors.inc(command)
+    trace = _trace.get()
+    if trace is not None:
+        entry = trace["redis"].get(command)
+        if entry is None:
+            entry = trace["redis"][command] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+
+
+def traced(fn, *args, **kwargs):
+    """
+    Calls fn with a fresh trace active. Returns (fn's result, trace), the
+    trace being None when metrics are off.
+    """
+    if not COMPUTE_METRICS:
+        return fn(*args, **kwargs), None
+
+    trace = new_trace()
+    start = time.perf_counter()
+    try:
+        with tracing(trace):
+            return fn(*args, **kwargs), trace
+    finally:
+        trace["stages"]["total"] = time.perf_counter() - start
+
+
+def observe_trace(trace, members=None):
+    """
+    Observes a compute's trace. Its stages also join the active (request)
+    trace, as compute.<stage>.
+    """
+    if trace is None:
+        return
+    request = _trace.get()
+    for name, seconds in trace["stages"].items():
+        stage_seconds.observe(seconds, name)
+        if request is not None:
+            request["stages"][f"compute.{name}"] = seconds
+    for kind, count in trace["counts"].items():
+        candidates.observe(count, kind)
+        if request is not None:
+            request["counts"][kind] = count
+    if members is not None:
+        group_size.observe(members)
+
+
+def render_metrics():
+    """
+    Prometheus text exposition format (0.0.4) of every metric with data.
+    """
+    return "\n".join(render(m) for m in METRICS if m.kind == "gauge" or m.series) + "\n"
@@ -1,5 +1,4 @@
-import pickle
-import pandas as pd
+import numpy as np
 from src.group_aggregation import (
     aggregate_group_cuisines,
     aggregate_group_rest_types,
@@ -8,107 +7,161 @@ from src.group_aggregation import (
     aggregate_group_location,
 
 )
-from src.distanceCal import (
-    find_closest_branch
-)
 from src.scoring import (
-    apply_weighted_cuisine_scoring,
-    apply_weighted_rest_type_scoring,
-    apply_weighted_dish_score,
-    apply_rating_score,
-    apply_cost_score,
     compute_distance_score,
-    apply_final_score
 )
 
+from src.metrics import stage, record
+
 from src import shared
 
-def get_final_recommendations_with_distance(
-    # df_full, 
-    top30_df, user_lat, user_lng, coord_dict, top_k=10
-):
-    final_rows = []
+# Number of content-scored candidates passed on to the distance re-rank
+# (at least top_k of them)
+CANDIDATE_POOL_SIZE = 30
 
-    for _, row in top30_df.iterrows():
+# Request parameter defaults / limits (bounded so worst-case latency is too)
+DEFAULT_TOP_K = 10
+MAX_TOP_K = 50
+DEFAULT_RADIUS_KM = 10
+MAX_RADIUS_KM = 50
 
-        rest_name = row["name"]
-        # print(rest_name)
-        best_branch, best_distance = find_closest_branch(
-            # df_full,
-            rest_name, user_lat, user_lng, coord_dict
+def get_final_recommendations_with_distance(
+    top30_df, user_lat, user_lng, top_k=10, radius_km=DEFAULT_RADIUS_KM
+):
+    # Nearest branch of every candidate in one vectorised pass
+    # (shared.branch_index was built from the coordinates at startup)
+    with stage("rerank.closest_branches"):
+        best_rows, best_distances = shared.branch_index.closest_branches(
+            top30_df["name"].to_numpy(), user_lat, user_lng
         )
 
-        if best_distance > 10:   # skip anything beyond 10 km
-            continue
+    with stage("rerank.score"):
+        # skip anything beyond the radius (or with no geocoded branch at all)
+        keep = best_distances <= radius_km
+        candidates = top30_df[keep]
+        best_distances = best_distances[keep]
 
-        if best_branch is None:
-            continue
-
-        dist_score = compute_distance_score(best_distance)
+        dist_score = compute_distance_score(best_distances)
 
         final_score_adjusted = (
-            0.35 * row["cuisine_score"] +
-            0.20 * row["rest_type_score"] +
-            0.25 * row["dish_score"] +
-            0.10 * row["rating_score"] +
-            0.10 * row["cost_score"] +
+            0.35 * candidates["cuisine_score"].to_numpy() +
+            0.20 * candidates["rest_type_score"].to_numpy() +
+            0.25 * candidates["dish_score"].to_numpy() +
+            0.10 * candidates["rating_score"].to_numpy() +
+            0.10 * candidates["cost_score"].to_numpy() +
             0.30 * dist_score
         )
+    record("within_radius", len(candidates))
 
-        best_branch = best_branch.copy()
-        best_branch["distance_km"] = best_distance
-        best_branch["distance_score"] = dist_score
-        best_branch["final_score_adjusted"] = final_score_adjusted
-
-        final_rows.append(best_branch)
+    with stage("rerank.rows"):
+        final_df = shared.zomato.iloc[best_rows[keep]].copy()
+        final_df["distance_km"] = best_distances
+        final_df["distance_score"] = dist_score
+        final_df["final_score_adjusted"] = final_score_adjusted
 
-    final_df = pd.DataFrame(final_rows)
-    final_df = final_df.sort_values("final_score_adjusted", ascending=False)
+        final_df = final_df.sort_values("final_score_adjusted", ascending=False)
 
     return final_df.head(top_k)
 
 
-def recommend_group(df_full, coord_dict, users_list, top_k=10):
+def aggregate_group(users_list):
+    """
+    Weighted group preferences:
+    (cuisine_counter, rest_counter, dish_counter, group_budget, (group_lat, group_lng))
+    """
+    return (
+        aggregate_group_cuisines(users_list),
+        aggregate_group_rest_types(users_list),
+        aggregate_group_dishes(users_list),
+        aggregate_group_budget(users_list),
+        aggregate_group_location(users_list),
+    )
+
+
+def recommend_group(users_list, top_k=10, radius_km=DEFAULT_RADIUS_KM):
 
     # 1. Aggregate weighted preferences
-    cuisine_counter = aggregate_group_cuisines(users_list)
-    rest_counter = aggregate_group_rest_types(users_list)
-    dish_counter = aggregate_group_dishes(users_list)
-    group_budget = aggregate_group_budget(users_list)
-    group_lat, group_lng = aggregate_group_location(users_list)
-
-    # 2. Load vectorizer & matrix dynamically
-    import os
-    # src/ is one level down from backend/
-    # recommendor.py is in src/, so go up one level to backend/, then into data/
-    # usage: os.path.dirname(__file__) -> .../backend/src
-    
-    # BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    # DATA_DIR = os.path.join(BASE_DIR, "data")
-
-    # vectorizer = pickle.load(open(os.path.join(DATA_DIR, "dish_vectorizer.pkl"), "rb"))
-    # tfidf_matrix = pickle.load(open(os.path.join(DATA_DIR, "dish_tfidf_matrix.pkl"), "rb"))
-
-    # 3. Apply weighted scoring
-    df = df_full.copy()
-
-    df = apply_weighted_cuisine_scoring(df, cuisine_counter)
-    df = apply_weighted_rest_type_scoring(df, rest_counter)
-    df = apply_rating_score(df)               # unchanged
-    df = apply_cost_score(df, group_budget)   # unchanged
-    df = apply_weighted_dish_score(df, dish_counter, shared.vectorizer, shared.tfidf_matrix)
-
-    # 4. Base scoring to pick top 30
-    df = apply_final_score(df)
-    top30 = df.sort_values("final_score", ascending=False).head(30)
-
-    # 5. Apply distance + branch selection
+    with stage("aggregate"):
+        aggregates = aggregate_group(users_list)
+
+    return recommend_from_aggregates(aggregates, top_k, radius_km)
+
+
+def rank_within_radius(engine, scores, group_lat, group_lng, top_k, radius_km):
+    """
+    Content top-N restricted to brands with a branch inside the radius,
+    then the distance re-rank. Every candidate already has a branch in the
+    radius, so the re-rank keeps them all and one pool of
+    max(CANDIDATE_POOL_SIZE, top_k) fills top_k whenever enough brands are
+    in range.
+    """
+    with stage("candidates.in_radius"):
+        in_radius = shared.branch_index.brands_within(group_lat, group_lng, radius_km)
+    record("in_radius", int(np.count_nonzero(in_radius)))
+
+    with stage("candidates.top"):
+        top_positions = engine.top_candidates(scores, max(CANDIDATE_POOL_SIZE, top_k), mask=in_radius)
+        candidates = engine.candidates_frame(scores, top_positions)
+    record("pool", len(top_positions))
+
     final_results = get_final_recommendations_with_distance(
-        top30_df=top30,
+        top30_df=candidates,
         user_lat=group_lat,
         user_lng=group_lng,
-        coord_dict=coord_dict,
-        top_k=top_k
+        top_k=top_k,
+        radius_km=radius_km,
     )
-
+    record("results", len(final_results))
     return final_results
+
+
+def recommend_from_aggregates(aggregates, top_k=10, radius_km=DEFAULT_RADIUS_KM):
+    cuisine_counter, rest_counter, dish_counter, group_budget, (group_lat, group_lng) = aggregates
+
+    # 2. Score every restaurant into the engine's reusable buffers
+    # (features were encoded once in load_assets, so zomato_unique is never copied)
+    engine = shared.scoring_engine
+    buffers = engine.score(
+        cuisine_counter, rest_counter, dish_counter, group_budget, shared.dish_encoder
+    )
+
+    # 3 + 4. Top candidates among in-radius brands, then distance + branch selection
+    return rank_within_radius(
+        engine, buffers, group_lat, group_lng, top_k, radius_km
+    )
+
+
+def recommend_groups(users_lists, top_k=10, radius_km=DEFAULT_RADIUS_KM):
+    """
+    Batch version of recommend_group for many groups finishing at once.
+    All groups are scored against the restaurant table in one batched
+    matrix product; each group still gets its own distance re-rank.
+    Returns one DataFrame per group, identical to recommend_group's.
+    """
+    if not users_lists:
+        return []
+
+    # 1. Aggregate weighted preferences per group
+    aggregates = [aggregate_group(users_list) for users_list in users_lists]
+    cuisine_counters, rest_counters, dish_counters, group_budgets, locations = (
+        list(column) for column in zip(*aggregates)
+    )
+
+    # 2. Score all groups at once
+    engine = shared.scoring_engine
+    batch_scores = engine.score_batch(
+        cuisine_counters, rest_counters, dish_counters, group_budgets, shared.dish_encoder
+    )
+
+    # 3 + 4. Candidate selection and distance re-rank per group
+    return [
+        rank_within_radius(
+            engine,
+            engine.group_view(batch_scores, g),
+            group_lat,
+            group_lng,
+            top_k,
+            radius_km,
+        )
+        for g, (group_lat, group_lng) in enumerate(locations)
+    ]
@@ -0,0 +1,160 @@
+## Recommendation result cache
+## Groups with the same aggregated preferences get the same recommendations,
+## so results are cached under a canonical fingerprint of
+## (counters, median budget, rounded centroid, top_k, radius).
+## Tier 1: in-process LRU with TTL.  Tier 2 (optional): shared Redis.
+## Every entry is tagged with shared.asset_version, so reloading different
+## assets invalidates everything computed from the old ones.
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from src import shared
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "600"))  # seconds
+# Centroids closer than this many decimals of a degree share an entry (4 ~ 11 m)
+RESULT_CACHE_CENTROID_DECIMALS = int(os.getenv("RESULT_CACHE_CENTROID_DECIMALS", "4"))
+# Shared Redis tier is opt-in
+RESULT_CACHE_REDIS = os.getenv("RESULT_CACHE_REDIS", "0") == "1"
+# Socket and connect timeout of the Redis tier (seconds): a slow Redis is a
+# cache miss, not a stalled compute
+RESULT_CACHE_REDIS_TIMEOUT = float(os.getenv("RESULT_CACHE_REDIS_TIMEOUT", "0.5"))
+
+REDIS_KEY_PREFIX = "mnm:reco"
+
+
+def group_fingerprint(cuisine_counter, rest_counter, dish_counter, group_budget, location, top_k, radius_km):
+    """
+    Canonical hash of a group's aggregated preferences.
+    Independent of member order and of dict/Counter insertion order.
+    """
+    def canonical(counter):
+        return sorted(counter.items()) if counter else []
+
+    def rounded(coord):
+        # Snap away float noise from summation order first, otherwise a
+        # centroid sitting on a rounding boundary could land either side
+        return round(round(coord, 9), RESULT_CACHE_CENTROID_DECIMALS)
+
+    group_lat, group_lng = location
+    payload = {
+        "cuisines": canonical(cuisine_counter),
+        "rest_type": canonical(rest_counter),
+        "dishes": canonical(dish_counter),
+        "budget": group_budget,
+        "centroid": [rounded(group_lat), rounded(group_lng)],
+        "top_k": top_k,
+        "radius_km": radius_km,
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_size=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL, redis_client=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis_client = redis_client
+        # key -> (expires_at, DataFrame); ordered oldest -> most recently used
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self):
+        # Called with the lock held: drop everything built from older assets
+        if self._version != shared.asset_version:
+            self._entries.clear()
+            self._version = shared.asset_version
+
+    def _redis_key(self, key):
+        return f"{REDIS_KEY_PREFIX}:{shared.asset_version}:{key}"
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value.copy()
+                del self._entries[key]
+
+        value = self._get_redis(key)
+        if value is not None:
+            self._put_local(key, value)
+            with self._lock:
+                self.hits += 1
+            return value.copy()
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self._put_local(key, value.copy())
+        self._set_redis(key, value)
+
+    def _put_local(self, key, value):
+        with self._lock:
+            self._check_version()
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_redis(self, key):
+        if self.redis_client is None:
+            return None
+        try:
+            data = self.redis_client.get(self._redis_key(key))
+        except Exception as e:
+            print(f"Result cache Redis read failed: {e}")
+            return None
+        if not data:
+            return None
+        return pd.DataFrame(json.loads(data))
+
+    def _set_redis(self, key, value):
+        if self.redis_client is None:
+            return
+        try:
+            self.redis_client.set(
+                self._redis_key(key),
+                json.dumps(value.to_dict(orient="records")),
+                ex=self.ttl,
+            )
+        except Exception as e:
+            print(f"Result cache Redis write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _make_redis_client():
+    if not RESULT_CACHE_REDIS:
+        return None
+    import redis
+
+    redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+    return redis.Redis.from_url(
+        redis_url,
+        decode_responses=True,
+        socket_timeout=RESULT_CACHE_REDIS_TIMEOUT,
+        socket_connect_timeout=RESULT_CACHE_REDIS_TIMEOUT,
+    )
+
+
+result_cache = ResultCache(redis_client=_make_redis_client())
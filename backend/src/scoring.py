@@ -1,58 +1,242 @@
 
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
+from functools import lru_cache
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
+
+## FEATURE MATRICES (built once in load_assets)
+
+def build_feature_matrices(df):
+    """
+    Encodes the list-valued `cuisines` and `rest_type` columns into
+    CSR count matrices (rows x vocab) over one shared vocabulary.
+    Returns (vocab, cuisine_matrix, rest_type_matrix).
+    """
+    vocab = {}
+
+    def encode(column):
+        indptr = [0]
+        indices = []
+        for tokens in column:
+            for token in tokens:
+                indices.append(vocab.setdefault(token, len(vocab)))
+            indptr.append(len(indices))
+        return indptr, indices
+
+    cuisine_parts = encode(df["cuisines"])
+    rest_type_parts = encode(df["rest_type"])
+
+    def to_csr(indptr, indices):
+        matrix = csr_matrix(
+            (np.ones(len(indices)), indices, indptr),
+            shape=(len(indptr) - 1, len(vocab)),
+        )
+        # Repeated tokens in one row are counted, same as the old row-wise sum
+        matrix.sum_duplicates()
+        return matrix
+
+    return vocab, to_csr(*cuisine_parts), to_csr(*rest_type_parts)
+
+
+def counter_to_weights(counter, vocab):
+    """
+    Turns a group Counter into a dense weight vector over the vocabulary.
+    Keys no restaurant carries are dropped (they could never score anyway).
+    """
+    weights = np.zeros(len(vocab))
+    for key, freq in counter.items():
+        idx = vocab.get(key)
+        if idx is not None:
+            weights[idx] += freq
+    return weights
+
+
+def weighted_feature_score(counter, feature_matrix, vocab, out=None):
+    """
+    Max-normalised sum of the group's weights over each row's features.
+    Writes into `out` when a buffer is given.
+    """
+    scores = feature_matrix @ counter_to_weights(counter, vocab)
+    if out is None:
+        out = scores
+
+    max_score = scores.max() if len(scores) else 0
+    if max_score > 0:
+        np.divide(scores, max_score, out=out)
+    elif out is not scores:
+        out[:] = scores
+
+    return out
+
 ## CUISING SCORING
 
-def apply_weighted_cuisine_scoring(df, cuisine_counter):
+def apply_weighted_cuisine_scoring(df, cuisine_counter, cuisine_matrix, vocab):
     if not cuisine_counter:
         df["cuisine_score"] = 0
         return df
 
-    df["cuisine_score"] = df["cuisines"].apply(
-        lambda rest_cui: sum(cuisine_counter.get(c, 0) for c in rest_cui)
-    )
-
-    max_score = df["cuisine_score"].max()
-    if max_score > 0:
-        df["cuisine_score"] = df["cuisine_score"] / max_score
-
+    df["cuisine_score"] = weighted_feature_score(cuisine_counter, cuisine_matrix, vocab)
     return df
 
 
 ## RESTAURANT TYPE SCORING
 
-def apply_weighted_rest_type_scoring(df, rest_counter):
+def apply_weighted_rest_type_scoring(df, rest_counter, rest_type_matrix, vocab):
     if not rest_counter:
         df["rest_type_score"] = 0
         return df
 
-    df["rest_type_score"] = df["rest_type"].apply(
-        lambda rt: sum(rest_counter.get(t, 0) for t in rt)
-    )
-
-    max_score = df["rest_type_score"].max()
-    if max_score > 0:
-        df["rest_type_score"] = df["rest_type_score"] / max_score
-
+    df["rest_type_score"] = weighted_feature_score(rest_counter, rest_type_matrix, vocab)
     return df
 
 ## DISH SCORING
 
-def apply_weighted_dish_score(df, dish_counter, vectorizer, tfidf_matrix):
-    if not dish_counter:
-        df["dish_score"] = 0
-        return df
+def normalize_tfidf_matrix(tfidf_matrix):
+    """
+    L2-normalises the restaurant TF-IDF rows once (float32 CSR), so cosine
+    similarity against it is a plain sparse dot product per compute.
+    """
+    matrix = csr_matrix(tfidf_matrix, dtype=np.float32)
+    return normalize(matrix, norm="l2", copy=False)
+
+
+class DishQueryEncoder:
+    """
+    Builds TF-IDF query vectors straight from dish Counters using the fitted
+    vectorizer's vocabulary and IDF weights. Equivalent to
+    vectorizer.transform(" ".join(dish repeated freq times)) without building
+    or re-tokenizing the repeated string.
+    """
+
+    # Vectorizer parameters that shape the analyzer (kept in the asset bundle)
+    ANALYZER_PARAMS = [
+        "input", "encoding", "decode_error", "strip_accents", "lowercase",
+        "stop_words", "token_pattern", "ngram_range", "analyzer",
+    ]
+
+    def __init__(self, vectorizer):
+        idf = None
+        if vectorizer.use_idf:
+            try:
+                idf = vectorizer.idf_
+            except AttributeError:
+                # Vectorizers pickled by older scikit-learn only keep the diagonal matrix
+                idf = vectorizer._tfidf._idf_diag.diagonal()
+
+        params = vectorizer.get_params()
+        self._setup(
+            vectorizer.vocabulary_,
+            idf,
+            {name: params[name] for name in self.ANALYZER_PARAMS},
+            vectorizer.binary,
+            vectorizer.sublinear_tf,
+            vectorizer.build_analyzer(),
+        )
+        # Custom callables cannot be rebuilt from a bundle
+        self.portable = params["preprocessor"] is None and params["tokenizer"] is None
+
+    def _setup(self, vocabulary, idf, analyzer_params, binary, sublinear_tf, analyzer):
+        self.vocabulary = vocabulary
+        self.idf = None if idf is None else np.asarray(idf, dtype=np.float32)
+        self.analyzer_params = analyzer_params
+        self.binary = binary
+        self.sublinear_tf = sublinear_tf
+
+        self._analyzer = analyzer
+        # Each distinct dish name is tokenized once
+        self._terms = lru_cache(maxsize=4096)(self._dish_terms)
+
+    def to_arrays(self):
+        """
+        (arrays, meta) describing the encoder, for the asset bundle.
+        """
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        arrays = {"dish_encoder.terms": np.array(terms, dtype=str)}
+        if self.idf is not None:
+            arrays["dish_encoder.idf"] = self.idf
+        meta = {
+            "analyzer_params": self.analyzer_params,
+            "binary": self.binary,
+            "sublinear_tf": self.sublinear_tf,
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        """
+        Rebuilds the encoder from to_arrays() output without unpickling
+        the fitted vectorizer.
+        """
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        params = dict(meta["analyzer_params"])
+        if params.get("ngram_range") is not None:
+            params["ngram_range"] = tuple(params["ngram_range"])
+
+        encoder = cls.__new__(cls)
+        encoder._setup(
+            {term: i for i, term in enumerate(arrays["dish_encoder.terms"].tolist())},
+            arrays.get("dish_encoder.idf"),
+            meta["analyzer_params"],
+            meta["binary"],
+            meta["sublinear_tf"],
+            TfidfVectorizer(**params).build_analyzer(),
+        )
+        encoder.portable = True
+        return encoder
 
-    query_words = []
-    for dish, freq in dish_counter.items():
-        query_words.extend([dish] * freq)  # repeat dish by weight
+    def _dish_terms(self, dish):
+        return tuple(
+            self.vocabulary[token]
+            for token in self._analyzer(dish)
+            if token in self.vocabulary
+        )
 
-    query_str = " ".join(query_words)
+    def encode(self, dish_counters):
+        """
+        One L2-normalised float32 query row per dish Counter
+        (dense: the vocabulary is small and queries touch few terms).
+        """
+        queries = np.zeros((len(dish_counters), len(self.vocabulary)), dtype=np.float32)
+        for g, dish_counter in enumerate(dish_counters):
+            row = queries[g]
+            for dish, freq in dish_counter.items():
+                for term in self._terms(dish):
+                    row[term] += freq
 
-    user_vec = vectorizer.transform([query_str])
-    sim_scores = cosine_similarity(user_vec, tfidf_matrix).flatten()
+        if self.binary:
+            np.minimum(queries, 1, out=queries)
+        elif self.sublinear_tf:
+            nonzero = queries > 0
+            queries[nonzero] = np.log(queries[nonzero]) + 1
+        if self.idf is not None:
+            queries *= self.idf
 
-    df["dish_score"] = sim_scores
+        norms = np.sqrt(np.einsum("ij,ij->i", queries, queries))[:, None]
+        np.divide(queries, norms, out=queries, where=norms > 0)
+        return queries
+
+
+def dish_similarities(dish_counters, dish_encoder, tfidf_matrix):
+    """
+    Cosine similarity of several groups' dish queries against every
+    restaurant; one row per counter. tfidf_matrix must already be
+    row-normalised (normalize_tfidf_matrix).
+    """
+    queries = dish_encoder.encode(dish_counters)
+    return (tfidf_matrix @ queries.T).T.astype(float)
+
+
+def dish_similarity(dish_counter, dish_encoder, tfidf_matrix):
+    return dish_similarities([dish_counter], dish_encoder, tfidf_matrix)[0]
+
+
+def apply_weighted_dish_score(df, dish_counter, dish_encoder, tfidf_matrix):
+    if not dish_counter:
+        df["dish_score"] = 0
+        return df
+
+    df["dish_score"] = dish_similarity(dish_counter, dish_encoder, tfidf_matrix)
     return df
 
 ## RATING SCORE
@@ -63,6 +247,17 @@ def apply_rating_score(df):
 
 ## COST SCORING
 
+def cost_scores(costs, user_budget, out=None):
+    """
+    1 / (|cost - budget| + 1) over a cost array, computed in place when
+    `out` is given.
+    """
+    out = np.subtract(costs, user_budget, out=out)
+    np.abs(out, out=out)
+    out += 1
+    np.divide(1, out, out=out)
+    return out
+
 def apply_cost_score(df, user_budget):
     
     if user_budget is None:
@@ -81,6 +276,17 @@ def compute_distance_score(distance_km):
 
 ## FINAL COMPLETE SCORING
 
+def final_scores(cuisine, rest_type, dish, rating, cost, out=None):
+    """
+    Same weighting (and summation order) as apply_final_score, on arrays.
+    """
+    out = np.multiply(cuisine, 0.35, out=out)
+    out += 0.20 * rest_type
+    out += 0.25 * dish
+    out += 0.10 * rating
+    out += 0.10 * cost
+    return out
+
 def apply_final_score(df):
     df["final_score"] = (
         0.35 * df["cuisine_score"] +
@@ -0,0 +1,197 @@
+## Columnar scoring engine
+## Restaurant features are kept as NumPy arrays built once in load_assets.
+## Each compute writes its component scores into per-thread reusable buffers
+## and picks the top-N candidates with argpartition, so zomato_unique is never
+## copied; only the final candidate rows become a DataFrame.
+
+import threading
+import numpy as np
+import pandas as pd
+
+from src.scoring import (
+    counter_to_weights,
+    weighted_feature_score,
+    dish_similarity,
+    dish_similarities,
+    cost_scores,
+    final_scores,
+)
+from src.metrics import stage
+
+SCORE_COLUMNS = ["cuisine_score", "rest_type_score", "dish_score", "rating_score", "cost_score"]
+
+
+class ScoringEngine:
+    def __init__(self, df, vocab, cuisine_matrix, rest_type_matrix, tfidf_matrix, columns=None):
+        self.size = len(df)
+        self.index = df.index.to_numpy()
+        self.names = df["name"].to_numpy()
+        # Numeric columns may come precomputed (e.g. from the shared asset store)
+        columns = columns if columns is not None else self.numeric_columns(df)
+        self.costs = columns["costs"]
+        self.rating_score = columns["rating_score"]
+
+        self.vocab = vocab
+        self.cuisine_matrix = cuisine_matrix
+        self.rest_type_matrix = rest_type_matrix
+        self.tfidf_matrix = tfidf_matrix
+
+        self._local = threading.local()
+
+    @staticmethod
+    def numeric_columns(df):
+        return {
+            "costs": df["approx_cost(for two people)"].to_numpy(dtype=float),
+            # Rating score does not depend on the group, so it is computed once
+            "rating_score": df["MeanRating"].to_numpy(dtype=float) / 5,
+        }
+
+    def _buffers(self):
+        # One set of buffers per thread so concurrent computes never share them
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = {
+                name: np.empty(self.size)
+                for name in ["cuisine_score", "rest_type_score", "dish_score", "cost_score", "final_score"]
+            }
+            buffers["rating_score"] = self.rating_score
+            self._local.buffers = buffers
+        return buffers
+
+    def score(self, cuisine_counter, rest_counter, dish_counter, group_budget, dish_encoder):
+        """
+        Scores every restaurant for one group.
+        Returns the thread's buffers (valid until this thread scores again).
+        """
+        buffers = self._buffers()
+
+        with stage("score.cuisine"):
+            if cuisine_counter:
+                weighted_feature_score(cuisine_counter, self.cuisine_matrix, self.vocab, out=buffers["cuisine_score"])
+            else:
+                buffers["cuisine_score"].fill(0)
+
+        with stage("score.rest_type"):
+            if rest_counter:
+                weighted_feature_score(rest_counter, self.rest_type_matrix, self.vocab, out=buffers["rest_type_score"])
+            else:
+                buffers["rest_type_score"].fill(0)
+
+        # TF-IDF query encoding + similarity against every restaurant
+        with stage("score.dish"):
+            if dish_counter:
+                buffers["dish_score"][:] = dish_similarity(dish_counter, dish_encoder, self.tfidf_matrix)
+            else:
+                buffers["dish_score"].fill(0)
+
+        with stage("score.cost"):
+            if group_budget is None:
+                buffers["cost_score"].fill(0)
+            else:
+                cost_scores(self.costs, group_budget, out=buffers["cost_score"])
+
+        with stage("score.final"):
+            final_scores(
+                buffers["cuisine_score"],
+                buffers["rest_type_score"],
+                buffers["dish_score"],
+                buffers["rating_score"],
+                buffers["cost_score"],
+                out=buffers["final_score"],
+            )
+        return buffers
+
+    def _batch_feature_scores(self, counters, feature_matrix):
+        # One column of weights per group -> a single sparse mat-mat product
+        weights = np.zeros((len(self.vocab), len(counters)))
+        for g, counter in enumerate(counters):
+            if counter:
+                weights[:, g] = counter_to_weights(counter, self.vocab)
+
+        scores = np.ascontiguousarray((feature_matrix @ weights).T)
+
+        max_scores = scores.max(axis=1, keepdims=True) if self.size else 0
+        np.divide(scores, max_scores, out=scores, where=max_scores > 0)
+        return scores
+
+    def score_batch(self, cuisine_counters, rest_counters, dish_counters, group_budgets, dish_encoder):
+        """
+        Scores every restaurant for several groups at once.
+        Returns a dict of (groups x restaurants) arrays; row g holds exactly
+        what score() would produce for group g.
+        """
+        groups = len(group_budgets)
+        scores = {
+            "cuisine_score": self._batch_feature_scores(cuisine_counters, self.cuisine_matrix),
+            "rest_type_score": self._batch_feature_scores(rest_counters, self.rest_type_matrix),
+            "rating_score": np.broadcast_to(self.rating_score, (groups, self.size)),
+        }
+
+        scores["dish_score"] = np.zeros((groups, self.size))
+        with_dishes = [g for g, counter in enumerate(dish_counters) if counter]
+        if with_dishes:
+            scores["dish_score"][with_dishes] = dish_similarities(
+                [dish_counters[g] for g in with_dishes], dish_encoder, self.tfidf_matrix
+            )
+
+        scores["cost_score"] = np.zeros((groups, self.size))
+        with_budget = [g for g, budget in enumerate(group_budgets) if budget is not None]
+        if with_budget:
+            budgets = np.array([group_budgets[g] for g in with_budget], dtype=float)
+            scores["cost_score"][with_budget] = cost_scores(self.costs, budgets[:, None])
+
+        scores["final_score"] = final_scores(
+            scores["cuisine_score"],
+            scores["rest_type_score"],
+            scores["dish_score"],
+            scores["rating_score"],
+            scores["cost_score"],
+        )
+        return scores
+
+    @staticmethod
+    def group_view(batch_scores, g):
+        """
+        Row g of score_batch() output, shaped like the buffers of score().
+        """
+        return {name: values[g] for name, values in batch_scores.items()}
+
+    def top_candidates(self, buffers, n, mask=None):
+        """
+        Row positions of the n best final scores, best first.
+        With a boolean mask only rows where it is True are eligible.
+        Ties are broken by row position so the order is deterministic.
+        """
+        final = buffers["final_score"]
+        eligible = np.flatnonzero(mask) if mask is not None else None
+        pool = len(eligible) if eligible is not None else self.size
+
+        n = min(n, pool)
+        if n <= 0:
+            return np.empty(0, dtype=np.intp)
+
+        scores = final[eligible] if eligible is not None else final
+        if n < pool:
+            idx = np.argpartition(-scores, n - 1)[:n]
+            # argpartition picks arbitrarily among rows tied with the n-th
+            # score; keep the lowest row positions, as a full sort would
+            cutoff = scores[idx].min()
+            above = np.flatnonzero(scores > cutoff)
+            tied = np.flatnonzero(scores == cutoff)[: n - len(above)]
+            if len(above) + len(tied) == n:
+                idx = np.concatenate([above, tied])
+        else:
+            idx = np.arange(pool)
+        if eligible is not None:
+            idx = eligible[idx]
+
+        return idx[np.lexsort((idx, -final[idx]))]
+
+    def candidates_frame(self, buffers, positions):
+        """
+        Builds the small DataFrame (name + component scores) for the chosen rows.
+        """
+        data = {"name": self.names[positions]}
+        for col in SCORE_COLUMNS + ["final_score"]:
+            data[col] = buffers[col][positions]
+        return pd.DataFrame(data, index=self.index[positions])
@@ -1,6 +1,33 @@
 # Global variables for data
 vectorizer = None
-tfidf_matrix = None
+tfidf_matrix = None  # L2-normalised float32 CSR (see normalize_tfidf_matrix)
+dish_encoder = None
 zomato = None
 zomato_unique = None
 coord_dict = None
+
+# Sparse one-hot features over zomato_unique (built in load_assets)
+feature_vocab = None
+cuisine_matrix = None
+rest_type_matrix = None
+
+# Columnar scoring engine over zomato_unique (built in load_assets)
+scoring_engine = None
+
+# Brand name -> geocoded branches of zomato (built in load_assets)
+branch_index = None
+
+# Fingerprint of the loaded data files; cached results are tagged with it
+asset_version = None
+
+# Numeric asset arrays; read-only memory maps shared by every worker process
+# when the shared asset store is in use (see src/asset_store.py)
+asset_arrays = None
+
+# Seconds spent in each load_assets step
+load_timings = {}
+
+# Set once load_assets has finished; compute routes answer 503 until then
+assets_ready = False
+# Why the background load failed, if it did
+asset_load_error = None
@@ -0,0 +1,98 @@
+## Shared fixtures. Tests run from backend/ (python -m pytest) against the
+## real data in data/, loaded once per session the way the API loads it.
+
+import os
+import sys
+import random
+import asyncio
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope="session")
+def assets():
+    """
+    src.shared with the restaurant data, features and indexes loaded.
+    """
+    from lifecycle import load_assets
+    from src import shared
+
+    if not shared.assets_ready:
+        load_assets()
+    return shared
+
+
+@pytest.fixture(scope="session")
+def sample_groups(assets):
+    """
+    Deterministic groups of 1-12 members drawn from the real vocabularies,
+    with a few unknown cuisines, dishes and locations mixed in.
+    """
+    unique = assets.zomato_unique
+    cuisines = sorted({c for row in unique["cuisines"] for c in row}) + ["martian"]
+    rest_types = sorted({t for row in unique["rest_type"] for t in row if t})
+    dishes = sorted({d for row in unique["dish_liked"] for d in row if d})[:300] + ["unknown_dish"]
+    locations = sorted(assets.coord_dict) + ["Nowhere"]
+
+    rng = random.Random(7)
+    groups = []
+    for _ in range(40):
+        groups.append([
+            {
+                "cuisines": rng.sample(cuisines, rng.randint(0, 3)),
+                "rest_type": rng.sample(rest_types, rng.randint(0, 2)),
+                "dish_pref": rng.sample(dishes, rng.randint(0, 3)),
+                "budget": rng.choice([0, 300, 500, 800, 1200, 2500]),
+                "location": rng.choice(locations),
+            }
+            for _ in range(rng.choice([1, 2, 3, 5, 8, 12]))
+        ])
+    return groups
+
+
+@pytest.fixture
+def anyio_backend():
+    # Async tests (pytest.mark.anyio) run on asyncio, like uvicorn
+    return "asyncio"
+
+
+@pytest.fixture
+def memory_store(monkeypatch):
+    """
+    api.session_store with empty state, and an expiry event bound to
+    this test's loop.
+    """
+    from api import session_store
+
+    monkeypatch.setattr(session_store, "GROUPS", {})
+    monkeypatch.setattr(session_store, "_expiry_heap", [])
+    monkeypatch.setattr(session_store, "_expiry_changed", asyncio.Event())
+    return session_store
+
+
+@pytest.fixture
+def redis_store(monkeypatch):
+    """
+    api.session_redis running against an in-process fakeredis server
+    (the Lua scripts need fakeredis[lua]).
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from api import session_redis
+
+    client = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    monkeypatch.setattr(session_redis, "redis_client", client)
+    monkeypatch.setattr(session_redis, "no_retry_client", client)
+    for script in [
+        session_redis.join_script,
+        session_redis.submit_script,
+        session_redis.update_script,
+        session_redis.claim_compute_script,
+        session_redis.store_result_script,
+    ]:
+        monkeypatch.setattr(script, "registered_client", client)
+    return session_redis
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from api import routes
+from api.schemas import UserPreference
+from src.recommendor import recommend_from_aggregates
+
+pytestmark = pytest.mark.anyio
+
+PREFS = {"cuisines": ["cafe"], "rest_type": ["cafe"], "dish_pref": ["pasta"], "budget": 500, "location": "BTM"}
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request, monkeypatch):
+    """
+    Each session store in turn, behind the compute routes.
+    """
+    store = request.getfixturevalue(f"{request.param}_store")
+    for name in ["prepare_group_compute", "release_group_compute", "store_group_result", "getComputedResult"]:
+        monkeypatch.setattr(routes, name, getattr(store, name))
+    return store
+
+
+@pytest.fixture
+def computes(assets, monkeypatch):
+    """
+    Counts the computes that reach the pool; each one yields to the loop
+    first, like a real compute does. Set fail to make the next one 504.
+    """
+    calls = []
+    state = {"fail": False}
+
+    async def recommend(aggregates, top_k, radius_km, members=None):
+        calls.append(members)
+        await asyncio.sleep(0.05)
+        if state.pop("fail", False):
+            raise HTTPException(status_code=504, detail="Recommendation compute timed out")
+        return recommend_from_aggregates(aggregates, top_k, radius_km)
+
+    monkeypatch.setattr(routes.compute_pool, "recommend", recommend)
+    return calls, state
+
+
+@pytest.fixture
+def broadcasts(monkeypatch):
+    sent = []
+
+    async def broadcast(group_id, message):
+        sent.append(message)
+
+    monkeypatch.setattr(routes.manager, "broadcast", broadcast)
+    return sent
+
+
+async def ready_group(store, members=2):
+    group_id = await store.create_group(auto_compute=True)
+    for _ in range(members):
+        user_id, _ = await store.add_user(group_id)
+        await store.submit_preferences(group_id, user_id, UserPreference(**PREFS))
+    return group_id
+
+
+def client_compute(group_id):
+    return routes.compute_group_api(group_id, top_k=10, radius_km=10)
+
+
+@pytest.mark.parametrize("client_first", [False, True])
+async def test_auto_and_client_compute_run_once(store, computes, broadcasts, client_first):
+    calls, _ = computes
+    group_id = await ready_group(store)
+
+    tasks = [routes.auto_compute_group(group_id), client_compute(group_id)]
+    if client_first:
+        tasks.reverse()
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    client = outcomes[0] if client_first else outcomes[1]
+
+    assert calls == [2]
+    if client_first:
+        assert client == {"status": "computed"}
+    else:
+        assert isinstance(client, HTTPException) and client.status_code == 409
+    assert not [m for m in broadcasts if m.get("type") == "COMPUTE_FAILED"]
+    assert len([m for m in broadcasts if "RESULT_COMPUTED" in (m.get("type"), m.get("event"))]) == 1
+    assert (await store.getComputedResult(group_id))[0]
+
+
+async def test_computed_group_keeps_its_result(store, computes, broadcasts):
+    calls, _ = computes
+    group_id = await ready_group(store)
+    await client_compute(group_id)
+    body = await store.getComputedResult(group_id)
+
+    assert await client_compute(group_id) == {"status": "computed"}
+
+    assert len(calls) == 1
+    assert len(broadcasts) == 1
+    assert await store.getComputedResult(group_id) == body
+
+
+async def test_failed_compute_releases_the_group(store, computes, broadcasts):
+    calls, state = computes
+    state["fail"] = True
+    group_id = await ready_group(store)
+
+    with pytest.raises(HTTPException) as error:
+        await client_compute(group_id)
+    assert error.value.status_code == 504
+
+    assert await client_compute(group_id) == {"status": "computed"}
+    assert len(calls) == 2
@@ -0,0 +1,181 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+from api import compute_pool as pool_module
+from api.compute_pool import ComputePool
+from src.recommendor import aggregate_group
+from src.result_cache import ResultCache
+
+pytestmark = pytest.mark.anyio
+
+USERS = [{"cuisines": ["cafe"], "rest_type": ["cafe"], "dish_pref": ["pasta"], "budget": 500, "location": "BTM"}]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResultCache()
+    monkeypatch.setattr(pool_module, "result_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def aggregates(assets):
+    return aggregate_group(USERS)
+
+
+@pytest.fixture
+def blocking_worker(monkeypatch):
+    """
+    Replaces the compute with one that waits for release.set().
+    """
+    release = threading.Event()
+    calls = []
+
+    def worker(aggregates, top_k, radius_km):
+        calls.append(top_k)
+        release.wait(5)
+        return pd.DataFrame({"name": [f"top {top_k}"]}), None
+
+    monkeypatch.setattr(pool_module, "_recommend_in_worker", worker)
+    yield release, calls
+    release.set()
+
+
+def executor_pool(**kwargs):
+    # A thread executor stands in for the process pool: same futures API
+    pool = ComputePool(workers=1, **kwargs)
+    pool.executor = ThreadPoolExecutor(max_workers=2)
+    return pool
+
+
+async def test_queue_full_is_503_with_retry_after(cache, aggregates, blocking_worker):
+    release, _ = blocking_worker
+    pool = executor_pool(max_pending=1, timeout=5)
+
+    first = asyncio.ensure_future(pool.recommend(aggregates, 10, 10))
+    await asyncio.sleep(0.05)
+    with pytest.raises(HTTPException) as error:
+        await pool.recommend(aggregates, 11, 10)
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == str(pool_module.COMPUTE_RETRY_AFTER)
+
+    release.set()
+    assert (await first)["name"].tolist() == ["top 10"]
+    pool.shutdown()
+
+
+async def test_timeout_is_504_and_slot_frees_when_task_ends(cache, aggregates, blocking_worker):
+    release, _ = blocking_worker
+    pool = executor_pool(max_pending=4, timeout=0.05)
+
+    with pytest.raises(HTTPException) as error:
+        await pool.recommend(aggregates, 10, 10)
+    assert error.value.status_code == 504
+    # The task keeps running in the worker and still holds its slot
+    assert len(pool.pending) == 1
+
+    release.set()
+    for _ in range(100):
+        if not pool.pending:
+            break
+        await asyncio.sleep(0.01)
+    assert not pool.pending
+    pool.shutdown()
+
+
+async def test_thread_computes_are_bounded_and_timed_out(cache, aggregates, blocking_worker):
+    release, _ = blocking_worker
+    pool = ComputePool(workers=0, max_pending=1, timeout=0.05)
+
+    with pytest.raises(HTTPException) as error:
+        await pool.recommend(aggregates, 10, 10)
+    assert error.value.status_code == 504
+    # The timed-out thread still holds the only slot
+    with pytest.raises(HTTPException) as error:
+        await pool.recommend(aggregates, 11, 10)
+    assert error.value.status_code == 503
+
+    release.set()
+    for _ in range(100):
+        if not pool.pending:
+            break
+        await asyncio.sleep(0.01)
+    assert not pool.pending
+
+
+def test_workers_do_not_fork_the_server(monkeypatch):
+    created = {}
+    monkeypatch.setattr(pool_module, "ProcessPoolExecutor", lambda **kwargs: created.update(kwargs))
+
+    ComputePool(workers=2).start()
+
+    assert created["max_workers"] == 2
+    assert created["mp_context"].get_start_method() == pool_module.COMPUTE_START_METHOD != "fork"
+
+
+async def test_warm_up_waits_for_the_workers():
+    pool = executor_pool()
+    assert not pool.ready
+
+    await pool.warm_up()
+
+    assert pool.ready
+    pool.shutdown()
+
+
+async def test_broken_pool_is_503_and_restarts(cache, aggregates, monkeypatch):
+    class Broken:
+        def submit(self, *args, **kwargs):
+            raise BrokenProcessPool("worker died")
+
+        def shutdown(self, **kwargs):
+            pass
+
+    pool = ComputePool(workers=1)
+    pool.executor = Broken()
+    restarts = []
+    monkeypatch.setattr(pool, "start", lambda: restarts.append(True))
+
+    with pytest.raises(HTTPException) as error:
+        await pool.recommend(aggregates, 10, 10)
+    assert error.value.status_code == 503
+    assert restarts and pool.executor is None
+
+
+async def test_results_are_cached(cache, aggregates, blocking_worker):
+    release, calls = blocking_worker
+    release.set()
+    pool = ComputePool(workers=0)
+
+    first = await pool.recommend(aggregates, 10, 10)
+    second = await pool.recommend(aggregates, 10, 10)
+
+    assert calls == [10]
+    pd.testing.assert_frame_equal(first, second)
+
+
+async def test_redis_tier_is_read_off_the_event_loop(aggregates, blocking_worker, monkeypatch):
+    release, _ = blocking_worker
+    release.set()
+    threads = []
+
+    class Tier:
+        def get(self, key):
+            threads.append(threading.current_thread())
+            return None
+
+        def set(self, key, value, ex=None):
+            threads.append(threading.current_thread())
+
+    monkeypatch.setattr(pool_module, "result_cache", ResultCache(redis_client=Tier()))
+
+    await ComputePool(workers=0).recommend(aggregates, 10, 10)
+
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from src.distanceCal import haversine_np
+from src.recommendor import recommend_group, CANDIDATE_POOL_SIZE
+
+CENTERS = [(12.9716, 77.5946), (12.9352, 77.6245), (13.10, 77.59), (12.80, 77.70)]
+
+
+def brute_force_distances(assets, lat, lng):
+    # Nearest geocoded branch of every brand, branch by branch
+    zomato = assets.zomato
+    keys = zomato["location"].astype(str).str.lower().str.strip()
+    geocoded = keys.isin(assets.coord_dict.keys()).to_numpy()
+    coords = np.array([assets.coord_dict[key] for key in keys[geocoded]])
+    distances = haversine_np(lat, lng, coords[:, 0], coords[:, 1])
+    nearest = (
+        zomato.loc[geocoded, ["name"]].assign(distance=distances)
+        .groupby("name")["distance"].min()
+    )
+    return nearest.reindex(assets.zomato_unique["name"]).to_numpy()
+
+
+@pytest.mark.parametrize("lat, lng", CENTERS)
+@pytest.mark.parametrize("radius_km", [1, 3, 10])
+def test_brands_within_matches_brute_force(assets, lat, lng, radius_km):
+    nearest = brute_force_distances(assets, lat, lng)
+
+    mask = assets.branch_index.brands_within(lat, lng, radius_km)
+
+    # Brands sitting on the boundary may fall either side of float noise
+    clear = ~np.isclose(nearest, radius_km, atol=1e-9)
+    expected = np.nan_to_num(nearest, nan=np.inf) <= radius_km
+    np.testing.assert_array_equal(mask[clear], expected[clear])
+
+
+def group_at(location):
+    return [{"cuisines": ["cafe"], "rest_type": ["cafe"], "dish_pref": ["pasta"], "budget": 600, "location": location}]
+
+
+@pytest.mark.parametrize("radius_km", [2, 5, 10])
+def test_results_stay_within_radius(assets, sample_groups, radius_km):
+    for users in sample_groups[:10]:
+        result = recommend_group(users, top_k=10, radius_km=radius_km)
+        assert (result["distance_km"] <= radius_km).all()
+        assert result["final_score_adjusted"].is_monotonic_decreasing
+
+
+@pytest.mark.parametrize("radius_km", [2, 10])
+def test_outlying_centroid_still_fills_top_k(assets, radius_km):
+    # Far from the centre: the old top-30-then-filter pipeline came up short here
+    location = max(assets.coord_dict, key=lambda name: abs(assets.coord_dict[name][0] - 12.9716))
+    lat, lng = assets.coord_dict[location]
+    in_radius = int(assets.branch_index.brands_within(lat, lng, radius_km).sum())
+
+    result = recommend_group(group_at(location), top_k=10, radius_km=radius_km)
+
+    assert len(result) == min(10, in_radius)
+    assert result["name"].is_unique
+
+
+def test_large_top_k_uses_a_larger_pool(assets):
+    top_k = CANDIDATE_POOL_SIZE + 20
+    result = recommend_group(group_at("BTM"), top_k=top_k, radius_km=10)
+    lat, lng = assets.coord_dict["btm"]
+    assert len(result) == min(top_k, int(assets.branch_index.brands_within(lat, lng, 10).sum()))
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from src.recommendor import aggregate_group, recommend_group, recommend_groups
+
+
+def test_score_batch_rows_match_score(assets, sample_groups):
+    engine = assets.scoring_engine
+    aggregates = [aggregate_group(users) for users in sample_groups[:12]]
+    cuisines, rest_types, dishes, budgets, _ = (list(column) for column in zip(*aggregates))
+
+    batch = engine.score_batch(cuisines, rest_types, dishes, budgets, assets.dish_encoder)
+
+    for g, (cuisine, rest_type, dish, budget, _) in enumerate(aggregates):
+        single = engine.score(cuisine, rest_type, dish, budget, assets.dish_encoder)
+        row = engine.group_view(batch, g)
+        for column in ["cuisine_score", "rest_type_score", "dish_score", "rating_score", "cost_score", "final_score"]:
+            np.testing.assert_allclose(row[column], single[column], rtol=1e-12, err_msg=f"group {g} {column}")
+
+
+def test_recommend_groups_match_recommend_group(assets, sample_groups):
+    batch = recommend_groups(sample_groups, top_k=10)
+
+    assert len(batch) == len(sample_groups)
+    for users, result in zip(sample_groups, batch):
+        expected = recommend_group(users, top_k=10)
+        pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-12)
+
+
+def test_recommend_groups_empty():
+    assert recommend_groups([]) == []
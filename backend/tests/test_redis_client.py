@@ -0,0 +1,61 @@
+import pytest
+import redis
+import redis.asyncio.connection as aioconnection
+
+from api import session_redis
+from api.session_redis import make_redis_client, REDIS_RETRIES
+
+pytestmark = pytest.mark.anyio
+
+
+def connection_retry(client):
+    # Commands run with the retry policy of the pool's connections
+    return client.connection_pool.make_connection().retry
+
+
+def test_retry_policy_is_set_on_the_pool():
+    retry = connection_retry(make_redis_client("redis://localhost:6379"))
+
+    assert retry.get_retries() == REDIS_RETRIES
+    assert {redis.exceptions.ConnectionError, redis.exceptions.TimeoutError} <= set(retry._supported_errors)
+
+
+def test_no_retry_client_never_retries():
+    assert connection_retry(make_redis_client("redis://localhost:6379", retries=0)).get_retries() == 0
+
+
+def test_non_idempotent_scripts_use_the_no_retry_client():
+    for script in [session_redis.submit_script, session_redis.update_script, session_redis.claim_compute_script]:
+        assert script.registered_client is session_redis.no_retry_client
+    for script in [
+        session_redis.join_script,
+        session_redis.store_result_script,
+    ]:
+        assert script.registered_client is session_redis.redis_client
+    assert connection_retry(session_redis.no_retry_client).get_retries() == 0
+
+
+@pytest.fixture
+def refused_connects(monkeypatch):
+    attempts = []
+
+    async def refuse(self):
+        attempts.append(self)
+        raise redis.exceptions.ConnectionError("refused")
+
+    monkeypatch.setattr(aioconnection.Connection, "_connect", refuse)
+    return attempts
+
+
+@pytest.mark.parametrize("retries, expected_attempts", [(0, 1), (2, 3)])
+async def test_connection_errors_are_retried_by_the_pool(refused_connects, retries, expected_attempts, monkeypatch):
+    monkeypatch.setattr(session_redis, "REDIS_BACKOFF_BASE", 0.001)
+    monkeypatch.setattr(session_redis, "REDIS_BACKOFF_CAP", 0.001)
+    client = make_redis_client("redis://localhost:6379", retries=retries)
+
+    with pytest.raises(redis.exceptions.ConnectionError):
+        await client.ping()
+
+    # The first try plus one per retry
+    assert len(refused_connects) == expected_attempts
+    await client.aclose()
@@ -0,0 +1,131 @@
+from collections import Counter
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from src import result_cache as cache_module
+from src.result_cache import ResultCache, group_fingerprint
+from src.recommendor import aggregate_group
+
+USERS = [
+    {"cuisines": ["cafe", "italian"], "rest_type": ["cafe"], "dish_pref": ["pasta"], "budget": 500, "location": "BTM"},
+    {"cuisines": ["chinese"], "rest_type": ["casual_dining"], "dish_pref": ["noodles"], "budget": 800, "location": "Koramangala 5th Block"},
+    {"cuisines": ["cafe"], "rest_type": [], "dish_pref": [], "budget": 300, "location": "HSR"},
+]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def frame(value):
+    return pd.DataFrame({"name": [value], "final_score_adjusted": [0.5]})
+
+
+def test_fingerprint_ignores_member_and_insertion_order(assets):
+    forward = group_fingerprint(*aggregate_group(USERS), 10, 10)
+    backward = group_fingerprint(*aggregate_group(USERS[::-1]), 10, 10)
+    assert forward == backward
+
+    assert group_fingerprint(Counter(a=1, b=2), None, {}, 500, (12.9, 77.6), 10, 10) == \
+        group_fingerprint(Counter(b=2, a=1), Counter(), None, 500, (12.9, 77.6), 10, 10)
+
+
+def test_fingerprint_separates_request_parameters(assets):
+    aggregates = aggregate_group(USERS)
+    keys = {
+        group_fingerprint(*aggregates, 10, 10),
+        group_fingerprint(*aggregates, 20, 10),
+        group_fingerprint(*aggregates, 10, 5),
+        group_fingerprint(*aggregate_group(USERS[:2]), 10, 10),
+    }
+    assert len(keys) == 4
+
+
+def test_fingerprint_rounds_centroid():
+    base = (Counter(cafe=1), Counter(), Counter(), 500)
+    assert group_fingerprint(*base, (12.91234, 77.61234), 10, 10) == \
+        group_fingerprint(*base, (12.91231, 77.61232), 10, 10)
+    assert group_fingerprint(*base, (12.9123, 77.6123), 10, 10) != \
+        group_fingerprint(*base, (12.9124, 77.6123), 10, 10)
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResultCache(max_size=8, ttl=60)
+    cache.set("k", frame("a"))
+
+    clock.now += 59
+    assert cache.get("k")["name"].tolist() == ["a"]
+    clock.now += 2
+    assert cache.get("k") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_returns_copies(clock):
+    cache = ResultCache()
+    value = frame("a")
+    cache.set("k", value)
+    value.loc[0, "name"] = "changed"
+
+    first = cache.get("k")
+    first.loc[0, "name"] = "changed again"
+    assert cache.get("k")["name"].tolist() == ["a"]
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = ResultCache(max_size=2, ttl=60)
+    cache.set("a", frame("a"))
+    cache.set("b", frame("b"))
+    cache.get("a")
+    cache.set("c", frame("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_new_asset_version_invalidates(clock, monkeypatch):
+    cache = ResultCache()
+    monkeypatch.setattr(cache_module.shared, "asset_version", "v1")
+    cache.set("k", frame("a"))
+
+    monkeypatch.setattr(cache_module.shared, "asset_version", "v2")
+    assert cache.get("k") is None
+
+
+def test_redis_tier_is_shared_with_ttl(clock, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    monkeypatch.setattr(cache_module.shared, "asset_version", "v1")
+    client = fakeredis.FakeRedis(decode_responses=True)
+
+    ResultCache(ttl=60, redis_client=client).set("k", frame("a"))
+
+    key = f"{cache_module.REDIS_KEY_PREFIX}:v1:k"
+    assert 0 < client.ttl(key) <= 60
+    other_worker = ResultCache(ttl=60, redis_client=client)
+    assert other_worker.get("k")["name"].tolist() == ["a"]
+
+
+def test_redis_errors_are_misses(clock):
+    class Down:
+        def get(self, key):
+            raise ConnectionError("down")
+
+        def set(self, key, value, ex=None):
+            raise ConnectionError("down")
+
+    cache = ResultCache(redis_client=Down())
+    cache.set("k", frame("a"))
+    assert cache.get("k") is not None  # still in the local tier
+    assert cache.get("other") is None
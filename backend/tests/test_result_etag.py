@@ -0,0 +1,88 @@
+import json
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from api.results import render_result, result_etag, etag_matches
+
+PREFS = {"cuisines": ["cafe"], "rest_type": ["cafe"], "dish_pref": ["pasta"], "budget": 500, "location": "BTM"}
+
+
+@pytest.fixture
+def client(redis_store, assets, monkeypatch):
+    import app as app_module
+
+    # No background startup work: assets are loaded, the store is fakeredis
+    monkeypatch.setattr(app_module.app.router, "on_startup", [])
+    monkeypatch.setattr(app_module.app.router, "on_shutdown", [])
+    with TestClient(app_module.app) as client:
+        yield client
+
+
+@pytest.fixture
+def computed_group(client):
+    group_id = client.post("/group/create").json()["group_id"]
+    user_id = client.post(f"/group/join/{group_id}").json()["user_id"]
+    assert client.post(f"/group/submit/{group_id}/{user_id}", json=PREFS).status_code == 200
+    assert client.post(f"/group/compute/{group_id}").status_code == 200
+    return group_id
+
+
+def test_etag_is_a_strong_hash_of_the_body():
+    frame = pd.DataFrame([{
+        "name": "Cafe", "rate": 4.1, "cuisines": ["cafe"], "rest_type": ["cafe"],
+        "approx_cost(for two people)": 400, "location": "BTM",
+        "distance_km": 1.5, "distance_score": 0.4, "final_score_adjusted": 0.8,
+    }])
+    restaurants, body, etag = render_result(frame)
+
+    assert json.loads(body) == {"restaurants": restaurants}
+    assert etag == result_etag(body) and etag.startswith('"') and etag.endswith('"')
+    assert render_result(frame)[2] == etag
+    assert result_etag(body + " ") != etag
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ("", False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other", "abc"', True),
+    ("*", True),
+    ('"abcd"', False),
+])
+def test_if_none_match_comparison(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+
+
+def test_result_carries_etag(client, computed_group):
+    response = client.get(f"/group/result/{computed_group}")
+
+    assert response.status_code == 200
+    assert response.headers["etag"] == result_etag(response.text)
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.json()["restaurants"]
+
+
+def test_matching_if_none_match_is_304(client, computed_group):
+    etag = client.get(f"/group/result/{computed_group}").headers["etag"]
+
+    response = client.get(f"/group/result/{computed_group}", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_stale_if_none_match_gets_the_body(client, computed_group):
+    response = client.get(f"/group/result/{computed_group}", headers={"If-None-Match": '"stale"'})
+
+    assert response.status_code == 200
+    assert response.json()["restaurants"]
+
+
+def test_result_before_compute_is_404(client):
+    group_id = client.post("/group/create").json()["group_id"]
+
+    assert client.get(f"/group/result/{group_id}").status_code == 404
@@ -0,0 +1,72 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.scoring import (
+    build_feature_matrices,
+    weighted_feature_score,
+    apply_weighted_cuisine_scoring,
+    apply_weighted_rest_type_scoring,
+)
+
+
+def rowwise_score(column, counter):
+    # The original per-row scorer: sum of the group's weights, max-normalised
+    scores = column.apply(lambda tokens: sum(counter.get(t, 0) for t in tokens))
+    max_score = scores.max()
+    return scores / max_score if max_score > 0 else scores
+
+
+def test_feature_matrices_count_tokens_per_row():
+    df = pd.DataFrame({
+        "cuisines": [["cafe", "italian"], [], ["cafe", "cafe"]],
+        "rest_type": [["cafe"], ["bar"], []],
+    })
+    vocab, cuisine_matrix, rest_type_matrix = build_feature_matrices(df)
+
+    assert set(vocab) == {"cafe", "italian", "bar"}
+    assert cuisine_matrix.shape == rest_type_matrix.shape == (3, 3)
+    assert cuisine_matrix[2, vocab["cafe"]] == 2
+    assert rest_type_matrix[1, vocab["bar"]] == 1
+    assert cuisine_matrix[1].nnz == 0
+
+
+@pytest.mark.parametrize("counter", [
+    Counter({"north_indian": 3, "chinese": 1}),
+    Counter({"cafe": 2, "martian": 5}),  # unknown keys never score
+    Counter({"south_indian": 1, "kerala": 2}),
+])
+def test_cuisine_scores_match_rowwise(assets, counter):
+    df = assets.zomato_unique[["cuisines"]].copy()
+    scored = apply_weighted_cuisine_scoring(df, counter, assets.cuisine_matrix, assets.feature_vocab)
+
+    expected = rowwise_score(assets.zomato_unique["cuisines"], counter)
+    np.testing.assert_allclose(scored["cuisine_score"].to_numpy(), expected.to_numpy())
+
+
+def test_rest_type_scores_match_rowwise(assets):
+    counter = Counter({"casual_dining": 4, "quick_bites": 2, "cafe": 1})
+    df = assets.zomato_unique[["rest_type"]].copy()
+    scored = apply_weighted_rest_type_scoring(df, counter, assets.rest_type_matrix, assets.feature_vocab)
+
+    expected = rowwise_score(assets.zomato_unique["rest_type"], counter)
+    np.testing.assert_allclose(scored["rest_type_score"].to_numpy(), expected.to_numpy())
+
+
+def test_empty_or_unmatched_counters_score_zero(assets):
+    df = assets.zomato_unique[["cuisines"]].copy()
+    assert (apply_weighted_cuisine_scoring(df, Counter(), assets.cuisine_matrix, assets.feature_vocab)["cuisine_score"] == 0).all()
+
+    scores = weighted_feature_score(Counter({"martian": 2}), assets.cuisine_matrix, assets.feature_vocab)
+    assert not scores.any()
+
+
+def test_score_written_into_buffer(assets):
+    counter = Counter({"chinese": 2})
+    out = np.full(assets.cuisine_matrix.shape[0], -1.0)
+    result = weighted_feature_score(counter, assets.cuisine_matrix, assets.feature_vocab, out=out)
+
+    assert result is out
+    np.testing.assert_allclose(out, weighted_feature_score(counter, assets.cuisine_matrix, assets.feature_vocab))
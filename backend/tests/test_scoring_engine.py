@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from src.recommendor import aggregate_group
+from src.scoring import (
+    apply_weighted_cuisine_scoring,
+    apply_weighted_rest_type_scoring,
+    apply_weighted_dish_score,
+    apply_rating_score,
+    apply_cost_score,
+    apply_final_score,
+)
+from src.scoring_engine import SCORE_COLUMNS
+
+SCORED_COLUMNS = SCORE_COLUMNS + ["final_score"]
+
+
+def dataframe_scores(assets, aggregates):
+    # The DataFrame scoring path the engine replaced: copy, add score columns
+    cuisine_counter, rest_counter, dish_counter, group_budget, _ = aggregates
+    df = assets.zomato_unique.copy()
+    df = apply_weighted_cuisine_scoring(df, cuisine_counter, assets.cuisine_matrix, assets.feature_vocab)
+    df = apply_weighted_rest_type_scoring(df, rest_counter, assets.rest_type_matrix, assets.feature_vocab)
+    df = apply_rating_score(df)
+    df = apply_cost_score(df, group_budget)
+    df = apply_weighted_dish_score(df, dish_counter, assets.dish_encoder, assets.tfidf_matrix)
+    return apply_final_score(df)
+
+
+def engine_scores(assets, aggregates):
+    cuisine_counter, rest_counter, dish_counter, group_budget, _ = aggregates
+    return assets.scoring_engine.score(
+        cuisine_counter, rest_counter, dish_counter, group_budget, assets.dish_encoder
+    )
+
+
+@pytest.mark.parametrize("group", range(0, 40, 4))
+def test_engine_scores_match_dataframe_scorers(assets, sample_groups, group):
+    aggregates = aggregate_group(sample_groups[group])
+    expected = dataframe_scores(assets, aggregates)
+    buffers = engine_scores(assets, aggregates)
+
+    for column in SCORED_COLUMNS:
+        np.testing.assert_allclose(buffers[column], expected[column].to_numpy(dtype=float), rtol=1e-12, err_msg=column)
+
+
+@pytest.mark.parametrize("group", range(1, 40, 4))
+def test_top_candidates_match_full_sort(assets, sample_groups, group):
+    aggregates = aggregate_group(sample_groups[group])
+    buffers = engine_scores(assets, aggregates)
+    final = buffers["final_score"]
+
+    positions = assets.scoring_engine.top_candidates(buffers, 30)
+
+    # argpartition selects exactly what a full descending sort (ties by row
+    # position) would
+    np.testing.assert_array_equal(positions, np.lexsort((np.arange(len(final)), -final))[:30])
+    # and the same top 30 scores as sorting the DataFrame path
+    expected = dataframe_scores(assets, aggregates).sort_values("final_score", ascending=False).head(30)
+    np.testing.assert_allclose(final[positions], expected["final_score"].to_numpy(dtype=float), rtol=1e-12)
+
+
+def test_top_candidates_respect_mask(assets, sample_groups):
+    buffers = engine_scores(assets, aggregate_group(sample_groups[0]))
+    mask = np.zeros(assets.scoring_engine.size, dtype=bool)
+    mask[::7] = True
+
+    positions = assets.scoring_engine.top_candidates(buffers, 30, mask=mask)
+
+    assert len(positions) == 30
+    assert mask[positions].all()
+    assert (np.diff(buffers["final_score"][positions]) <= 0).all()
+    assert len(assets.scoring_engine.top_candidates(buffers, 30, mask=np.zeros_like(mask))) == 0
+
+
+def test_candidates_frame_rows(assets, sample_groups):
+    aggregates = aggregate_group(sample_groups[3])
+    expected = dataframe_scores(assets, aggregates)
+    buffers = engine_scores(assets, aggregates)
+    positions = assets.scoring_engine.top_candidates(buffers, 30)
+
+    frame = assets.scoring_engine.candidates_frame(buffers, positions)
+
+    rows = expected.iloc[positions]
+    assert list(frame.index) == list(rows.index)
+    assert list(frame["name"]) == list(rows["name"])
+    for column in SCORED_COLUMNS:
+        np.testing.assert_allclose(frame[column].to_numpy(), rows[column].to_numpy(dtype=float), rtol=1e-12)
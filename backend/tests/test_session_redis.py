@@ -0,0 +1,178 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from api.schemas import UserPreference
+from api.routes import normalize_preferences
+from src.recommendor import aggregate_group
+from src.result_cache import group_fingerprint
+
+# Submits and edits geocode locations through the loaded assets
+pytestmark = [pytest.mark.anyio, pytest.mark.usefixtures("assets")]
+
+PREFS = [
+    {"cuisines": ["cafe", "italian"], "rest_type": ["cafe"], "dish_pref": ["pasta"], "budget": 500, "location": "BTM"},
+    {"cuisines": ["chinese"], "rest_type": ["casual_dining"], "dish_pref": ["noodles", "momos"], "budget": 800, "location": "HSR"},
+    {"cuisines": ["cafe"], "rest_type": [], "dish_pref": [], "budget": 300, "location": "Nowhere"},
+]
+
+
+async def joined_group(store, members):
+    group_id = await store.create_group()
+    users = [(await store.add_user(group_id))[0] for _ in range(members)]
+    return group_id, users
+
+
+async def assert_http_error(status_code, coroutine):
+    with pytest.raises(HTTPException) as error:
+        await coroutine
+    assert error.value.status_code == status_code
+    return error.value
+
+
+async def test_join_and_submit_count_members(redis_store):
+    group_id, users = await joined_group(redis_store, 3)
+    assert await redis_store.group_status(group_id) == {"total": 3, "ready": 0, "auto_compute": False}
+
+    _, status = await redis_store.submit_preferences(group_id, users[0], UserPreference(**PREFS[0]))
+
+    assert status == {"total": 3, "ready": 1, "auto_compute": False}
+
+
+async def test_concurrent_joins_and_submits_are_all_counted(redis_store):
+    group_id = await redis_store.create_group()
+    users = [user_id for user_id, _ in await asyncio.gather(*[redis_store.add_user(group_id) for _ in range(20)])]
+    await asyncio.gather(*[
+        redis_store.submit_preferences(group_id, user_id, UserPreference(**PREFS[i % 3]))
+        for i, user_id in enumerate(users)
+    ])
+
+    assert await redis_store.group_status(group_id) == {"total": 20, "ready": 20, "auto_compute": False}
+
+
+async def test_duplicate_submit_is_400_and_changes_nothing(redis_store):
+    group_id, users = await joined_group(redis_store, 1)
+    await redis_store.submit_preferences(group_id, users[0], UserPreference(**PREFS[0]))
+    before = await redis_store.redis_client.hgetall(redis_store.group_key(group_id))
+
+    error = await assert_http_error(400, redis_store.submit_preferences(group_id, users[0], UserPreference(**PREFS[1])))
+
+    assert error.detail == "User already submitted preferences"
+    assert await redis_store.redis_client.hgetall(redis_store.group_key(group_id)) == before
+
+
+async def test_submit_to_unknown_group_or_user_is_404(redis_store):
+    group_id, _ = await joined_group(redis_store, 1)
+    prefs = UserPreference(**PREFS[0])
+
+    assert (await assert_http_error(404, redis_store.submit_preferences("missing", "u1", prefs))).detail == "Group not found"
+    assert (await assert_http_error(404, redis_store.submit_preferences(group_id, "nobody", prefs))).detail == "User not found"
+    await assert_http_error(404, redis_store.add_user("missing"))
+
+
+async def test_server_aggregate_matches_aggregate_group(redis_store):
+    group_id, users = await joined_group(redis_store, 3)
+    for user_id, prefs in zip(users, PREFS):
+        await redis_store.submit_preferences(group_id, user_id, UserPreference(**prefs))
+
+    aggregates, members = await redis_store.prepare_group_compute(group_id)
+
+    assert members == 3
+    assert group_fingerprint(*aggregates, 10, 10) == group_fingerprint(*aggregate_group(PREFS), 10, 10)
+
+
+async def test_none_choice_aggregates_like_the_memory_store(redis_store, memory_store):
+    # The frontend offers 'None', which normalize_cuisine turns into ""
+    prefs = [
+        {"cuisines": ["None"], "rest_type": ["None"], "dish_pref": [], "budget": 500, "location": "BTM"},
+        {"cuisines": ["chinese", "None"], "rest_type": ["cafe"], "dish_pref": ["noodles"], "budget": 800, "location": "HSR"},
+    ]
+    fingerprints = []
+    for store in [redis_store, memory_store]:
+        group_id, users = await joined_group(store, 2)
+        for user_id, user_prefs in zip(users, prefs):
+            await store.submit_preferences(group_id, user_id, normalize_preferences(UserPreference(**user_prefs)))
+        aggregates, _ = await store.prepare_group_compute(group_id)
+        assert "" in aggregates[0] and "chinese" in aggregates[0]
+        fingerprints.append(group_fingerprint(*aggregates, 10, 10))
+
+    assert fingerprints[0] == fingerprints[1]
+
+
+async def test_update_replaces_preferences_in_the_aggregate(redis_store):
+    group_id, users = await joined_group(redis_store, 2)
+    for user_id, prefs in zip(users, PREFS):
+        await redis_store.submit_preferences(group_id, user_id, UserPreference(**prefs))
+
+    assert await redis_store.update_preferences(group_id, users[1], UserPreference(**PREFS[2])) == {"status": "updated"}
+
+    stored = await redis_store.redis_client.hget(redis_store.group_key(group_id), "user:" + users[1])
+    assert json.loads(stored) == PREFS[2]
+    aggregates, _ = await redis_store.prepare_group_compute(group_id)
+    expected = aggregate_group([PREFS[0], PREFS[2]])
+    assert group_fingerprint(*aggregates, 10, 10) == group_fingerprint(*expected, 10, 10)
+
+
+async def test_update_retries_when_preferences_changed_in_between(redis_store, monkeypatch):
+    group_id, users = await joined_group(redis_store, 1)
+    await redis_store.submit_preferences(group_id, users[0], UserPreference(**PREFS[0]))
+
+    # A concurrent edit lands between the read and the script: the first
+    # attempt is refused as 'changed' and the update re-reads
+    hget = redis_store.redis_client.hget
+    raced = []
+
+    async def racing_hget(key, field):
+        value = await hget(key, field)
+        if not raced:
+            raced.append(True)
+            await redis_store.update_preferences(group_id, users[0], UserPreference(**PREFS[1]))
+        return value
+
+    monkeypatch.setattr(redis_store.redis_client, "hget", racing_hget)
+    await redis_store.update_preferences(group_id, users[0], UserPreference(**PREFS[2]))
+
+    aggregates, _ = await redis_store.prepare_group_compute(group_id)
+    assert group_fingerprint(*aggregates, 10, 10) == group_fingerprint(*aggregate_group([PREFS[2]]), 10, 10)
+
+
+async def test_update_before_submit_is_400(redis_store):
+    group_id, users = await joined_group(redis_store, 1)
+
+    error = await assert_http_error(400, redis_store.update_preferences(group_id, users[0], UserPreference(**PREFS[0])))
+
+    assert error.detail == "User has not submitted preferences yet"
+
+
+async def test_computed_group_refuses_joins_and_edits(redis_store):
+    group_id, users = await joined_group(redis_store, 1)
+    await redis_store.submit_preferences(group_id, users[0], UserPreference(**PREFS[0]))
+    await redis_store.store_group_result(group_id, '{"restaurants":[]}', '"etag"')
+
+    await assert_http_error(400, redis_store.add_user(group_id))
+    await assert_http_error(400, redis_store.update_preferences(group_id, users[0], UserPreference(**PREFS[1])))
+    assert await redis_store.getComputedResult(group_id) == ('{"restaurants":[]}', '"etag"')
+
+
+async def test_compute_needs_every_member_ready(redis_store):
+    group_id, users = await joined_group(redis_store, 2)
+    await redis_store.submit_preferences(group_id, users[0], UserPreference(**PREFS[0]))
+
+    assert (await assert_http_error(400, redis_store.prepare_group_compute(group_id))).detail == "Not all users are ready"
+    empty = await redis_store.create_group()
+    assert (await assert_http_error(400, redis_store.prepare_group_compute(empty))).detail == "Group is empty"
+
+
+async def test_compute_claim_expires(redis_store):
+    group_id, users = await joined_group(redis_store, 1)
+    await redis_store.submit_preferences(group_id, users[0], UserPreference(**PREFS[0]))
+    await redis_store.prepare_group_compute(group_id)
+
+    assert (await assert_http_error(409, redis_store.prepare_group_compute(group_id))).detail == "Group compute already in progress"
+
+    # The worker holding the claim died: its deadline passes
+    await redis_store.redis_client.hset(redis_store.group_key(group_id), "computing", 0)
+    aggregates, members = await redis_store.prepare_group_compute(group_id)
+    assert members == 1
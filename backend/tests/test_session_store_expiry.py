@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def store(memory_store):
+    return memory_store
+
+
+async def test_groups_expire_in_deadline_order(store, monkeypatch):
+    monkeypatch.setattr(store, "GROUP_TTL_SECONDS", 100)
+    first = await store.create_group()
+    monkeypatch.setattr(store, "GROUP_TTL_SECONDS", 50)
+    second = await store.create_group()
+    now = time.monotonic()
+
+    assert store.pop_expired_groups(now + 10) == []
+    assert store.pop_expired_groups(now + 60) == [second]
+    assert store.pop_expired_groups(now + 200) == [first]
+    assert store.GROUPS == {} and store._expiry_heap == []
+
+
+async def test_close_reschedules_and_skips_the_old_deadline(store, monkeypatch):
+    monkeypatch.setattr(store, "CLOSE_TTL_SECONDS", 5)
+    group_id = await store.create_group()
+    original = store.GROUPS[group_id]["expires_at"]
+
+    await store.close_group(group_id)
+    now = time.monotonic()
+
+    assert store.GROUPS[group_id]["expires_at"] < original
+    assert len(store._expiry_heap) == 2  # the superseded entry stays until popped
+    assert store.pop_expired_groups(now + 10) == [group_id]
+    # Popping the superseded entry later does nothing
+    assert store.pop_expired_groups(original + 1) == []
+    assert store._expiry_heap == []
+
+
+async def test_close_never_extends_the_lifetime(store, monkeypatch):
+    monkeypatch.setattr(store, "GROUP_TTL_SECONDS", 1)
+    group_id = await store.create_group()
+    deadline = store.GROUPS[group_id]["expires_at"]
+
+    await store.close_group(group_id)
+
+    assert store.GROUPS[group_id]["expires_at"] == deadline
+
+
+async def test_deleted_groups_are_skipped(store):
+    group_id = await store.create_group()
+    del store.GROUPS[group_id]
+
+    assert store.pop_expired_groups(time.monotonic() + store.GROUP_TTL_SECONDS + 1) == []
+
+
+async def test_waiter_wakes_for_an_earlier_deadline(store, monkeypatch):
+    monkeypatch.setattr(store, "GROUP_TTL_SECONDS", 30)
+    monkeypatch.setattr(store, "CLOSE_TTL_SECONDS", 0.05)
+    long_lived = await store.create_group()
+    closing = await store.create_group()
+
+    waiter = asyncio.ensure_future(store.wait_for_expired_groups())
+    await asyncio.sleep(0.01)
+    # Scheduled while the waiter sleeps towards the 30s deadline
+    await store.close_group(closing)
+
+    assert await asyncio.wait_for(waiter, 1) == [closing]
+    assert long_lived in store.GROUPS
+
+
+async def test_waiter_sleeps_with_no_groups(store, monkeypatch):
+    monkeypatch.setattr(store, "GROUP_TTL_SECONDS", 0.05)
+    waiter = asyncio.ensure_future(store.wait_for_expired_groups())
+    await asyncio.sleep(0.05)
+    assert not waiter.done()
+
+    group_id = await store.create_group()
+
+    assert await asyncio.wait_for(waiter, 1) == [group_id]
+
+
+def test_cleanup_of_many_live_groups_is_cheap(store):
+    for i in range(10000):
+        group_id = f"g{i}"
+        store.GROUPS[group_id] = {}
+        store.schedule_expiry(group_id, 1000)
+
+    start = time.perf_counter()
+    assert store.cleanup_expired_groups() == 0
+    # Only the earliest deadline is looked at, not every group
+    assert time.perf_counter() - start < 0.05
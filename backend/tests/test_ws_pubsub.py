@@ -0,0 +1,126 @@
+import asyncio
+import json
+
+import pytest
+import redis
+
+from api.websockets import ConnectionManager
+from api.ws_pubsub import group_channel
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeSocket:
+    def __init__(self):
+        self.received = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.received.append(json.loads(text))
+
+    async def close(self, code=1000, reason=""):
+        self.closed = code
+
+
+async def eventually(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def workers():
+    """
+    Two ConnectionManagers, as two uvicorn workers sharing one Redis.
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    managers = [ConnectionManager(send_timeout=0.5), ConnectionManager(send_timeout=0.5)]
+    for manager in managers:
+        await manager.start("redis", client=fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+    yield managers
+    for manager in managers:
+        await manager.stop()
+
+
+def channels(manager):
+    return set(manager.fanout.pubsub.channels)
+
+
+async def test_broadcast_reaches_other_workers_once(workers):
+    a, b = workers
+    on_a, on_b, other_b = FakeSocket(), FakeSocket(), FakeSocket()
+    await a.connect(on_a, "g1")
+    await b.connect(on_b, "g1")
+    await b.connect(other_b, "g2")
+
+    assert await a.broadcast("g1", {"type": "USER_READY"}) == 1
+    await eventually(lambda: on_b.received)
+    await asyncio.sleep(0.05)
+
+    assert on_a.received == on_b.received == [{"type": "USER_READY"}]
+    assert other_b.received == []
+
+
+async def test_workers_subscribe_only_to_their_groups(workers):
+    a, b = workers
+    socket = FakeSocket()
+    await b.connect(socket, "g1")
+
+    assert channels(b) == {group_channel("g1")}
+    assert not channels(a)
+
+    b.disconnect(socket, "g1")
+    await eventually(lambda: not channels(b))
+
+    await b.connect(socket, "g1")
+    await eventually(lambda: channels(b) == {group_channel("g1")})
+    await a.broadcast("g1", {"type": "AGAIN"})
+    await eventually(lambda: socket.received == [{"type": "AGAIN"}])
+
+
+async def test_closed_group_is_unsubscribed(workers):
+    a, b = workers
+    socket = FakeSocket()
+    await b.connect(socket, "g1")
+
+    await b.close_group("g1")
+
+    assert socket.closed == 1000
+    await eventually(lambda: not channels(b))
+
+
+async def test_local_delivery_survives_publish_failures(workers, monkeypatch):
+    a, _ = workers
+    socket = FakeSocket()
+    await a.connect(socket, "g1")
+
+    async def down(*args, **kwargs):
+        raise redis.exceptions.ConnectionError("down")
+
+    monkeypatch.setattr(a.fanout.client, "publish", down)
+
+    assert await a.broadcast("g1", {"type": "LOCAL"}) == 1
+    assert socket.received == [{"type": "LOCAL"}]
+
+
+async def test_failing_socket_is_dropped_without_holding_up_the_group():
+    manager = ConnectionManager(send_timeout=0.05)
+    good, slow = FakeSocket(), FakeSocket()
+
+    async def never_returns(text):
+        await asyncio.sleep(10)
+
+    slow.send_text = never_returns
+    await manager.connect(good, "g1")
+    await manager.connect(slow, "g1")
+
+    assert await manager.broadcast("g1", {"type": "X"}) == 1
+    assert good.received == [{"type": "X"}]
+    assert manager.active_connections["g1"] == {good}
+    assert slow.closed == 1011